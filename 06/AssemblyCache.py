@@ -0,0 +1,117 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import typing
+
+# name of the cache directory, created next to the assembled sources
+CACHE_DIRNAME = ".hackcache"
+
+# the modules whose code determines the assembler's output
+ASSEMBLER_SOURCES = ["Main.py", "Parser.py", "Code.py", "SymbolTable.py",
+                     "HackImage.py", "Optimizer.py"]
+
+
+def assembler_version() -> str:
+    """The version of the assembler is a hash of its own source files, so
+    cached outputs are invalidated by any change to the assembler.
+
+    Returns:
+        str: a hex digest identifying the current assembler.
+    """
+    digest = hashlib.sha256()
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for filename in ASSEMBLER_SOURCES:
+        with open(os.path.join(module_dir, filename), 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+class AssemblyCache:
+    """A content-addressed store of assembled outputs. Entries are keyed by
+    a hash of the source file, the assembler version and the output options,
+    so a stored output stays valid for as long as all three are unchanged.
+    """
+
+    __version = None
+
+    def __init__(self, directory: str) -> None:
+        """Opens the cache kept in the given directory, which is created on
+        the first store.
+
+        Args:
+            directory (str): the cache directory.
+        """
+        self.directory = directory
+        if AssemblyCache.__version is None:
+            AssemblyCache.__version = assembler_version()
+
+    def key(self, source: bytes, *options: typing.Any) -> str:
+        """
+        Args:
+            source (bytes): the contents of the source file.
+            options (typing.Any): every option that affects the output.
+
+        Returns:
+            str: the key of the output of assembling source with options.
+        """
+        digest = hashlib.sha256(AssemblyCache.__version.encode())
+        digest.update(repr(options).encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def fetch(self, key: str, *output_paths: str) -> bool:
+        """Copies the outputs stored under key to output_paths, if they are
+        all in the cache. Outputs are told apart by their file extension.
+
+        Args:
+            key (str): a key returned by key().
+            output_paths (str): where to write the cached outputs.
+
+        Returns:
+            bool: True on a cache hit, False otherwise.
+        """
+        entries = [self.__entry_path(key, path) for path in output_paths]
+        if not all(os.path.exists(entry) for entry in entries):
+            return False
+        try:
+            for entry, output_path in zip(entries, output_paths):
+                shutil.copyfile(entry, output_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key: str, *output_paths: str) -> None:
+        """Stores a copy of each of output_paths under key. The copies are
+        renamed into place, so concurrent assemblers never see a partial
+        entry.
+
+        Args:
+            key (str): a key returned by key().
+            output_paths (str): the outputs to store.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for output_path in output_paths:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            os.close(fd)
+            shutil.copyfile(output_path, tmp_path)
+            os.replace(tmp_path, self.__entry_path(key, output_path))
+
+    def __entry_path(self, key: str, output_path: str) -> str:
+        """
+        Args:
+            key (str): a key returned by key().
+            output_path (str): an output file.
+
+        Returns:
+            str: the path of the cache entry for that output under key.
+        """
+        return os.path.join(
+            self.directory, key + os.path.splitext(output_path)[1])
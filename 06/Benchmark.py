@@ -0,0 +1,259 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import tempfile
+import time
+import typing
+
+import Main
+from Code import Code
+from Parser import Parser
+from SymbolTable import SymbolTable
+
+
+# A block of typical translator output: pushes, pops, arithmetic, a forward
+# jump, a label and a static variable. Every block uses its own labels.
+BLOCK = """@SP
+A=M
+M=D
+@SP
+M=M+1
+@LCL
+D=M
+@{n}
+D=D+A
+@R13
+M=D
+@SP
+AM=M-1
+D=M
+@R13
+A=M
+M=D
+@Bench.{v}
+D=M
+@SKIP.{n}
+D;JGT
+@SP
+M=M-1
+(SKIP.{n})
+@5
+D=A
+@END.{n}
+0;JMP
+(END.{n})
+"""
+
+
+def generate_program(num_lines: int) -> typing.Iterator[str]:
+    """Yields about num_lines lines of assembly code.
+
+    Args:
+        num_lines (int): the number of lines to generate.
+
+    Returns:
+        typing.Iterator[str]: the lines of the program.
+    """
+    lines_per_block = BLOCK.count('\n')
+    for n in range(num_lines // lines_per_block):
+        yield BLOCK.format(n=n, v=n % 200)
+
+
+class LineParser:
+    """The parser as it was before commands were decoded into Instruction
+    records: it keeps the cleaned lines as strings, and every accessor
+    splits the current line again. It is kept here as the baseline that the
+    benchmark compares against.
+    """
+
+    def __init__(self, input_file: typing.Iterable[str]) -> None:
+        """
+        Args:
+            input_file (typing.Iterable[str]): input file.
+        """
+        self.program_lines = [line for _, line in
+                              Parser.clean_lines(input_file)]
+        self.num_of_lines = len(self.program_lines)
+        self.line_counter = 0
+        if self.num_of_lines > 0:
+            self.current_line = self.program_lines[0]
+
+    def has_more_commands(self) -> bool:
+        """Are there more commands in the input?
+
+        Returns:
+            bool: True if there are more commands, False otherwise.
+        """
+        return self.line_counter < self.num_of_lines
+
+    def advance(self) -> None:
+        """Reads the next command from the input and makes it the
+        current command. Should be called only if has_more_commands() is true.
+        """
+        self.line_counter += 1
+        if self.line_counter < self.num_of_lines:
+            self.current_line = self.program_lines[self.line_counter]
+
+    def reset(self) -> None:
+        """Resets the line_counter of the program."""
+        self.line_counter = -1
+        self.advance()
+
+    def command_type(self) -> str:
+        """
+        Returns:
+            str: the type of the current command:
+            "A_COMMAND" for @Xxx where Xxx is either a symbol or
+            a decimal number
+            "C_COMMAND" for dest=comp;jump
+            "L_COMMAND" (actually, pseudo-command) for (Xxx)
+            where Xxx is a symbol
+        """
+        if self.current_line.startswith('@'):
+            return "A_COMMAND"
+        if self.current_line.startswith('('):
+            return "L_COMMAND"
+        return "C_COMMAND"
+
+    def symbol(self) -> str:
+        """
+        Returns:
+            str: the symbol or decimal Xxx of the current command @Xxx or
+            (Xxx). Should be called only when command_type() is "A_COMMAND" or
+            "L_COMMAND".
+        """
+        if self.command_type() == "A_COMMAND":
+            return self.current_line[1:]
+        return self.current_line[1:-1]
+
+    def dest(self) -> str:
+        """
+        Returns:
+            str: the dest mnemonic in the current C-command. Should be called
+            only when command_type() is "C_COMMAND".
+        """
+        if '=' in self.current_line:
+            return self.current_line.split('=', 1)[0]
+        return 'null'
+
+    def comp(self) -> str:
+        """
+        Returns:
+            str: the comp mnemonic in the current C-command. Should be called
+            only when command_type() is "C_COMMAND".
+        """
+        if self.dest() != 'null':
+            tmp_dest = self.current_line.split('=', 1)[1]
+            return tmp_dest.split(';', 1)[0]
+        tmp_dest = self.current_line.split(';', 1)[0]
+        if tmp_dest == '':
+            return 'null'
+        return tmp_dest
+
+    def jump(self) -> str:
+        """
+        Returns:
+            str: the jump mnemonic in the current C-command. Should be called
+            only when command_type() is "C_COMMAND".
+        """
+        if ';' in self.current_line:
+            return self.current_line.split(';', 1)[1]
+        return 'null'
+
+
+def assemble_file_resplitting(input_file: typing.TextIO,
+                              output_file: typing.TextIO) -> None:
+    """Assembles a file with LineParser, in the two passes the assembler
+    used before Instruction records. Encoding and symbols go through the
+    current Code and SymbolTable, so only the parsing differs from
+    Main.assemble_file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    symbol_table = SymbolTable()
+    code = Code()
+    p = LineParser(input_file)
+
+    # first pass
+    command_counter = 0
+    while p.has_more_commands():
+        if p.command_type() == "L_COMMAND":
+            symbol_table.add_entry(p.symbol(), command_counter)
+        else:
+            command_counter += 1
+        p.advance()
+
+    # second pass
+    p.reset()
+    while p.has_more_commands():
+        if p.command_type() == "L_COMMAND":
+            p.advance()
+            continue
+        if p.command_type() == "C_COMMAND":
+            word = code.encode_c(p.comp(), p.dest(), p.jump())
+        elif p.symbol().isdigit():
+            word = int(p.symbol())
+        else:
+            word = symbol_table.resolve(p.symbol())
+        output_file.write(format(word, '016b') + '\n')
+        p.advance()
+
+
+def run(assemble: typing.Callable, input_path: str, repeat: int = 1
+        ) -> float:
+    """Assembles the given file and returns the elapsed time in seconds.
+
+    Args:
+        assemble (typing.Callable): assemble_file or one of its variants.
+        input_path (str): the file to assemble.
+        repeat (int): the number of times to assemble the file.
+
+    Returns:
+        float: the shortest elapsed wall clock time of all repeats.
+    """
+    times = []
+    for _ in range(repeat):
+        with open(input_path, 'r') as input_file, \
+                tempfile.TemporaryFile('w+') as output_file:
+            start = time.perf_counter()
+            assemble(input_file, output_file)
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if "__main__" == __name__:
+    # Generates a large program once and times every assembly mode on it,
+    # reporting instructions per second, and the speedup of decoding each
+    # line once over re-splitting it in every accessor.
+    arg_parser = argparse.ArgumentParser(prog="Benchmark")
+    arg_parser.add_argument("--lines", type=int, default=1000000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "Bench.asm")
+        with open(input_path, 'w') as input_file:
+            input_file.writelines(generate_program(args.lines))
+        with open(input_path, 'r') as input_file:
+            num_instructions = sum(
+                1 for line in input_file if not line.startswith('('))
+
+        modes = [("re-split", assemble_file_resplitting),
+                 ("two-pass", Main.assemble_file),
+                 ("streaming", Main.assemble_file_streaming)]
+        rates = {}
+        for name, assemble in modes:
+            elapsed = run(assemble, input_path, args.repeat)
+            rates[name] = num_instructions / elapsed
+            print("%-10s %9d instructions %7.2fs %12.0f instructions/s" % (
+                name, num_instructions, elapsed, rates[name]))
+        print("two-pass is %.2fx as fast as re-split" % (
+            rates["two-pass"] / rates["re-split"]))
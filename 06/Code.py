@@ -6,6 +6,58 @@ as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 
+# The encoding tables are built once, when the module is loaded.
+# DEST_BITS, JUMP_BITS and COMP_WORDS hold their field already shifted into
+# place in a 16-bit C-instruction, so an instruction is encoded by OR-ing
+# one value from each.
+DEST_BITS = {'null': 0b000 << 3,
+             'M': 0b001 << 3,
+             'D': 0b010 << 3,
+             'MD': 0b011 << 3,
+             'A': 0b100 << 3,
+             'AM': 0b101 << 3,
+             'AD': 0b110 << 3,
+             'AMD': 0b111 << 3}
+
+JUMP_BITS = {'null': 0b000,
+             'JGT': 0b001,
+             'JEQ': 0b010,
+             'JGE': 0b011,
+             'JLT': 0b100,
+             'JNE': 0b101,
+             'JLE': 0b110,
+             'JMP': 0b111}
+
+# the "a" bit and the six "c" bits of every comp mnemonic
+COMP_BITS = {'0': 0b0101010, '1': 0b0111111, '-1': 0b0111010,
+             'D': 0b0001100,
+             'A': 0b0110000, '!D': 0b0001101, '!A': 0b0110001,
+             '-D': 0b0001111,
+             '-A': 0b0110011, 'D+1': 0b0011111, 'A+1': 0b0110111,
+             'D-1': 0b0001110,
+             'A-1': 0b0110010, 'D+A': 0b0000010, 'D-A': 0b0010011,
+             'A-D': 0b0000111,
+             'D&A': 0b0000000, 'D|A': 0b0010101, 'M': 0b1110000,
+             '!M': 0b1110001,
+             '-M': 0b1110011, 'M+1': 0b1110111, 'M-1': 0b1110010,
+             'D+M': 0b1000010,
+             'D-M': 0b1010011, 'M-D': 0b1000111, 'D&M': 0b1000000,
+             'D|M': 0b1010101,
+             # commutative spellings of the same computations, such as the
+             # A=A+D that Fill.asm and the VM translators use
+             'A+D': 0b0000010, 'M+D': 0b1000010, 'A&D': 0b0000000,
+             'M&D': 0b1000000, 'A|D': 0b0010101, 'M|D': 0b1010101}
+SHIFT_COMP_BITS = {'A<<': 0b0100000, 'D<<': 0b0110000, 'M<<': 0b1100000,
+                   'A>>': 0b0000000,
+                   'D>>': 0b0010000, 'M>>': 0b1000000}
+
+# comp bits together with the instruction prefix: 111 for regular
+# instructions and 101 for the extended shift instructions
+COMP_WORDS = {mnemonic: 0b111 << 13 | bits << 6
+              for mnemonic, bits in COMP_BITS.items()}
+COMP_WORDS.update({mnemonic: 0b101 << 13 | bits << 6
+                   for mnemonic, bits in SHIFT_COMP_BITS.items()})
+
 
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
@@ -18,16 +70,13 @@ class Code:
 
         Returns:
             str: 3-bit long binary code of the given mnemonic.
+
+        Raises:
+            ValueError: if the mnemonic is not a dest mnemonic.
         """
-        dest_dict = {'null': '000',
-                     'M': '001',
-                     'D': '010',
-                     'MD': '011',
-                     'A': '100',
-                     'AM': '101',
-                     'AD': '110',
-                     'AMD': '111'}
-        return dest_dict.get(mnemonic)
+        if mnemonic not in DEST_BITS:
+            raise ValueError("invalid dest mnemonic: %s" % mnemonic)
+        return format(DEST_BITS[mnemonic] >> 3, '03b')
 
     @staticmethod
     def comp(mnemonic: str) -> str:
@@ -37,25 +86,15 @@ class Code:
 
         Returns:
             str: the binary code of the given mnemonic.
+
+        Raises:
+            ValueError: if the mnemonic is not a comp mnemonic.
         """
-        comp_dict = {'0': '0101010', '1': '0111111', '-1': '0111010',
-                     'D': '0001100',
-                     'A': '0110000', '!D': '0001101', '!A': '0110001',
-                     '-D': '0001111',
-                     '-A': '0110011', 'D+1': '0011111', 'A+1': '0110111',
-                     'D-1': '0001110',
-                     'A-1': '0110010', 'D+A': '0000010', 'D-A': '0010011',
-                     'A-D': '0000111',
-                     'D&A': '0000000', 'D|A': '0010101', 'M': '1110000',
-                     '!M': '1110001',
-                     '-M': '1110011', 'M+1': '1110111', 'M-1': '1110010',
-                     'D+M': '1000010',
-                     'D-M': '1010011', 'M-D': '1000111', 'D&M': '1000000',
-                     'D|M': '1010101',
-                     'A<<': '0100000', 'D<<': '0110000', 'M<<': '1100000',
-                     'A>>': '0000000',
-                     'D>>': '0010000', 'M>>': '1000000'}
-        return comp_dict.get(mnemonic)
+        if mnemonic in COMP_BITS:
+            return format(COMP_BITS[mnemonic], '07b')
+        if mnemonic in SHIFT_COMP_BITS:
+            return format(SHIFT_COMP_BITS[mnemonic], '07b')
+        raise ValueError("invalid comp mnemonic: %s" % mnemonic)
 
     @staticmethod
     def jump(mnemonic: str) -> str:
@@ -65,28 +104,27 @@ class Code:
 
         Returns:
             str: 3-bit long binary code of the given mnemonic.
+
+        Raises:
+            ValueError: if the mnemonic is not a jump mnemonic.
         """
-        jump_dict = {'null': '000',
-                     'JGT': '001',
-                     'JEQ': '010',
-                     'JGE': '011',
-                     'JLT': '100',
-                     'JNE': '101',
-                     'JLE': '110',
-                     'JMP': '111'}
-        return jump_dict.get(mnemonic)
+        if mnemonic not in JUMP_BITS:
+            raise ValueError("invalid jump mnemonic: %s" % mnemonic)
+        return format(JUMP_BITS[mnemonic], '03b')
 
     @staticmethod
-    def to_binary(num: str) -> str:
+    def encode_c(comp: str, dest: str, jump: str) -> int:
         """
         Args:
-            num (int): an integer.
+            comp (str): a comp mnemonic string.
+            dest (str): a dest mnemonic string.
+            jump (str): a jump mnemonic string.
 
         Returns:
-            str: 16-bit long binary code of the given integer.
+            int: the 16-bit machine word of the C-instruction dest=comp;jump.
         """
-        bin_num = bin(int(num))[2:]
-        bin_str = ''
-        for i in range(15 - len(bin_num)):
-            bin_str += '0'
-        return bin_str + bin_num
+        try:
+            return COMP_WORDS[comp] | DEST_BITS[dest] | JUMP_BITS[jump]
+        except KeyError as error:
+            raise ValueError("invalid C-instruction mnemonic: %s"
+                             % error.args[0]) from None
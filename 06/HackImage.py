@@ -0,0 +1,181 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import mmap
+import os
+import struct
+import sys
+import typing
+
+# A binary ROM image is a 12 byte header followed by the program as
+# little-endian uint16 words:
+#   magic (4 bytes) | version (uint16) | reserved (uint16) | words (uint32)
+HEADER = struct.Struct('<4sHHI')
+HEADER_SIZE = HEADER.size
+MAGIC = b'HACK'
+VERSION = 1
+WORD = struct.Struct('<H')
+
+
+class HackImage:
+    """Reads and writes packed binary ROM images, and converts them to and
+    from the textual .hack format.
+    """
+
+    @staticmethod
+    def header(num_words: int) -> bytes:
+        """
+        Args:
+            num_words (int): the number of words in the image.
+
+        Returns:
+            bytes: the header of an image holding num_words words.
+        """
+        return HEADER.pack(MAGIC, VERSION, 0, num_words)
+
+    @staticmethod
+    def word_to_bytes(word: int) -> bytes:
+        """
+        Args:
+            word (int): a 16-bit machine word.
+
+        Returns:
+            bytes: the word as it is stored in an image.
+        """
+        return WORD.pack(word)
+
+    @staticmethod
+    def bytes_to_word(data: bytes) -> int:
+        """
+        Args:
+            data (bytes): a word as it is stored in an image.
+
+        Returns:
+            int: the 16-bit machine word.
+        """
+        return WORD.unpack(data)[0]
+
+    @staticmethod
+    def read_header(header: bytes) -> int:
+        """Validates an image header.
+
+        Args:
+            header (bytes): the first HEADER_SIZE bytes of an image.
+
+        Returns:
+            int: the number of words in the image.
+        """
+        if len(header) < HEADER_SIZE:
+            raise ValueError("truncated ROM image header")
+        magic, version, _, num_words = HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError("not a Hack ROM image")
+        if version != VERSION:
+            raise ValueError("unsupported ROM image version %d" % version)
+        return num_words
+
+    @staticmethod
+    def write_binary(words: typing.Iterable[int],
+                     output_file: typing.BinaryIO) -> None:
+        """Writes words as a binary image with a single write.
+
+        Args:
+            words (typing.Iterable[int]): the machine words of the program.
+            output_file (typing.BinaryIO): writes the image to this file.
+        """
+        if not isinstance(words, array.array):
+            words = array.array('H', words)
+        if sys.byteorder == 'big':
+            words = array.array('H', words)
+            words.byteswap()
+        output_file.write(HackImage.header(len(words)) + words.tobytes())
+
+    @staticmethod
+    def read_binary(input_file: typing.BinaryIO) -> array.array:
+        """
+        Args:
+            input_file (typing.BinaryIO): a binary image.
+
+        Returns:
+            array.array: the machine words of the program, as 'H' items.
+        """
+        num_words = HackImage.read_header(input_file.read(HEADER_SIZE))
+        words = array.array('H')
+        data = input_file.read(2 * num_words)
+        if len(data) != 2 * num_words:
+            raise ValueError("truncated ROM image")
+        words.frombytes(data)
+        if sys.byteorder == 'big':
+            words.byteswap()
+        return words
+
+    @staticmethod
+    def map_binary(path: str) -> memoryview:
+        """Memory-maps a binary image without reading or parsing it.
+        The returned view holds native-order words, so it is only available
+        on little-endian machines.
+
+        Args:
+            path (str): path of a binary image.
+
+        Returns:
+            memoryview: a read-only view of the words of the program.
+        """
+        if sys.byteorder == 'big':
+            raise OSError("ROM images can only be mapped on little-endian "
+                          "machines, use read_binary instead")
+        with open(path, 'rb') as image_file:
+            image = mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ)
+        num_words = HackImage.read_header(image[:HEADER_SIZE])
+        view = memoryview(image)[HEADER_SIZE:HEADER_SIZE + 2 * num_words]
+        return view.cast('H')
+
+    @staticmethod
+    def text_to_binary(input_file: typing.TextIO,
+                       output_file: typing.BinaryIO) -> None:
+        """Converts a textual .hack file into a binary image.
+
+        Args:
+            input_file (typing.TextIO): a .hack file.
+            output_file (typing.BinaryIO): writes the image to this file.
+        """
+        HackImage.write_binary(
+            (int(line, 2) for line in input_file if line.strip()),
+            output_file)
+
+    @staticmethod
+    def binary_to_text(input_file: typing.BinaryIO,
+                       output_file: typing.TextIO) -> None:
+        """Converts a binary image into a textual .hack file.
+
+        Args:
+            input_file (typing.BinaryIO): a binary image.
+            output_file (typing.TextIO): writes the .hack file to this file.
+        """
+        output_file.writelines(
+            format(word, '016b') + '\n'
+            for word in HackImage.read_binary(input_file))
+
+
+if "__main__" == __name__:
+    # Converts a .hack file into a .rom image next to it, or the other way
+    # around, depending on the extension of the input path.
+    if not len(sys.argv) == 2:
+        sys.exit("Invalid usage, please use: HackImage <input path>")
+    input_path = os.path.abspath(sys.argv[1])
+    filename, extension = os.path.splitext(input_path)
+    if extension.lower() == ".hack":
+        with open(input_path, 'r') as input_file, \
+                open(filename + ".rom", 'wb') as output_file:
+            HackImage.text_to_binary(input_file, output_file)
+    elif extension.lower() == ".rom":
+        with open(input_path, 'rb') as input_file, \
+                open(filename + ".hack", 'w') as output_file:
+            HackImage.binary_to_text(input_file, output_file)
+    else:
+        sys.exit("Expected a .hack or a .rom file")
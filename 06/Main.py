@@ -5,91 +5,464 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import array
+import concurrent.futures
+import contextlib
+import itertools
 import os
 import sys
 import typing
 
 from SymbolTable import SymbolTable
-from Parser import Parser
+from Parser import Parser, Instruction
 from Code import Code
+from HackImage import HackImage
+from AssemblyCache import AssemblyCache, CACHE_DIRNAME
+from Optimizer import Optimizer
 
+# the longest distance between two references to a symbol that a placeholder
+# of the streaming assembler can link, in words
+MAX_LINK = 0xFFFF
+
+# columns of a .lst listing: ROM address, word, source line, source
+LISTING_HEADER = "%5s  %-16s  %6s  %s\n" % ("ROM", "Word", "Line", "Source")
+LISTING_LINE = "%5s  %16s  %6d  %s\n"
 
-def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Assembles a single file.
+
+def assemble_instructions(
+        instructions: typing.List[Instruction],
+        symbol_table: typing.Optional[SymbolTable] = None,
+        listing_file: typing.Optional[typing.TextIO] = None
+) -> typing.Iterator[int]:
+    """Assembles decoded commands in two passes over them.
 
     Args:
-        input_file (typing.TextIO): the file to assemble.
-        output_file (typing.TextIO): writes all output to this file.
+        instructions (typing.List[Instruction]): the commands to assemble.
+        symbol_table (typing.Optional[SymbolTable]): the table to fill, so
+            that it can be inspected afterwards. A new one is used if None.
+        listing_file (typing.Optional[typing.TextIO]): if given, a listing
+            of every ROM address with its word and source line is written to
+            it by the second pass, as the words are generated.
+
+    Returns:
+        typing.Iterator[int]: the machine words of the program, in order.
     """
     # initialization
-    address_counter = 16
-    symbol_table = SymbolTable()
+    if symbol_table is None:
+        symbol_table = SymbolTable()
     code = Code()
-    p = Parser(input_file)
 
     # first pass
     command_counter = 0
-    while p.has_more_commands():
-        if p.command_type() == "L_COMMAND":
-            symbol_table.add_entry(p.symbol(), command_counter)
+    for instruction in instructions:
+        if instruction.kind == "L_COMMAND":
+            symbol_table.add_entry(instruction.symbol, command_counter)
         else:
             command_counter += 1
-        
-        p.advance()
-    
+
     # second pass
-    p.reset()
-    binary_line = ''
-    while p.has_more_commands():       
-        if p.command_type() == "C_COMMAND":
-            # add support for shift
-            if '<<' in p.comp() or '>>' in p.comp():
-                binary_line = '101' 
+    if listing_file is not None:
+        listing_file.write(LISTING_HEADER)
+    command_counter = 0
+    for instruction in instructions:
+        kind = instruction.kind
+        if kind == "L_COMMAND":
+            if listing_file is not None:
+                listing_file.write(LISTING_LINE % (
+                    "", "", instruction.line, "(%s)" % instruction.symbol))
+            continue
+
+        if kind == "C_COMMAND":
+            # shift instructions get their 101 prefix from the comp table
+            word = code.encode_c(
+                instruction.comp, instruction.dest, instruction.jump)
+
+        else:
+            symbol = instruction.symbol
+            if symbol.isdigit():
+                word = int(symbol)
             else:
-                binary_line = '111'
-           
-            binary_line += code.comp(p.comp()) + \
-                    code.dest(p.dest()) + code.jump(p.jump())
-                
-        if p.command_type() == "L_COMMAND":
-            p.advance()
+                word = symbol_table.resolve(symbol)
+
+        if listing_file is not None:
+            listing_file.write(LISTING_LINE % (
+                command_counter, format(word, '016b'), instruction.line,
+                _source_text(instruction)))
+        command_counter += 1
+        yield word
+
+
+def assemble(
+        source: typing.Union[str, typing.Iterable[str]],
+        optimizer: typing.Optional[Optimizer] = None,
+        symbol_table: typing.Optional[SymbolTable] = None
+) -> typing.Iterator[int]:
+    """Assembles a program held in memory, without any files. For example,
+    the assembly code a VM translator wrote into an io.StringIO can be
+    assembled with assemble(buffer.getvalue()), or assemble(buffer) after
+    a seek(0).
+
+    Args:
+        source (typing.Union[str, typing.Iterable[str]]): the program, as a
+            string or as any iterable of lines, such as a list, a generator
+            or an open file.
+        optimizer (typing.Optional[Optimizer]): if given, the program is
+            optimized with it before it is encoded.
+        symbol_table (typing.Optional[SymbolTable]): the table to fill, so
+            that it can be inspected afterwards. A new one is used if None.
+
+    Returns:
+        typing.Iterator[int]: the machine words of the program, in order.
+        They are generated lazily, as the second pass advances.
+    """
+    instructions = Parser(source).instructions
+    if optimizer is not None:
+        instructions = optimizer.optimize(instructions)
+    return assemble_instructions(instructions, symbol_table)
+
+
+def assemble_file(
+        input_file: typing.TextIO, output_file: typing.IO,
+        binary: bool = False,
+        optimizer: typing.Optional[Optimizer] = None,
+        listing_file: typing.Optional[typing.TextIO] = None,
+        symbols_file: typing.Optional[typing.TextIO] = None) -> None:
+    """Assembles a single file.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.IO): writes all output to this file.
+        binary (bool): if True, output_file is a binary file and receives a
+            packed ROM image instead of the textual .hack format.
+        optimizer (typing.Optional[Optimizer]): if given, the program is
+            optimized with it before it is encoded.
+        listing_file (typing.Optional[typing.TextIO]): if given, receives a
+            listing of the program, see assemble_instructions.
+        symbols_file (typing.Optional[typing.TextIO]): if given, receives
+            the labels and variables of the program, see write_symbol_map.
+    """
+    instructions = Parser(input_file).instructions
+    if optimizer is not None:
+        instructions = optimizer.optimize(instructions)
+    symbol_table = SymbolTable()
+    words = assemble_instructions(instructions, symbol_table, listing_file)
+    if binary:
+        HackImage.write_binary(array.array('H', words), output_file)
+    else:
+        output_file.writelines(format(word, '016b') + '\n' for word in words)
+    if symbols_file is not None:
+        write_symbol_map(symbol_table, symbols_file)
+
+
+def write_symbol_map(
+        symbol_table: SymbolTable, output_file: typing.TextIO) -> None:
+    """Writes the labels and variables of an assembled program, one
+    "symbol address" pair per line. Labels come first, with their ROM
+    addresses, followed by variables with their RAM addresses.
+
+    Args:
+        symbol_table (SymbolTable): the table filled by the assembler.
+        output_file (typing.TextIO): writes the symbol map to this file.
+    """
+    output_file.write("// labels (ROM addresses)\n")
+    output_file.writelines(
+        "%s %d\n" % entry for entry in symbol_table.labels())
+    output_file.write("// variables (RAM addresses)\n")
+    output_file.writelines(
+        "%s %d\n" % entry for entry in symbol_table.variables())
+
+
+def _source_text(instruction: Instruction) -> str:
+    """
+    Args:
+        instruction (Instruction): an A- or C-command.
+
+    Returns:
+        str: the command in assembly syntax, without spaces or comments.
+    """
+    if instruction.kind == "A_COMMAND":
+        return "@" + instruction.symbol
+    text = instruction.comp
+    if instruction.dest != "null":
+        text = instruction.dest + "=" + text
+    if instruction.jump != "null":
+        text += ";" + instruction.jump
+    return text
+
+
+def assemble_file_streaming(
+        input_file: typing.TextIO, output_file: typing.IO,
+        binary: bool = False) -> None:
+    """Assembles a single file in a single pass over the input.
+
+    Lines are pulled from the input one at a time and code is written as soon
+    as it is parsed. An A-command whose symbol is not known yet is written as
+    a placeholder. The fixup table holds the last such reference to each
+    symbol, and every placeholder holds the distance back to the previous
+    reference to the same symbol, or 0 for the first one, so the references
+    to a symbol form a chain through the output. Once the input is
+    exhausted, symbols that turned out to be labels get their ROM address
+    and the rest are allocated as variables in order of first appearance,
+    and each chain is walked to patch its placeholders. The output is
+    identical to assemble_file's. Memory grows with the number of symbols
+    instead of with the number of lines or references.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.IO): writes all output to this file. Must be
+            seekable and readable, since placeholders are read back and
+            patched in place.
+        binary (bool): if True, output_file is a binary file and receives a
+            packed ROM image instead of the textual .hack format.
+    """
+    # initialization
+    symbol_table = SymbolTable()
+    code = Code()
+    # symbol -> the index of the last word that refers to it
+    fixups = {}
+    # the (symbol, index) ends of chains that were cut, since the next
+    # reference was more than MAX_LINK words further
+    cut_chains = []
+    if binary:
+        # the header is rewritten with the final word count at the end
+        output_file.write(HackImage.header(0))
+        encode_word = HackImage.word_to_bytes
+        decode_word = HackImage.bytes_to_word
+    else:
+        encode_word = _word_to_line
+        decode_word = _line_to_word
+    start_of_words = output_file.tell()
+
+    # single pass
+    command_counter = 0
+    for instruction in Parser(input_file, streaming=True):
+        kind = instruction.kind
+        if kind == "L_COMMAND":
+            symbol_table.add_entry(instruction.symbol, command_counter)
             continue
-        
-        if p.command_type() == "A_COMMAND":
-            if (p.symbol()).isdigit():
-                binary_line = '0' + code.to_binary(p.symbol())
+
+        if kind == "C_COMMAND":
+            # shift instructions get their 101 prefix from the comp table
+            word = code.encode_c(
+                instruction.comp, instruction.dest, instruction.jump)
+
+        else:
+            symbol = instruction.symbol
+            if symbol.isdigit():
+                word = int(symbol)
+            elif symbol_table.contains(symbol):
+                word = symbol_table.get_address(symbol)
             else:
-                if not symbol_table.contains(p.symbol()):
-                    symbol_table.add_entry(p.symbol(), address_counter)
-                    address_counter += 1
+                # forward reference, patched once all labels are known
+                word = command_counter - fixups.get(symbol, command_counter)
+                if word > MAX_LINK:
+                    cut_chains.append((symbol, fixups[symbol]))
+                    word = 0
+                fixups[symbol] = command_counter
+
+        output_file.write(encode_word(word))
+        command_counter += 1
+
+    # resolve the fixup table, allocating variables in order of first
+    # appearance, and walk the chains
+    end_of_output = output_file.tell()
+    if command_counter > 0:
+        word_size = (end_of_output - start_of_words) // command_counter
+    for symbol, index in itertools.chain(fixups.items(), cut_chains):
+        encoded_word = encode_word(symbol_table.resolve(symbol))
+        while True:
+            position = start_of_words + index * word_size
+            output_file.seek(position)
+            link = decode_word(output_file.read(len(encoded_word)))
+            output_file.seek(position)
+            output_file.write(encoded_word)
+            if link == 0:
+                break
+            index -= link
+    if binary:
+        output_file.seek(0)
+        output_file.write(HackImage.header(command_counter))
+    output_file.seek(end_of_output)
+
+
+def _line_to_word(line: str) -> int:
+    """
+    Args:
+        line (str): a line of a textual .hack file.
+
+    Returns:
+        int: the 16-bit machine word on the line.
+    """
+    return int(line[:16], 2)
+
+
+def _word_to_line(word: int) -> str:
+    """
+    Args:
+        word (int): a 16-bit machine word.
+
+    Returns:
+        str: the word as a line of a textual .hack file.
+    """
+    return format(word, '016b') + '\n'
+
+
+class AssemblyResult(typing.NamedTuple):
+    """The outcome of assembling one file with assemble_path."""
+    # None on success, otherwise an error message
+    error: typing.Optional[str] = None
+    # True if the output was copied from the cache
+    cache_hit: bool = False
+    # the optimizer's statistics, None if the file was not optimized
+    stats: typing.Optional[typing.Dict[str, int]] = None
+
+
+def assemble_path(
+        input_path: str, stream: bool = False, binary: bool = False,
+        cache: bool = False, optimize: bool = False,
+        listing: bool = False) -> AssemblyResult:
+    """Assembles the .asm file at input_path into a .hack (or .rom) file next
+    to it. Errors are returned rather than raised, so that one bad file does
+    not abort a batch, and partially written output files are removed.
+
+    Args:
+        input_path (str): path of the file to assemble.
+        stream (bool): assemble with assemble_file_streaming.
+        binary (bool): write a packed binary .rom image.
+        cache (bool): reuse the outputs stored in the .hackcache directory
+            next to the file if the file has not changed since.
+        optimize (bool): run the peephole optimizer before encoding. Cannot
+            be combined with stream.
+        listing (bool): also write a .lst listing and a .sym symbol map.
+            Cannot be combined with stream.
+
+    Returns:
+        AssemblyResult: the outcome of assembling the file.
+    """
+    filename, extension = os.path.splitext(input_path)
+    if binary:
+        output_path, output_mode = filename + ".rom", 'w+b'
+    else:
+        output_path, output_mode = filename + ".hack", 'w+'
+    output_paths = [output_path]
+    if listing:
+        output_paths += [filename + ".lst", filename + ".sym"]
+    optimizer = Optimizer() if optimize else None
+    try:
+        if cache:
+            assembly_cache = AssemblyCache(os.path.join(
+                os.path.dirname(input_path), CACHE_DIRNAME))
+            with open(input_path, 'rb') as input_file:
+                key = assembly_cache.key(
+                    input_file.read(), binary, optimize, listing)
+            if assembly_cache.fetch(key, *output_paths):
+                return AssemblyResult(cache_hit=True)
+
+        with contextlib.ExitStack() as files:
+            input_file = files.enter_context(open(input_path, 'r'))
+            output_file = files.enter_context(
+                open(output_path, output_mode))
+            if stream:
+                assemble_file_streaming(input_file, output_file, binary)
+            elif listing:
+                assemble_file(
+                    input_file, output_file, binary, optimizer,
+                    files.enter_context(open(output_paths[1], 'w')),
+                    files.enter_context(open(output_paths[2], 'w')))
+            else:
+                assemble_file(input_file, output_file, binary, optimizer)
+
+        if cache:
+            assembly_cache.store(key, *output_paths)
+    except Exception as error:
+        for path in output_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return AssemblyResult(
+            error="%s: %s" % (type(error).__name__, error))
+    return AssemblyResult(stats=optimizer and optimizer.stats)
 
-                address = symbol_table.get_address(p.symbol())
-                binary_line = '0' + code.to_binary(str(address))
-        
-        output_file.write(binary_line + '\n')
-        p.advance()
 
 if "__main__" == __name__:
-    # Parses the input path and calls assemble_file on each input file.
+    # Parses the input path and calls assemble_path on each input file.
     # This opens both the input and the output files!
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(prog="Assembler")
+    arg_parser.add_argument("input_path")
+    arg_parser.add_argument(
+        "--stream", action="store_true",
+        help="assemble in a single pass without reading whole files "
+             "into memory")
+    arg_parser.add_argument(
+        "--binary", action="store_true",
+        help="write packed binary .rom images instead of .hack files")
+    arg_parser.add_argument(
+        "--jobs", type=int, default=1, metavar="N",
+        help="assemble files in N parallel processes (0 uses all cores)")
+    arg_parser.add_argument(
+        "--cache", action="store_true",
+        help="skip files whose output is in the %s directory and is "
+             "still valid" % CACHE_DIRNAME)
+    arg_parser.add_argument(
+        "--optimize", action="store_true",
+        help="run the peephole optimizer and report what each rule removed")
+    arg_parser.add_argument(
+        "--listing", action="store_true",
+        help="also write a .lst listing and a .sym symbol map of each file")
+    args = arg_parser.parse_args()
+    if args.optimize and args.stream:
+        arg_parser.error("--optimize needs the whole program in memory and "
+                         "cannot be combined with --stream")
+    if args.listing and args.stream:
+        arg_parser.error("--listing is written by the second pass and "
+                         "cannot be combined with --stream")
+    argument_path = os.path.abspath(args.input_path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+            for filename in sorted(os.listdir(argument_path))]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm"]
+
+    streams = itertools.repeat(args.stream)
+    binaries = itertools.repeat(args.binary)
+    caches = itertools.repeat(args.cache)
+    optimizes = itertools.repeat(args.optimize)
+    listings = itertools.repeat(args.listing)
+    jobs = args.jobs or os.cpu_count()
+    if jobs > 1 and len(files_to_assemble) > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(
+                assemble_path, files_to_assemble, streams, binaries, caches,
+                optimizes, listings))
+    else:
+        results = list(map(
+            assemble_path, files_to_assemble, streams, binaries, caches,
+            optimizes, listings))
+
+    # errors are reported in file order, whatever order they finished in
+    failures = 0
+    cache_hits = 0
+    total_stats = dict.fromkeys(Optimizer.RULES, 0)
+    for input_path, result in zip(files_to_assemble, results):
+        if result.error is not None:
+            print("%s: %s" % (input_path, result.error), file=sys.stderr)
+            failures += 1
+        cache_hits += result.cache_hit
+        for rule, count in (result.stats or {}).items():
+            total_stats[rule] += count
+    if args.optimize:
+        for rule in Optimizer.RULES:
+            print("optimizer: %-15s %d" % (rule, total_stats[rule]))
+    if args.cache:
+        print("cache: %d hits, %d misses" % (
+            cache_hits, len(files_to_assemble) - cache_hits))
+    if failures:
+        sys.exit("%d of %d files failed to assemble"
+                 % (failures, len(files_to_assemble)))
@@ -0,0 +1,182 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Parser import Instruction
+
+
+class Optimizer:
+    """A peephole optimizer over decoded assembly commands. It runs before
+    the first pass of the assembler, so labels are resolved against the
+    optimized program. Its rules are:
+    - "redundant_load": drops @X when the A register already holds X.
+    - "jump_threading": retargets a jump whose target label is itself an
+      unconditional jump to the final target.
+    - "unreachable": drops commands between an unconditional jump and the
+      next label.
+    """
+
+    RULES = ["redundant_load", "jump_threading", "unreachable"]
+
+    def __init__(self) -> None:
+        """Creates an optimizer with all statistics at zero."""
+        # rule name -> instructions it removed, or for "jump_threading",
+        # jumps it retargeted
+        self.stats = dict.fromkeys(Optimizer.RULES, 0)
+
+    def optimize(
+            self, instructions: typing.List[Instruction]
+    ) -> typing.List[Instruction]:
+        """Applies all the rules until none of them changes the program.
+
+        Args:
+            instructions (typing.List[Instruction]): the program.
+
+        Returns:
+            typing.List[Instruction]: the optimized program.
+        """
+        instructions = list(instructions)
+        changed = True
+        while changed:
+            changed = self.__thread_jumps(instructions)
+            optimized = self.__remove_unreachable(instructions)
+            optimized = self.__remove_redundant(optimized)
+            changed = changed or len(optimized) != len(instructions)
+            instructions = optimized
+        return instructions
+
+    @staticmethod
+    def is_unconditional_jump(instruction: Instruction) -> bool:
+        """
+        Args:
+            instruction (Instruction): a command.
+
+        Returns:
+            bool: True if the command always jumps.
+        """
+        return instruction.kind == "C_COMMAND" and instruction.jump == "JMP"
+
+    @staticmethod
+    def __uses_a(instruction: Instruction) -> bool:
+        """
+        Args:
+            instruction (Instruction): a C-command.
+
+        Returns:
+            bool: True if the command reads A, or accesses M.
+        """
+        return 'A' in instruction.comp or 'M' in instruction.comp or \
+            'M' in instruction.dest
+
+    def __thread_jumps(self, instructions: typing.List[Instruction]) -> bool:
+        """Retargets, in place, jumps that land on an unconditional jump.
+
+        Args:
+            instructions (typing.List[Instruction]): the program.
+
+        Returns:
+            bool: True if any jump was retargeted.
+        """
+        # label -> target of the "@target, 0;JMP" that the label marks
+        forwards = {}
+        pending_labels = []
+        for index, instruction in enumerate(instructions):
+            if instruction.kind == "L_COMMAND":
+                pending_labels.append(instruction.symbol)
+                continue
+            if pending_labels and instruction.kind == "A_COMMAND" and \
+                    index + 1 < len(instructions) and \
+                    instructions[index + 1][:5] == (
+                        "C_COMMAND", None, "null", "0", "JMP"):
+                for label in pending_labels:
+                    forwards[label] = instruction.symbol
+            pending_labels = []
+
+        changed = False
+        for index in range(len(instructions) - 1):
+            instruction = instructions[index]
+            if instruction.kind != "A_COMMAND" or \
+                    instruction.symbol not in forwards:
+                continue
+            jump = instructions[index + 1]
+            if jump.kind != "C_COMMAND" or jump.jump == "null" or \
+                    self.__uses_a(jump) or 'A' in jump.dest:
+                continue
+            # when the jump is not taken, A must not be read before it is
+            # loaded again, since it now holds a different address
+            if not self.is_unconditional_jump(jump) and not (
+                    index + 2 < len(instructions) and
+                    instructions[index + 2].kind == "A_COMMAND"):
+                continue
+
+            target = instruction.symbol
+            seen = {target}
+            while target in forwards and forwards[target] not in seen:
+                target = forwards[target]
+                seen.add(target)
+            if target in forwards:
+                # the jump chain is a cycle, leave it alone
+                continue
+            instructions[index] = instruction._replace(symbol=target)
+            self.stats["jump_threading"] += 1
+            changed = True
+        return changed
+
+    def __remove_unreachable(
+            self, instructions: typing.List[Instruction]
+    ) -> typing.List[Instruction]:
+        """
+        Args:
+            instructions (typing.List[Instruction]): the program.
+
+        Returns:
+            typing.List[Instruction]: the program without the commands that
+            follow an unconditional jump and precede the next label.
+        """
+        optimized = []
+        reachable = True
+        for instruction in instructions:
+            if instruction.kind == "L_COMMAND":
+                reachable = True
+            elif not reachable:
+                self.stats["unreachable"] += 1
+                continue
+            optimized.append(instruction)
+            if self.is_unconditional_jump(instruction):
+                reachable = False
+        return optimized
+
+    def __remove_redundant(
+            self, instructions: typing.List[Instruction]
+    ) -> typing.List[Instruction]:
+        """
+        Args:
+            instructions (typing.List[Instruction]): the program.
+
+        Returns:
+            typing.List[Instruction]: the program without redundant loads of
+            A.
+        """
+        optimized = []
+        # the symbol A is known to hold, None if it is unknown
+        a_value = None
+        for instruction in instructions:
+            kind = instruction.kind
+            if kind == "L_COMMAND":
+                # control may reach a label from anywhere
+                a_value = None
+            elif kind == "A_COMMAND":
+                if instruction.symbol == a_value:
+                    self.stats["redundant_load"] += 1
+                    continue
+                a_value = instruction.symbol
+            else:
+                if 'A' in instruction.dest:
+                    a_value = None
+            optimized.append(instruction)
+        return optimized
@@ -5,11 +5,33 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-from re import T
-import re
+import gc
+import sys
 import typing
 
 
+class Instruction(typing.NamedTuple):
+    """A pre-decoded assembly command. Lines are split into their fields
+    exactly once, when they are parsed, and the passes of the assembler only
+    read fields of these records afterwards.
+    """
+    # "A_COMMAND", "C_COMMAND" or "L_COMMAND", see Parser.command_type()
+    kind: str
+    # Xxx of @Xxx or (Xxx), None for C-commands
+    symbol: typing.Optional[str] = None
+    # the mnemonics of dest=comp;jump, None for A- and L-commands
+    dest: typing.Optional[str] = None
+    comp: typing.Optional[str] = None
+    jump: typing.Optional[str] = None
+    # the number of the source line the command was read from
+    line: int = 0
+
+
+# builds an Instruction from a tuple of all its fields, without going
+# through the keyword handling of the generated constructor
+_new_instruction = tuple.__new__
+
+
 class Parser:
     """Encapsulates access to the input code. Reads an assembly program
     by reading each command line-by-line, parses the current command,
@@ -17,23 +39,126 @@ class Parser:
     and symbols). In addition, removes all white space and comments.
     """
 
-    def __init__(self, input_file: typing.TextIO) -> None:
+    def __init__(self, input_file: typing.Union[str, typing.Iterable[str]],
+                 streaming: bool = False) -> None:
         """Opens the input file and gets ready to parse it.
 
         Args:`
-            input_file (typing.TextIO): input file.
+            input_file (typing.Union[str, typing.Iterable[str]]): input file,
+                or any other iterable of lines, or the program as a string.
+            streaming (bool): if True, lines are pulled from the input one at
+                a time instead of being read up front. A streaming parser
+                can only be traversed once, so reset() is not available.
+        """
+        self.streaming = streaming
+        if streaming:
+            self.instructions = None
+            self.__stream = Parser.parse_lines(input_file)
+            self.current = next(self.__stream, None)
+            return
+
+        # the records hold no reference cycles, but every million of them
+        # would otherwise trigger several full collections while the list
+        # grows, which costs about as much as the parsing itself
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.instructions = [
+                Parser.parse_line(line, line_number)
+                for line_number, line in Parser.clean_lines(input_file)]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.num_of_lines = len(self.instructions)
+        self.line_counter = 0
+        if self.num_of_lines > 0:
+            self.current = self.instructions[self.line_counter]
+
+    def __iter__(self) -> typing.Iterator[Instruction]:
+        """Iterates over the decoded commands of the input. A streaming
+        parser yields each command once, as it is read.
+
+        Returns:
+            typing.Iterator[Instruction]: the commands, in order.
         """
-        self.program_lines = []
+        if self.streaming:
+            if self.current is not None:
+                yield self.current
+                self.current = None
+            yield from self.__stream
+        else:
+            yield from self.instructions
 
+    @staticmethod
+    def parse_line(line: str, line_number: int = 0) -> Instruction:
+        """Decodes a single cleaned line into its fields.
+
+        Args:
+            line (str): a line without spaces or comments.
+            line_number (int): the number of the line in the source.
+
+        Returns:
+            Instruction: the decoded command.
+        """
+        # symbols are interned, so every occurrence of a symbol and its key
+        # in the symbol table share a single string
+        if line[0] == '@':
+            return _new_instruction(Instruction, (
+                "A_COMMAND", sys.intern(line[1:]), None, None, None,
+                line_number))
+        if line[0] == '(':
+            return _new_instruction(Instruction, (
+                "L_COMMAND", sys.intern(line[1:-1]), None, None, None,
+                line_number))
+
+        dest = 'null'
+        jump = 'null'
+        if '=' in line:
+            dest, line = line.split('=', 1)
+        if ';' in line:
+            line, jump = line.split(';', 1)
+        if line == '':
+            line = 'null'
+        return _new_instruction(Instruction, (
+            "C_COMMAND", None, dest, line, jump, line_number))
+
+    @staticmethod
+    def parse_lines(
+            input_file: typing.Union[str, typing.Iterable[str]]
+    ) -> typing.Iterator[Instruction]:
+        """Lazily decodes the lines of the input.
+
+        Args:
+            input_file (typing.Union[str, typing.Iterable[str]]): input file,
+                or any other iterable of lines, or the program as a string.
+
+        Returns:
+            typing.Iterator[Instruction]: the decoded commands, in order.
+        """
+        for line_number, line in Parser.clean_lines(input_file):
+            yield Parser.parse_line(line, line_number)
+
+    @staticmethod
+    def clean_lines(input_file: typing.Union[str, typing.Iterable[str]]
+                    ) -> typing.Iterator[typing.Tuple[int, str]]:
+        """Lazily yields the lines of the input with all spaces and comments
+        removed, skipping lines that are left empty.
+
+        Args:
+            input_file (typing.Union[str, typing.Iterable[str]]): input file,
+                or any other iterable of lines, or the program as a string.
+
+        Returns:
+            typing.Iterator[typing.Tuple[int, str]]: the number of each
+            cleaned line, counting from 1, and the cleaned line, in order.
+        """
+        if isinstance(input_file, str):
+            input_file = input_file.splitlines()
         # remove spaces and comments 
-        for line in input_file.read().splitlines():
-            n_line = line.replace(' ', '').split('//', 1)[0]
+        for line_number, line in enumerate(input_file, 1):
+            n_line = line.replace(' ', '').split('//', 1)[0].strip()
             if n_line != '':
-                self.program_lines.append(n_line)
-
-        self.num_of_lines = len(self.program_lines)
-        self.line_counter = 0
-        self.current_line = self.program_lines[self.line_counter]
+                yield line_number, n_line
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -41,15 +166,20 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
+        if self.streaming:
+            return self.current is not None
         return self.line_counter < self.num_of_lines
 
     def advance(self) -> None:
         """Reads the next command from the input and makes it the
         current command. Should be called only if has_more_commands() is true.
         """
+        if self.streaming:
+            self.current = next(self.__stream, None)
+            return
         self.line_counter += 1
         if self.line_counter < self.num_of_lines:
-            self.current_line = self.program_lines[self.line_counter]
+            self.current = self.instructions[self.line_counter]
 
     def command_type(self) -> str:
         """
@@ -61,11 +191,7 @@ class Parser:
             "L_COMMAND" (actually, pseudo-command) for (Xxx)
             where Xxx is a symbol
         """
-        if self.current_line.startswith('@'):
-            return "A_COMMAND"
-        if self.current_line.startswith('('):
-            return "L_COMMAND"
-        return "C_COMMAND"
+        return self.current.kind
 
     def symbol(self) -> str:
         """
@@ -74,10 +200,7 @@ class Parser:
             (Xxx). Should be called only when command_type() is "A_COMMAND" or 
             "L_COMMAND".
         """
-        if self.command_type() == "A_COMMAND":
-            return self.current_line[1:]
-        if self.command_type() == "L_COMMAND":
-            return self.current_line[1:-1]
+        return self.current.symbol
 
     def dest(self) -> str:
         """
@@ -85,9 +208,7 @@ class Parser:
             str: the dest mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        if '=' in self.current_line:
-            return self.current_line.split('=', 1)[0]
-        return 'null'
+        return self.current.dest
 
     def comp(self) -> str:
         """
@@ -95,15 +216,7 @@ class Parser:
             str: the comp mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        if self.dest() != 'null':
-            tmp_dest = self.current_line.split('=', 1)[1]
-            return tmp_dest.split(';', 1)[0]
-
-        else:
-            tmp_dest = self.current_line.split(';', 1)[0]
-            if tmp_dest == '':
-                return 'null'
-            return tmp_dest
+        return self.current.comp
 
     def jump(self) -> str:
         """
@@ -111,12 +224,12 @@ class Parser:
             str: the jump mnemonic in the current C-command. Should be called 
             only when commandType() is "C_COMMAND".
         """
-        if ';' in self.current_line:
-            return self.current_line.split(';', 1)[1]
-        return 'null'
+        return self.current.jump
 
     def reset(self) -> None:
         """Resets the line_counter of the program
         """
+        if self.streaming:
+            raise ValueError("a streaming parser cannot be reset")
         self.line_counter = -1
         self.advance()
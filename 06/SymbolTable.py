@@ -5,7 +5,15 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import sys
+import typing
 
+# Every entry of the table holds its address in the low 16 bits and its kind
+# above them, so that a single dictionary serves both lookups and listings.
+ADDRESS_MASK = 0xFFFF
+PREDEFINED = 0 << 16
+LABEL = 1 << 16
+VARIABLE = 2 << 16
 
 class SymbolTable:
     """
@@ -23,8 +31,16 @@ class SymbolTable:
                              "R10": 10, "R11": 11, "R12": 12, "R13": 13,
                              "R14": 14, "R15": 15, "SCREEN": 16384,
                              "KBD": 24576,
-                             "SP": 0, "LCL": 1, "ARG": 2, "THIS": 3, "THAT": 4,
-                             "LOOP": 4, "STOP": 18, "i": 16, "sum": 17}
+                             "SP": 0, "LCL": 1, "ARG": 2, "THIS": 3, "THAT": 4}
+        # the RAM address given to the next new variable
+        self.next_variable = 16
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            int: the number of symbols in the table, predefined ones included.
+        """
+        return len(self.symbol_table)
 
     def add_entry(self, symbol: str, address: int) -> None:
         """Adds the pair (symbol, address) to the table.
@@ -33,7 +49,7 @@ class SymbolTable:
             symbol (str): the symbol to add.
             address (int): the address corresponding to the symbol.
         """
-        self.symbol_table[symbol] = address
+        self.symbol_table[sys.intern(symbol)] = address | LABEL
 
     def contains(self, symbol: str) -> bool:
         """Does the symbol table contain the given symbol?
@@ -55,4 +71,70 @@ class SymbolTable:
         Returns:
             int: the address associated with the symbol.
         """
-        return self.symbol_table[symbol]
+        return self.symbol_table[symbol] & ADDRESS_MASK
+
+    def resolve(self, symbol: str) -> int:
+        """Returns the address associated with the symbol, first allocating
+        the next free variable address to it if it is not in the table.
+        A symbol that is already in the table costs a single lookup.
+
+        Args:
+            symbol (str): a symbol.
+
+        Returns:
+            int: the address associated with the symbol.
+        """
+        try:
+            return self.symbol_table[symbol] & ADDRESS_MASK
+        except KeyError:
+            address = self.next_variable
+            self.symbol_table[sys.intern(symbol)] = address | VARIABLE
+            self.next_variable += 1
+            return address
+
+    def labels(self) -> typing.Iterator[typing.Tuple[str, int]]:
+        """
+        Returns:
+            typing.Iterator[typing.Tuple[str, int]]: the labels added with
+            add_entry and their ROM addresses, in the order of the table. A
+            label that was added twice is listed once, with the address it
+            was given last.
+        """
+        return self.__entries(LABEL)
+
+    def variables(self) -> typing.Iterator[typing.Tuple[str, int]]:
+        """
+        Returns:
+            typing.Iterator[typing.Tuple[str, int]]: the variables allocated
+            by resolve and their RAM addresses, in order of allocation.
+        """
+        return self.__entries(VARIABLE)
+
+    def __entries(self, kind: int) -> typing.Iterator[typing.Tuple[str, int]]:
+        """
+        Args:
+            kind (int): PREDEFINED, LABEL or VARIABLE.
+
+        Returns:
+            typing.Iterator[typing.Tuple[str, int]]: the symbols of the given
+            kind and their addresses, in the order of the table.
+        """
+        for symbol, entry in self.symbol_table.items():
+            if entry & ~ADDRESS_MASK == kind:
+                yield symbol, entry & ADDRESS_MASK
+
+    def memory_usage(self) -> int:
+        """Estimates the memory held by the table: the hash table itself and
+        the symbol strings and addresses it refers to. Interned strings are
+        shared with the parser, but are counted here as well.
+
+        Returns:
+            int: the estimated size of the table in bytes.
+        """
+        size = sys.getsizeof(self.symbol_table)
+        for symbol, entry in self.symbol_table.items():
+            size += sys.getsizeof(symbol)
+            # small ints are cached by the interpreter and cost nothing
+            if entry > 256:
+                size += sys.getsizeof(entry)
+        return size
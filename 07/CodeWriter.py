@@ -7,6 +7,8 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
 
+from Parser import C_PUSH, CommandType
+
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
@@ -30,47 +32,51 @@ class CodeWriter:
         """
         self.__filename = filename
     
-    def write_basic_push(self) -> None:
-        self.__output.write("D=M\n" + 
-                            "@SP\n" + 
-                            "A=M\n" + 
-                            "M=D\n" + 
-                            "@SP\n" +
-                            "M=M+1\n")
-        
+    def write_push_d(self) -> None:
+        self.__output.write("@SP\n" + 
+                            "AM=M+1\n" + 
+                            "A=A-1\n" + 
+                            "M=D\n")
+
+    def write_pop_d(self) -> None:
+        self.__output.write("@SP\n" + 
+                            "AM=M-1\n" + 
+                            "D=M\n")
+
     def write_constant_push(self, index: int) -> None:
+        if index in [0, 1]:
+            self.__output.write("@SP\n" + 
+                                "AM=M+1\n" + 
+                                "A=A-1\n" + 
+                                "M=" + str(index) + "\n")
+        else:
+            self.__output.write("@" + str(index) + "\n" + 
+                                "D=A\n")
+            self.write_push_d()
+
+    def write_segment_entry(self, pointer: str, index: int) -> None:
+        # sets A to the address of a small index by incrementing A, which is
+        # shorter than adding the index to the pointer
+        if index == 0:
+            self.__output.write("@" + pointer + "\n" + 
+                                "A=M\n")
+        else:
+            self.__output.write("@" + pointer + "\n" + 
+                                "A=M+1\n" + 
+                                "A=A+1\n" * (index - 1))
+
+    def write_segment_pop(self, pointer: str, index: int) -> None:
+        # D = address + value, so the address is D - value and the value is
+        # D - address, without staging the address in a register
         self.__output.write("@" + str(index) + "\n" + 
                             "D=A\n" + 
+                            "@" + pointer + "\n" + 
+                            "D=D+M\n" + 
                             "@SP\n" + 
-                            "A=M\n" + 
-                            "M=D\n" + 
-                            "@SP\n" + 
-                            "M=M+1\n")
-    
-    def write_basic_pop(self) -> None:
-        self.__output.write("D=A\n" +
-                            "@R13\n" +
-                            "M=D\n" +
-                            "@SP\n" +
-                            "M=M-1\n" +
-                            "A=M\n" +
-                            "D=M\n" +
-                            "@R13\n" +
-                            "A=M\n" +
-                            "M=D\n")
-        
-    def write_static_pop(self, index: int) -> None:
-        self.__output.write("@SP\n" + 
-                            "M=M-1\n" + 
-                            "A=M\n" + 
-                            "D=M\n" + 
-                            "@" + self.__filename + "." + str(index) + "\n" + 
-                            "M=D\n")
-    
-    def write_segment_index(self, index: int) -> None:
-        self.__output.write("D=A\n" +
-                            "@" + str(index) + "\n" +
-                            "A=A+D\n")
+                            "AM=M-1\n" + 
+                            "D=D+M\n" + 
+                            "A=D-M\n" + 
+                            "M=D-A\n")
 
     def write_add_sub(self, operator: str) -> None:
         self.__output.write("@SP \n" +
@@ -215,39 +221,55 @@ class CodeWriter:
         elif command == "shiftright":
             self.write_shift(">>")
 
-    def write_push_pop(self, command: str, segment: str, index: int) -> None:
+    def write_push_pop(self, command: CommandType, segment: str,
+                       index: int) -> None:
         """Writes assembly code that is the translation of the given 
         command, where command is either C_PUSH or C_POP.
 
         Args:
-            command (str): "C_PUSH" or "C_POP".
+            command (CommandType): C_PUSH or C_POP.
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
         seg_dict = {"local": "LCL", "argument": "ARG", "this": "THIS",
-                    "that": "THAT", "temp": "5", "pointer": "3"}
-        
-        if segment in ["local", "argument", "this", "that", "temp", "pointer"]:
-            self.__output.write("@" + seg_dict[segment] + "\n")
-            
-            if segment not in ["temp", "pointer"]:
-                self.__output.write("A=M\n")
-            
-            self.write_segment_index(index)
-            if command == "C_PUSH":
-                self.write_basic_push()
+                    "that": "THAT"}
+        base_dict = {"temp": 5, "pointer": 3}
+
+        if segment in seg_dict:
+            if command == C_PUSH:
+                if index <= 1:
+                    self.write_segment_entry(seg_dict[segment], index)
+                else:
+                    self.__output.write("@" + seg_dict[segment] + "\n" + 
+                                        "D=M\n" + 
+                                        "@" + str(index) + "\n" + 
+                                        "A=D+A\n")
+                self.__output.write("D=M\n")
+                self.write_push_d()
+            elif index <= 3:
+                self.write_pop_d()
+                self.write_segment_entry(seg_dict[segment], index)
+                self.__output.write("M=D\n")
             else:
-                self.write_basic_pop()
-                
+                self.write_segment_pop(seg_dict[segment], index)
+
         elif segment == "constant":
             self.write_constant_push(index)
-        
-        elif segment == "static":
-            if command == "C_PUSH":
-                self.__output.write("@" + self.__filename + "." + str(index) + "\n")
-                self.write_basic_push()
+
+        elif segment in base_dict or segment == "static":
+            # temp, pointer and static are at fixed addresses
+            if segment == "static":
+                address = self.__filename + "." + str(index)
+            else:
+                address = str(base_dict[segment] + index)
+            if command == C_PUSH:
+                self.__output.write("@" + address + "\n" + 
+                                    "D=M\n")
+                self.write_push_d()
             else:
-                self.write_static_pop(index)
+                self.write_pop_d()
+                self.__output.write("@" + address + "\n" + 
+                                    "M=D\n")
 
     def write_label(self, label: str) -> None:
         """Writes assembly code that affects the label command. 
@@ -8,30 +8,47 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 import os
 import sys
 import typing
-from Parser import Parser
+from Parser import C_ARITHMETIC, C_POP, C_PUSH, CommandType, Parser
 from CodeWriter import CodeWriter
 
+# translates a parsed command with a code writer, by the type of the command.
+# The other commands are only translated in project 8.
+HANDLERS = {
+    C_ARITHMETIC: lambda writer, command:
+        writer.write_arithmetic(command.arg1),
+    C_PUSH: lambda writer, command:
+        writer.write_push_pop(command.kind, command.arg1, command.arg2),
+    C_POP: lambda writer, command:
+        writer.write_push_pop(command.kind, command.arg1, command.arg2),
+}
+
+# the handler of each command type, indexed by the type, or None
+DISPATCH = [HANDLERS.get(kind) for kind in CommandType]
+
 
 def translate_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Translates a single file.
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        filename: typing.Optional[str] = None) -> None:
+    """Translates a single file. The file is translated as it is read, in
+    memory that does not grow with the file.
 
     Args:
         input_file (typing.TextIO): the file to translate.
         output_file (typing.TextIO): writes all output to this file.
+        filename (typing.Optional[str]): the name that the static variables
+            of the file are prefixed with, by default the name of input_file.
     """
-    parser = Parser(input_file)
+    parser = Parser(input_file, streaming=True)
     code_writer = CodeWriter(output_file)
-    input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
-    code_writer.set_file_name(input_filename)
+    if filename is None:
+        filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
+    code_writer.set_file_name(filename)
     
-    while parser.has_more_commands():
-        if parser.command_type() == "C_ARITHMETIC":
-            code_writer.write_arithmetic(parser.arg1())
-        elif parser.command_type() in ["C_PUSH", "C_POP"]:
-            code_writer.write_push_pop(parser.command_type(), parser.arg1(), parser.arg2())
-        
-        parser.advance()
+    for command in parser:
+        handler = DISPATCH[command.kind]
+        if handler is not None:
+            handler(code_writer, command)
+
 
 if "__main__" == __name__:
     # Parses the input path and calls translate_file on each input file.
@@ -39,6 +56,13 @@ if "__main__" == __name__:
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
+    # "VMtranslator - [<file name>]" translates the standard input to the
+    # standard output, so the translator can be used in a pipeline. The file
+    # name is used for the static variables.
+    if len(sys.argv) in [2, 3] and sys.argv[1] == "-":
+        translate_file(sys.stdin, sys.stdout,
+                       sys.argv[2] if len(sys.argv) == 3 else "Stdin")
+        sys.exit()
     if not len(sys.argv) == 2:
         sys.exit("Invalid usage, please use: VMtranslator <input path>")
     argument_path = os.path.abspath(sys.argv[1])
@@ -1,37 +1,168 @@
 """This file is part of nand2tetris, as taught in The Hebrew University,
-and was written by Aviv Yaish according to the specifications given in  
+and was written by Aviv Yaish according to the specifications given in
 https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
-and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import enum
+import gc
 import typing
 
 
+class CommandType(enum.IntEnum):
+    """The types of VM commands. They are small integers, so that the
+    translator dispatches on them by indexing a list rather than by hashing
+    strings. Their names are the command types of the book.
+    """
+    C_ARITHMETIC = 0
+    C_PUSH = 1
+    C_POP = 2
+    C_LABEL = 3
+    C_GOTO = 4
+    C_IF = 5
+    C_FUNCTION = 6
+    C_RETURN = 7
+    C_CALL = 8
+
+
+# the members as module constants: the translator reads them for every
+# command, and looking a member up on the enum class is several times slower
+C_ARITHMETIC, C_PUSH, C_POP, C_LABEL, C_GOTO, \
+    C_IF, C_FUNCTION, C_RETURN, C_CALL = CommandType
+
+
+# the type of the command that each VM keyword starts
+COMMAND_TYPES = {"add": C_ARITHMETIC, "sub": C_ARITHMETIC,
+                 "neg": C_ARITHMETIC, "eq": C_ARITHMETIC,
+                 "gt": C_ARITHMETIC, "lt": C_ARITHMETIC,
+                 "and": C_ARITHMETIC, "or": C_ARITHMETIC,
+                 "not": C_ARITHMETIC, "shiftleft": C_ARITHMETIC,
+                 "shiftright": C_ARITHMETIC,
+                 "push": C_PUSH, "pop": C_POP, "label": C_LABEL,
+                 "goto": C_GOTO, "if-goto": C_IF,
+                 "function": C_FUNCTION, "call": C_CALL,
+                 "return": C_RETURN}
+
+# command types whose second argument is a number
+COMMANDS_WITH_ARG2 = {C_PUSH, C_POP, C_FUNCTION, C_CALL}
+
+
+class Command(typing.NamedTuple):
+    """A VM command, decoded once when its line is parsed."""
+    # one of the values of COMMAND_TYPES
+    kind: CommandType
+    # the command itself for "C_ARITHMETIC", None for "C_RETURN"
+    arg1: typing.Optional[str] = None
+    # None unless kind is in COMMANDS_WITH_ARG2
+    arg2: typing.Optional[int] = None
+
+
 class Parser:
     """
     Handles the parsing of a single .vm file, and encapsulates access to the
-    input code. It reads VM commands, parses them, and provides convenient 
-    access to their components. 
+    input code. It reads VM commands, parses them, and provides convenient
+    access to their components.
     In addition, it removes all white space and comments.
     """
 
-    def __init__(self, input_file: typing.TextIO) -> None:
-        """Gets ready to parse the input file.
+    def __init__(self, input_file: typing.Iterable[str],
+                 streaming: bool = False) -> None:
+        """Gets ready to parse the input file. Every command is decoded into
+        a Command record as it is read, so the accessors below do not parse.
 
         Args:
-            input_file (typing.TextIO): input file.
+            input_file (typing.Iterable[str]): input file, or any other
+                iterable of lines.
+            streaming (bool): if True, lines are pulled from the input one at
+                a time instead of being read up front, so the memory used
+                does not grow with the input. A streaming parser can only be
+                traversed once, and set_commands() is not available.
         """
-        self.program_lines = []
+        self.streaming = streaming
+        if streaming:
+            self.commands = None
+            self.__stream = Parser.parse_lines(input_file)
+            self.current = next(self.__stream, None)
+            return
+
+        # the records hold no reference cycles, but their command types keep
+        # them tracked by the collector, and every million of them would
+        # otherwise trigger several full collections while the list grows
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            commands = list(Parser.parse_lines(input_file))
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.set_commands(commands)
+
+    @staticmethod
+    def parse_lines(
+            input_file: typing.Iterable[str]) -> typing.Iterator[Command]:
+        """Lazily decodes the lines of the input.
 
-        # remove spaces and comments 
-        for line in input_file.read().splitlines():
+        Args:
+            input_file (typing.Iterable[str]): input file, or any other
+                iterable of lines.
+
+        Returns:
+            typing.Iterator[Command]: the decoded commands, in order.
+        """
+        # remove spaces and comments
+        for line in input_file:
             n_line = (line.split("\t")[0]).strip().split('//', 1)[0]
             if n_line != '':
-                self.program_lines.append(n_line)
+                yield Parser.parse_line(n_line)
+
+    @staticmethod
+    def parse_line(line: str) -> Command:
+        """
+        Args:
+            line (str): a VM command without comments.
+
+        Returns:
+            Command: the decoded command.
+        """
+        words = line.split()
+        kind = COMMAND_TYPES[words[0]]
+        if kind == C_ARITHMETIC:
+            return Command(kind, words[0])
+        if kind == C_RETURN:
+            return Command(kind)
+        if kind in COMMANDS_WITH_ARG2:
+            return Command(kind, words[1], int(words[2]))
+        return Command(kind, words[1])
+
+    def set_commands(self, commands: typing.List[Command]) -> None:
+        """Replaces the commands of the file and makes the first of them the
+        current command.
 
-        self.num_of_lines = len(self.program_lines)
+        Args:
+            commands (typing.List[Command]): the decoded commands.
+        """
+        if self.streaming:
+            raise ValueError("a streaming parser cannot replace its commands")
+        self.commands = commands
+        self.num_of_lines = len(self.commands)
         self.line_counter = 0
-        self.current_line = self.program_lines[self.line_counter]
+        if self.num_of_lines:
+            self.current = self.commands[self.line_counter]
+
+    def __iter__(self) -> typing.Iterator[Command]:
+        """Iterates over the decoded commands of the input. A streaming
+        parser yields each command once, as it is read.
+
+        Returns:
+            typing.Iterator[Command]: the commands of the file, in order.
+        """
+        if self.streaming:
+            if self.current is not None:
+                yield self.current
+                self.current = None
+            yield from self.__stream
+        else:
+            yield from self.commands
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -39,16 +170,21 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
+        if self.streaming:
+            return self.current is not None
         return self.line_counter < self.num_of_lines
 
     def advance(self) -> None:
-        """Reads the next command from the input and makes it the current 
+        """Reads the next command from the input and makes it the current
         command. Should be called only if has_more_commands() is true. Initially
         there is no current command.
         """
+        if self.streaming:
+            self.current = next(self.__stream, None)
+            return
         self.line_counter += 1
         if self.line_counter < self.num_of_lines:
-            self.current_line = self.program_lines[self.line_counter]
+            self.current = self.commands[self.line_counter]
 
     def command_type(self) -> str:
         """
@@ -59,33 +195,22 @@ class Parser:
             "C_PUSH", "C_POP", "C_LABEL", "C_GOTO", "C_IF", "C_FUNCTION",
             "C_RETURN", "C_CALL".
         """
-        comm_dict = {"add":"C_ARITHMETIC", "sub":"C_ARITHMETIC", "neg":"C_ARITHMETIC",
-        "eq":"C_ARITHMETIC", "gt":"C_ARITHMETIC", "lt":"C_ARITHMETIC", 
-        "and":"C_ARITHMETIC", "or":"C_ARITHMETIC", "not":"C_ARITHMETIC", 
-        "shiftleft":"C_ARITHMETIC", "shiftright":"C_ARITHMETIC",
-        "push":"C_PUSH", "pop":"C_POP", "label":"C_LABEL", 
-        "goto":"C_GOTO", "if-goto":"C_if", "function":"C_FUNCTION", 
-        "call":"C_CALL", "return":"C_RETURN"}
-
-        return (comm_dict[self.current_line.split(' ')[0]])
-        
+        return self.current.kind.name
+
     def arg1(self) -> str:
         """
         Returns:
-            str: the first argument of the current command. In case of 
-            "C_ARITHMETIC", the command itself (add, sub, etc.) is returned. 
+            str: the first argument of the current command. In case of
+            "C_ARITHMETIC", the command itself (add, sub, etc.) is returned.
             Should not be called if the current command is "C_RETURN".
         """
-        if self.command_type() == "C_ARITHMETIC":
-            return self.current_line.split(' ')[0]
-        
-        return self.current_line.split(' ')[1]
+        return self.current.arg1
 
     def arg2(self) -> int:
         """
         Returns:
             int: the second argument of the current command. Should be
-            called only if the current command is "C_PUSH", "C_POP", 
+            called only if the current command is "C_PUSH", "C_POP",
             "C_FUNCTION" or "C_CALL".
         """
-        return int(self.current_line.split(' ')[2])
+        return self.current.arg2
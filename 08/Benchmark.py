@@ -0,0 +1,119 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import tempfile
+import time
+import typing
+
+import Main
+from Parser import Parser
+
+
+# A block of typical compiler output: a loop with pushes, pops, arithmetic,
+# a comparison and a call. Every block is its own function.
+BLOCK = """function Bench.f{n} 2
+push constant 0
+pop local 0
+label LOOP
+push local 0
+push argument 0
+lt
+not
+if-goto END
+push local 0
+push constant {n}
+add
+pop local 1
+push this 2
+push static {v}
+call Math.multiply 2
+pop that 0
+push local 0
+push constant 1
+add
+pop local 0
+goto LOOP
+label END
+push local 1
+return
+"""
+
+
+def generate_program(num_commands: int) -> typing.Iterator[str]:
+    """Yields about num_commands VM commands.
+
+    Args:
+        num_commands (int): the number of commands to generate.
+
+    Returns:
+        typing.Iterator[str]: the commands of the program.
+    """
+    commands_per_block = BLOCK.count('\n')
+    for n in range(num_commands // commands_per_block):
+        yield BLOCK.format(n=n, v=n % 200)
+
+
+def parse(input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+    """Parses the input file and reads every command, without translating.
+
+    Args:
+        input_file (typing.TextIO): the file to parse.
+        output_file (typing.TextIO): unused.
+    """
+    for _ in Parser(input_file):
+        pass
+
+
+def translate(input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+    """Translates the input file, without the bootstrap code.
+
+    Args:
+        input_file (typing.TextIO): the file to translate.
+        output_file (typing.TextIO): writes all output to this file.
+    """
+    Main.translate_file(input_file, output_file, False)
+
+
+def run(translate_mode: typing.Callable, input_path: str) -> float:
+    """Runs translate_mode on the given file and returns the elapsed time in
+    seconds.
+
+    Args:
+        translate_mode (typing.Callable): parse, translate or a variant.
+        input_path (str): the file to translate.
+
+    Returns:
+        float: elapsed wall clock time.
+    """
+    with open(input_path, 'r') as input_file, \
+            tempfile.TemporaryFile('w+') as output_file:
+        start = time.perf_counter()
+        translate_mode(input_file, output_file)
+        return time.perf_counter() - start
+
+
+if "__main__" == __name__:
+    # Generates a large .vm file once and times parsing and translating it,
+    # reporting commands per second. Run it on two revisions to compare.
+    arg_parser = argparse.ArgumentParser(prog="Benchmark")
+    arg_parser.add_argument("--commands", type=int, default=1000000)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "Bench.vm")
+        with open(input_path, 'w') as input_file:
+            input_file.writelines(generate_program(args.commands))
+        with open(input_path, 'r') as input_file:
+            num_commands = sum(1 for line in input_file)
+
+        modes = [("parse", parse), ("translate", translate)]
+        for name, translate_mode in modes:
+            elapsed = run(translate_mode, input_path)
+            print("%-10s %9d commands %7.2fs %12.0f commands/s" % (
+                name, num_commands, elapsed, num_commands / elapsed))
@@ -0,0 +1,77 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+from Parser import C_CALL, C_FUNCTION, Command
+
+# the function that the bootstrap code calls
+ENTRY_FUNCTION = "Sys.init"
+
+
+class CallGraph:
+    """The functions of a whole VM program and the functions each of them
+    calls. Since functions can only be entered with "call", a function that
+    cannot be reached by calls from Sys.init is never run.
+    """
+
+    def __init__(self) -> None:
+        """Creates an empty call graph."""
+        # function name -> names of the functions it calls
+        self.calls = {}
+
+    def add_commands(self, commands: typing.Iterable[Command]) -> None:
+        """Adds the functions of a file to the graph.
+
+        Args:
+            commands (typing.Iterable[Command]): the commands of the file.
+        """
+        callees = set()
+        for command in commands:
+            if command.kind == C_FUNCTION:
+                callees = self.calls.setdefault(command.arg1, set())
+            elif command.kind == C_CALL:
+                callees.add(command.arg1)
+
+    def reachable(
+            self, entry: str = ENTRY_FUNCTION) -> typing.FrozenSet[str]:
+        """
+        Args:
+            entry (str): the function the program starts at.
+
+        Returns:
+            typing.FrozenSet[str]: the functions that can be reached by calls
+            from entry, including entry itself.
+        """
+        reached = {entry}
+        pending = [entry]
+        while pending:
+            for callee in self.calls.get(pending.pop(), ()):
+                if callee not in reached:
+                    reached.add(callee)
+                    pending.append(callee)
+        return frozenset(reached)
+
+    @staticmethod
+    def prune(commands: typing.Iterable[Command],
+              functions: typing.AbstractSet[str]
+              ) -> typing.Iterator[Command]:
+        """Lazily drops the functions that are not in functions.
+
+        Args:
+            commands (typing.Iterable[Command]): the commands of a file.
+            functions (typing.AbstractSet[str]): the functions to keep.
+
+        Returns:
+            typing.Iterator[Command]: the commands of the kept functions.
+        """
+        keep = True
+        for command in commands:
+            if command.kind == C_FUNCTION:
+                keep = command.arg1 in functions
+            if keep:
+                yield command
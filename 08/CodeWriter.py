@@ -5,195 +5,612 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import functools
 import typing
 
+from HackWriter import HackWriter, Template
+from Parser import C_PUSH, CommandType
+
+# The assembly code of every command is built from the templates below, which
+# are encoded into Hack machine words once, when the module is loaded. Their
+# fields are filled in when they are written, into the text of the code or
+# into its words. The code of push and pop depends on the index as well, and
+# is put together from templates and cached by push_pop_code.
+
+# the number of code fragments the writer buffers before it writes them out
+FLUSH_FRAGMENTS = 4096
+
+# the pointer of each segment that is accessed through a pointer
+SEGMENT_POINTERS = {"local": "LCL", "argument": "ARG", "this": "THIS",
+                    "that": "THAT"}
+
+# the base address of each segment that is mapped to fixed addresses
+SEGMENT_BASES = {"temp": 5, "pointer": 3}
+
+# pushes D onto the stack
+PUSH_D = Template("@SP\n" +
+                  "AM=M+1\n" +
+                  "A=A-1\n" +
+                  "M=D\n")
+
+# pops the stack into D
+POP_D = Template("@SP\n" +
+                 "AM=M-1\n" +
+                 "D=M\n")
+
+NO_CODE = Template("")
+
+# reads the entry at A into D, and writes D to it
+LOAD_ENTRY = Template("D=M\n")
+STORE_ENTRY = Template("M=D\n")
+
+# the constants 0 and 1, which need no A-instruction. The first ones set D
+# for the stack cache, the others push the constant.
+SET_D_CONSTANTS = [Template("D=" + str(value) + "\n") for value in [0, 1]]
+PUSH_CONSTANTS = [Template("@SP\n" +
+                           "AM=M+1\n" +
+                           "A=A-1\n" +
+                           "M=" + str(value) + "\n")
+                  for value in [0, 1]]
+
+# loads {value} into D
+LOAD_CONSTANT = Template("@{value}\n" +
+                         "D=A\n")
+
+# reads the value at {address} into D, and writes D to it
+LOAD_ADDRESS = Template("@{address}\n" +
+                        "D=M\n")
+STORE_ADDRESS = Template("@{address}\n" +
+                         "M=D\n")
+
+# sets A to the first, or to the second entry of the segment at {pointer},
+# and then to the next entry
+FIRST_ENTRY = Template("@{pointer}\n" +
+                       "A=M\n")
+SECOND_ENTRY = Template("@{pointer}\n" +
+                        "A=M+1\n")
+NEXT_ENTRY = Template("A=A+1\n")
+
+# reads entry {index} of the segment at {pointer} into D
+LOAD_INDEXED_ENTRY = Template("@{pointer}\n" +
+                              "D=M\n" +
+                              "@{index}\n" +
+                              "A=D+A\n" +
+                              "D=M\n")
+
+# the stack caching pop into entry {index} of the segment at {pointer}. The
+# value is kept in R13 while the address is computed.
+CACHED_STORE_INDEXED_ENTRY = Template("@R13\n" +
+                                      "M=D\n" +
+                                      "@{pointer}\n" +
+                                      "D=M\n" +
+                                      "@{index}\n" +
+                                      "D=D+A\n" +
+                                      "@R13\n" +
+                                      "D=D+M\n" +
+                                      "A=D-M\n" +
+                                      "M=D-A\n")
+
+# pops the stack into entry {index} of the segment at {pointer}. D =
+# address + value, so the address is D - value and the value is D - address,
+# without staging the address in a register.
+POP_INDEXED_ENTRY = Template("@{index}\n" +
+                             "D=A\n" +
+                             "@{pointer}\n" +
+                             "D=D+M\n" +
+                             "@SP\n" +
+                             "AM=M-1\n" +
+                             "D=D+M\n" +
+                             "A=D-M\n" +
+                             "M=D-A\n")
+
+# Entries of the segments that are accessed through a pointer are addressed
+# by incrementing A up to these indices, which is shorter than adding the
+# index to the pointer.
+PUSH_INLINE_INDEX = 1
+POP_INLINE_INDEX = 3
+CACHED_POP_INLINE_INDEX = 7
+
+
+def _segment_entry(pointer: str, index: int) -> Template:
+    """
+    Args:
+        pointer (str): the pointer of a segment, such as "LCL".
+        index (int): a small index in the segment.
+
+    Returns:
+        Template: code that sets A to the address of the entry, by
+        incrementing A index times.
+    """
+    if index == 0:
+        return FIRST_ENTRY.fill(pointer=pointer)
+    return SECOND_ENTRY.fill(pointer=pointer) + NEXT_ENTRY * (index - 1)
+
+
+@functools.lru_cache(maxsize=4096)
+def push_pop_code(command: CommandType, segment: str, index: int,
+                  filename: str, stack_cache: bool = False) -> Template:
+    """The code of a push or pop is picked by the segment and the index, so
+    that common cases get the shortest sequence. The code is put together
+    once for every distinct command.
+
+    Args:
+        command (CommandType): C_PUSH or C_POP.
+        segment (str): the memory segment to operate on.
+        index (int): the index in the memory segment.
+        filename (str): the name of the file, for the static segment.
+        stack_cache (bool): if True, a push leaves the value in D and a pop
+            takes it from D, and neither touches the stack in RAM.
+
+    Returns:
+        Template: the code of the command, without fields.
+    """
+    if segment == "constant":
+        if stack_cache:
+            if index in [0, 1]:
+                return SET_D_CONSTANTS[index]
+            return LOAD_CONSTANT.fill(value=index)
+        if index in [0, 1]:
+            return PUSH_CONSTANTS[index]
+        return LOAD_CONSTANT.fill(value=index) + PUSH_D
+
+    push_code = NO_CODE if stack_cache else PUSH_D
+    pop_code = NO_CODE if stack_cache else POP_D
+    if segment not in SEGMENT_POINTERS:
+        # temp, pointer and static are at fixed addresses
+        if segment == "static":
+            address = filename + "." + str(index)
+        else:
+            address = SEGMENT_BASES[segment] + index
+        if command == C_PUSH:
+            return LOAD_ADDRESS.fill(address=address) + push_code
+        return pop_code + STORE_ADDRESS.fill(address=address)
+
+    pointer = SEGMENT_POINTERS[segment]
+    if command == C_PUSH:
+        if index <= PUSH_INLINE_INDEX:
+            return _segment_entry(pointer, index) + LOAD_ENTRY + push_code
+        return LOAD_INDEXED_ENTRY.fill(pointer=pointer, index=index) + \
+            push_code
+
+    if index <= (CACHED_POP_INLINE_INDEX if stack_cache
+                 else POP_INLINE_INDEX):
+        return pop_code + _segment_entry(pointer, index) + STORE_ENTRY
+    if stack_cache:
+        return CACHED_STORE_INDEXED_ENTRY.fill(pointer=pointer, index=index)
+    return POP_INDEXED_ENTRY.fill(pointer=pointer, index=index)
+
+
+# the arithmetic commands other than the comparisons
+ARITHMETIC_CODE = {}
+for command, comp in [("add", "M+D"), ("sub", "M-D")]:
+    ARITHMETIC_CODE[command] = Template("@SP \n" +
+                                        "A=M\n" +
+                                        "A=A-1\n" +
+                                        "D=M\n" +
+                                        "A=A-1\n" +
+                                        "M=" + comp + "\n" +
+                                        "@SP\n" +
+                                        "M=M-1\n")
+for command, comp in [("and", "D&M"), ("or", "D|M")]:
+    ARITHMETIC_CODE[command] = Template("@SP\n" +
+                                        "A=M\n" +
+                                        "A=A-1\n" +
+                                        "D=M\n" +
+                                        "A=A-1\n" +
+                                        "M=" + comp + "\n" +
+                                        "@SP\n" +
+                                        "M=M-1\n")
+for command, comp in [("neg", "-M"), ("not", "!M"), ("shiftleft", "M<<"),
+                      ("shiftright", "M>>")]:
+    ARITHMETIC_CODE[command] = Template("@SP\n" +
+                                        "A=M\n" +
+                                        "A=A-1\n" +
+                                        "M=" + comp + "\n")
+
+# the jump of each comparison
+COMPARISON_JUMPS = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+
+# jump -> the comparison, filled with a unique label. The operands are
+# compared by their signs first, so that x - y cannot overflow.
+CMP_BODY_TEMPLATES = {}
+for jump_comm, jump_val in [("JGT", ["-1", "0"]), ("JLT", ["0", "-1"]),
+                            ("JEQ", ["0", "0"])]:
+    CMP_BODY_TEMPLATES[jump_comm] = Template(
+        "@SP\n" +
+        "A=M\n" +
+        "A=A-1\n" +
+        "D=M\n" +
+        "@R14\n" +
+        "M=D\n" +
+        "@SP\n" +
+        "A=M\n" +
+        "A=A-1\n" +
+        "A=A-1\n" +
+        "D=M\n" +
+        "@R13\n" +
+        "M=D\n" +
+        "@X_POS{label}\n" +
+        "D;JGE\n" +
+        "@X_NEG{label}\n" +
+        "0;JMP\n" +
+        "(X_POS{label})\n" +
+        "@R14\n" +
+        "D=M\n" +
+        "@EQ_SIGN{label}\n" +
+        "D;JGE\n" +
+        "@X_POS_Y_NEG{label}\n" +
+        "0;JMP\n" +
+        "(X_NEG{label})\n" +
+        "@R14\n" +
+        "D=M\n" +
+        "@X_NEG_Y_POS{label}\n" +
+        "D;JGE\n" +
+        "@EQ_SIGN{label}\n" +
+        "0;JMP\n" +
+        "(X_POS_Y_NEG{label})\n" +
+        "@SP\n" +
+        "M=M-1\n" +
+        "A=M\n" +
+        "A=A-1\n" +
+        "M=" + jump_val[0] + "\n" +
+        "@ENDCMP{label}\n" +
+        "0;JMP\n" +
+        "(X_NEG_Y_POS{label})\n" +
+        "@SP\n" +
+        "M=M-1\n" +
+        "A=M\n" +
+        "A=A-1\n" +
+        "M=" + jump_val[1] + "\n" +
+        "@ENDCMP{label}\n" +
+        "0;JMP\n" +
+        "(EQ_SIGN{label})\n" +
+        "@R14\n" +
+        "D=M\n" +
+        "@R13\n" +
+        "D=M-D\n" +
+        "@TRUE{label}\n" +
+        "D;" + jump_comm + "\n" +
+        "@SP\n" +
+        "M=M-1\n" +
+        "A=M\n" +
+        "A=A-1\n" +
+        "M=0\n" +
+        "@ENDCMP{label}\n" +
+        "0;JMP\n" +
+        "(TRUE{label})\n" +
+        "@SP\n" +
+        "M=M-1\n" +
+        "A=M\n" +
+        "A=A-1\n" +
+        "M=-1\n" +
+        "(ENDCMP{label})\n")
+
+# jumps to a shared comparison routine, filled with a unique label
+SHARED_CMP_TEMPLATE = Template("@RET_CMP{label}\n" +
+                               "D=A\n" +
+                               "@$$CMP_{jump}\n" +
+                               "0;JMP\n" +
+                               "(RET_CMP{label})\n")
+
+# the stack caching versions of the commands, which leave their result in D
+CACHED_ARITHMETIC_CODE = {}
+for command, comp in [("add", "D+M"), ("sub", "M-D"), ("and", "D&M"),
+                      ("or", "D|M")]:
+    CACHED_ARITHMETIC_CODE[command] = Template("@SP\n" +
+                                               "AM=M-1\n" +
+                                               "D=" + comp + "\n")
+for command, comp in [("neg", "-D"), ("not", "!D"), ("shiftleft", "D<<"),
+                      ("shiftright", "D>>")]:
+    CACHED_ARITHMETIC_CODE[command] = Template("D=" + comp + "\n")
+
+SPILL_CODE = PUSH_D
+
+FILL_CODE = POP_D
+
+# pushes the address in {label} and the frame of the caller, repositions ARG
+# and LCL and jumps to {function}
+CALL_TEMPLATE = Template("@{label}\n" +
+                         "D=A\n" +
+                         "@SP\n" +
+                         "A=M\n" +
+                         "M=D\n" +
+                         "@SP\n" +
+                         "M=M+1\n" +
+                         "".join(seg + "\n" +
+                                 "D=M\n" +
+                                 "@SP\n" +
+                                 "A=M\n" +
+                                 "M=D\n" +
+                                 "@SP\n" +
+                                 "M=M+1\n"
+                                 for seg in ["@LCL", "@ARG", "@THIS",
+                                             "@THAT"]) +
+                         "@SP\n" +
+                         "D=M\n" +
+                         "@{frame_size}\n" +
+                         "D=D-A\n" +
+                         "@ARG\n" +
+                         "M=D\n" +
+                         "@SP\n" +
+                         "D=M\n" +
+                         "@LCL\n" +
+                         "M=D\n" +
+                         "@{function}\n" +
+                         "0;JMP\n" +
+                         "({label})\n")
+
+# passes the callee and the return address to $$CALL
+SHARED_CALL_TEMPLATE = Template("@{function}\n" +
+                                "D=A\n" +
+                                "@R13\n" +
+                                "M=D\n" +
+                                "@{label}\n" +
+                                "D=A\n" +
+                                "@$$CALL\n" +
+                                "0;JMP\n" +
+                                "({label})\n")
+
+RETURN_CODE = Template(
+    # sets the end frame
+    "@LCL\n" +
+    "D=M\n" +
+    "@R13\n" +
+    "M=D\n" +
+    # puts the return address in a temp var
+    "@R13\n" +
+    "D=M\n" +
+    "@5\n" +
+    "D=D-A\n" +
+    "A=D\n" +
+    "D=M\n" +
+    "@R14\n" +
+    "M=D\n" +
+    # repositions the return value for the caller
+    "@SP\n" +
+    "M=M-1\n" +
+    "A=M\n" +
+    "D=M\n" +
+    "@ARG\n" +
+    "A=M\n" +
+    "M=D\n" +
+    # repositions SP for the caller
+    "@ARG\n" +
+    "D=M\n" +
+    "D=D+1\n" +
+    "@SP\n" +
+    "M=D\n" +
+    # restores THAT, THIS, ARG, LCL for the caller
+    "".join("@R13\n" +
+            "M=M-1\n" +
+            "A=M\n" +
+            "D=M\n" +
+            seg + "\n" +
+            "M=D\n"
+            for seg in ["@THAT", "@THIS", "@ARG", "@LCL"]) +
+    # go to the return address
+    "@R14\n" +
+    "A=M\n" +
+    "0;JMP\n")
+
+# pushes the return address and the frame of the caller, then sets
+# ARG = SP - n_args - 5 and LCL = SP and jumps to the callee
+SHARED_CALL_ROUTINE = Template("($$CALL)\n" +
+                               "@SP\n" +
+                               "A=M\n" +
+                               "M=D\n" +
+                               "".join(seg + "\n" +
+                                       "D=M\n" +
+                                       "@SP\n" +
+                                       "AM=M+1\n" +
+                                       "M=D\n"
+                                       for seg in ["@LCL", "@ARG", "@THIS",
+                                                   "@THAT"]) +
+                               "@SP\n" +
+                               "MD=M+1\n" +
+                               "@LCL\n" +
+                               "M=D\n" +
+                               "@R14\n" +
+                               "D=D-M\n" +
+                               "@5\n" +
+                               "D=D-A\n" +
+                               "@ARG\n" +
+                               "M=D\n" +
+                               "@R13\n" +
+                               "A=M\n" +
+                               "0;JMP\n")
+
+SHARED_RETURN_ROUTINE = Template("($$RETURN)\n") + RETURN_CODE
+
+# jump -> the shared comparison routine, filled with its name as {label}. It
+# keeps its return address in R15, since the comparison itself uses R13 and
+# R14.
+SHARED_CMP_ROUTINES = {
+    jump_comm: Template("({label})\n" +
+                        "@R15\n" +
+                        "M=D\n") +
+    CMP_BODY_TEMPLATES[jump_comm] +
+    Template("@R15\n" +
+             "A=M\n" +
+             "0;JMP\n")
+    for jump_comm in ["JEQ", "JGT", "JLT"]}
+
+# sets SP to 256
+BOOT_CODE = Template("@256\n" +
+                     "D=A\n" +
+                     "@SP\n" +
+                     "M=D\n")
+
+# passes the number of arguments to $$CALL in R14: 0 and 1 need no
+# A-instruction, and any other number is filled in as {n_args}
+SET_ARGS_CONSTANTS = [Template("@R14\n" +
+                               "M=" + str(value) + "\n")
+                      for value in [0, 1]]
+SET_ARGS_TEMPLATE = Template("@{n_args}\n" +
+                             "D=A\n" +
+                             "@R14\n" +
+                             "M=D\n")
+
+SHARED_RETURN_CODE = Template("@$$RETURN\n" +
+                              "0;JMP\n")
+
+# declares, or jumps to {label}
+LABEL_TEMPLATE = Template("({label})\n")
+GOTO_TEMPLATE = Template("@{label}\n" +
+                         "0;JMP\n")
+
+# pops the stack and jumps to {label} if the value is not 0. The stack
+# caching version takes the value from D.
+IF_TEMPLATE = Template("@SP\n" +
+                       "M=M-1\n" +
+                       "A=M\n" +
+                       "D=M\n" +
+                       "@{label}\n" +
+                       "D;JNE\n")
+CACHED_IF_TEMPLATE = Template("@{label}\n" +
+                              "D;JNE\n")
+
+# pops the stack and jumps to {label} unless the value is -1, which is
+# exactly when adding 1 to it gives 0
+IF_NOT_TEMPLATE = Template("@SP\n" +
+                           "AM=M-1\n" +
+                           "D=M+1\n" +
+                           "@{label}\n" +
+                           "D;JNE\n")
+CACHED_IF_NOT_TEMPLATE = Template("D=D+1\n" +
+                                  "@{label}\n" +
+                                  "D;JNE\n")
 
-class CodeWriter:
-    """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+class CodeWriter:
+    """Translates VM commands into Hack assembly code. The code is collected
+    in a buffer that is written to the output stream in large chunks, so
+    flush() or close() must be called after the last command. If the output
+    stream is a HackWriter, the templates of the code are written to it as
+    machine words instead.
+    """
+
+    def __init__(self,
+                 output_stream: typing.Union[typing.TextIO, HackWriter],
+                 shared_runtime: bool = False,
+                 stack_cache: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
-            output_stream (typing.TextIO): output stream.
+            output_stream (typing.Union[typing.TextIO, HackWriter]): output
+                stream, or the HackWriter that assembles the code.
+            shared_runtime (bool): if True, call, return, eq, gt and lt are
+                translated into short jumps to the shared $$CALL, $$RETURN
+                and $$CMP_* routines instead of being inlined. The routines
+                are written once per program, by boot_write.
+            stack_cache (bool): if True, the top of the VM stack is kept in
+                the D register between commands and only written to the
+                stack in RAM before labels, branches, calls and returns.
         """
         self.__output = output_stream
+        self.__hack_writer = output_stream \
+            if isinstance(output_stream, HackWriter) else None
+        self.__buffer = []
+        self.__shared_runtime = shared_runtime
+        self.__stack_cache = stack_cache
+        # True while the top of the stack is held in D rather than in RAM
+        self.__cached = False
         self.__label_counter = 0
         self.__func_counter = 0
         self.__filename = ''
         self.__curr_func = ''
+        # the prefix of the labels of the current function
+        self.__label_prefix = '.$'
+
+    def write(self, template: Template,
+              fields: typing.Optional[
+                  typing.Dict[str, typing.Union[int, str]]] = None) -> None:
+        """Adds the code of a template to the buffer, and writes the buffer
+        out once it holds FLUSH_FRAGMENTS fragments. A HackWriter assembles
+        the template right away.
+
+        Args:
+            template (Template): assembly code.
+            fields (typing.Optional[typing.Dict[str, typing.Union[int, str]]]):
+                the value of every field of the template, if it has any.
+        """
+        if self.__hack_writer is not None:
+            self.__hack_writer.write(template, fields)
+            return
+        self.__buffer.append(template.code if fields is None
+                             else template.code.format_map(fields))
+        if len(self.__buffer) >= FLUSH_FRAGMENTS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered code to the output stream."""
+        if self.__buffer:
+            self.__output.write("".join(self.__buffer))
+            self.__buffer.clear()
 
     def boot_write(self) -> None:
-        self.__output.write("@256\n" + 
-                            "D=A\n" + 
-                            "@SP\n" + 
-                            "M=D\n")
+        self.write(BOOT_CODE)
         self.write_call("Sys.init", 0)
+        if self.__shared_runtime:
+            self.write_runtime()
+
+    def write_runtime(self) -> None:
+        """Writes the routines shared by all the use sites of call, return
+        and the comparisons. Each routine is entered with a jump, and the
+        ones that return to their use site expect the return address in D.
+        $$CALL also expects the address of the callee in R13 and the number
+        of arguments in R14.
+        """
+        self.write(SHARED_CALL_ROUTINE)
+        self.write(SHARED_RETURN_ROUTINE)
+        for jump_comm, routine in SHARED_CMP_ROUTINES.items():
+            self.write(routine, {"label": "$$CMP_" + jump_comm})
+
+    def close(self) -> None:
+        """Writes the top of the stack back to RAM if it is held in D, and
+        flushes the buffer. Should be called once the last command of the
+        file was translated.
+        """
+        self.spill()
+        self.flush()
+
+    def spill(self) -> None:
+        """Pushes the top of the stack from D to the stack in RAM, if it is
+        held in D.
+        """
+        if self.__cached:
+            self.write(SPILL_CODE)
+            self.__cached = False
+
+    def fill(self) -> None:
+        """Pops the top of the stack from RAM into D, unless it is already
+        held in D.
+        """
+        if not self.__cached:
+            self.write(FILL_CODE)
+            self.__cached = True
 
     def set_file_name(self, filename: str) -> None:
-        """Informs the code writer that the translation of a new VM file is 
+        """Informs the code writer that the translation of a new VM file is
         started.
 
         Args:
             filename (str): The name of the VM file.
         """
         self.__filename = filename
-    
-    def write_basic_push(self) -> None:
-        self.__output.write("D=M\n" + 
-                            "@SP\n" + 
-                            "A=M\n" + 
-                            "M=D\n" + 
-                            "@SP\n" +
-                            "M=M+1\n")
-        
-    def write_constant_push(self, index: int) -> None:
-        self.__output.write("@" + str(index) + "\n" + 
-                            "D=A\n" + 
-                            "@SP\n" + 
-                            "A=M\n" + 
-                            "M=D\n" + 
-                            "@SP\n" + 
-                            "M=M+1\n")
-    
-    def write_basic_pop(self) -> None:
-        self.__output.write("D=A\n" +
-                            "@R13\n" +
-                            "M=D\n" +
-                            "@SP\n" +
-                            "M=M-1\n" +
-                            "A=M\n" +
-                            "D=M\n" +
-                            "@R13\n" +
-                            "A=M\n" +
-                            "M=D\n")
-        
-    def write_static_pop(self, index: int) -> None:
-        self.__output.write("@SP\n" + 
-                            "M=M-1\n" + 
-                            "A=M\n" + 
-                            "D=M\n" + 
-                            "@" + self.__filename + "." + str(index) + "\n" + 
-                            "M=D\n")
-    
-    def write_segment_index(self, index: int) -> None:
-        self.__output.write("D=A\n" +
-                            "@" + str(index) + "\n" +
-                            "A=A+D\n")
-
-    def write_add_sub(self, operator: str) -> None:
-        self.__output.write("@SP \n" +
-                            "A=M\n" +
-                            "A=A-1\n" +
-                            "D=M\n" +
-                            "A=A-1\n" +
-                            "M=M" + operator + "D\n" +
-                            "@SP\n" +
-                            "M=M-1\n")
+        self.__label_prefix = filename + "." + self.__curr_func + "$"
 
     def write_cmp(self, jump_comm: str) -> None:
-        if jump_comm == "JGT":
-            jump_val = ["-1", "0"]
-        elif jump_comm == "JLT":
-            jump_val = ["0", "-1"]
-        else:
-            jump_val = ["0", "0"]
-
         unique_label = str(self.__label_counter) + "." + self.__filename
-        self.__output.write("@SP\n" +
-                            "A=M\n" +
-                            "A=A-1\n" +
-                            "D=M\n" +
-                            "@R14\n" +
-                            "M=D\n" +
-                            "@SP\n" +
-                            "A=M\n" +
-                            "A=A-1\n" +
-                            "A=A-1\n" +
-                            "D=M\n" +
-                            "@R13\n" +
-                            "M=D\n" +
-                            "@X_POS" +  unique_label + "\n" +
-                            "D;JGE\n" +
-                            "@X_NEG" +  unique_label + "\n" +
-                            "0;JMP\n")
-        self.__output.write("(X_POS" + unique_label + ")\n" +
-                            "@R14\n" +
-                            "D=M\n" +
-                            "@EQ_SIGN" + unique_label + "\n" +
-                            "D;JGE\n" +
-                            "@X_POS_Y_NEG" + unique_label + "\n" +
-                            "0;JMP\n")
-        self.__output.write("(X_NEG" + unique_label + ")\n" +
-                            "@R14\n" +
-                            "D=M\n" +
-                            "@X_NEG_Y_POS" + unique_label + "\n" +
-                            "D;JGE\n" +
-                            "@EQ_SIGN" + unique_label + "\n" +
-                            "0;JMP\n")
-        self.__output.write("(X_POS_Y_NEG" + unique_label + ")\n" + 
-                            "@SP\n" +
-                            "M=M-1\n" +
-                            "A=M\n" +
-                            "A=A-1\n" + 
-                            "M=" + jump_val[0] + "\n" +  
-                            "@ENDCMP" + unique_label + "\n" + 
-                            "0;JMP\n")
-        self.__output.write("(X_NEG_Y_POS" + unique_label + ")\n" + 
-                            "@SP\n" +
-                            "M=M-1\n" +
-                            "A=M\n" +
-                            "A=A-1\n" + 
-                            "M=" + jump_val[1] + "\n" +  
-                            "@ENDCMP" + unique_label + "\n" + 
-                            "0;JMP\n")
-        self.__output.write("(EQ_SIGN" + unique_label + ")\n" +
-                            "@R14\n" +
-                            "D=M\n" +
-                            "@R13\n" +
-                            "D=M-D\n" +
-                            "@TRUE" + unique_label + "\n" +
-                            "D;" + jump_comm + "\n" +
-                            "@SP\n" +
-                            "M=M-1\n" +
-                            "A=M\n" +
-                            "A=A-1\n" + 
-                            "M=0\n" + 
-                            "@ENDCMP" + unique_label + "\n" +
-                            "0;JMP\n" +
-                            "(TRUE" + unique_label + ")\n" +
-                            "@SP\n" +
-                            "M=M-1\n" +
-                            "A=M\n" +
-                            "A=A-1\n" + 
-                            "M=-1\n" + 
-                            "(ENDCMP" + unique_label + ")\n")
         self.__label_counter += 1
+        if self.__shared_runtime:
+            self.write(SHARED_CMP_TEMPLATE, {"label": unique_label,
+                                             "jump": jump_comm})
+        else:
+            self.write(CMP_BODY_TEMPLATES[jump_comm], {"label": unique_label})
 
-    def write_and_or(self, operator: str) -> None:
-        self.__output.write("@SP\n" +
-                            "A=M\n" +
-                            "A=A-1\n" +
-                            "D=M\n" +
-                            "A=A-1\n" +
-                            "M=D" + operator + "M\n" +
-                            "@SP\n" +
-                            "M=M-1\n")
-
-    def write_neg_not(self, operator: str) -> None:
-        self.__output.write("@SP\n" +
-                            "A=M\n" + 
-                            "A=A-1\n" + 
-                            "M=" + operator + "M\n")
-
-    def write_shift(self, operator: str) -> None:
-        self.__output.write("@SP\n" + 
-                            "A=M\n" + 
-                            "A=A-1\n" + 
-                            "M=" + "M" + operator + "\n")
-    
     def write_arithmetic(self, command: str) -> None:
-        """Writes assembly code that is the translation of the given 
+        """Writes assembly code that is the translation of the given
         arithmetic command. For the commands eq, lt, gt, you should correctly
         compare between all numbers our computer supports, and we define the
         value "true" to be -1, and "false" to be 0.
@@ -201,65 +618,41 @@ class CodeWriter:
         Args:
             command (str): an arithmetic command.
         """
-        if command == "add":
-             self.write_add_sub("+")
-        elif command == "sub":
-            self.write_add_sub("-")
-        elif command == "eq":
-            self.write_cmp("JEQ")
-        elif command == "gt":
-            self.write_cmp("JGT")
-        elif command == "lt":
-            self.write_cmp("JLT")
-        elif command == "and":
-            self.write_and_or("&")
-        elif command == "or":
-            self.write_and_or("|")
-        elif command == "neg":
-            self.write_neg_not("-")
-        elif command == "not":
-            self.write_neg_not("!")
-        elif command == "shiftleft":
-            self.write_shift("<<")
-        elif command == "shiftright":
-            self.write_shift(">>")
-
-    def write_push_pop(self, command: str, segment: str, index: int) -> None:
-        """Writes assembly code that is the translation of the given 
+        if command in COMPARISON_JUMPS:
+            # the comparisons work on the stack in RAM
+            self.spill()
+            self.write_cmp(COMPARISON_JUMPS[command])
+        elif self.__stack_cache:
+            self.fill()
+            self.write(CACHED_ARITHMETIC_CODE[command])
+        else:
+            self.write(ARITHMETIC_CODE[command])
+
+    def write_push_pop(self, command: CommandType, segment: str,
+                       index: int) -> None:
+        """Writes assembly code that is the translation of the given
         command, where command is either C_PUSH or C_POP.
 
         Args:
-            command (str): "C_PUSH" or "C_POP".
+            command (CommandType): C_PUSH or C_POP.
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
-        seg_dict = {"local": "LCL", "argument": "ARG", "this": "THIS",
-                    "that": "THAT", "temp": "5", "pointer": "3"}
-        
-        if segment in ["local", "argument", "this", "that", "temp", "pointer"]:
-            self.__output.write("@" + seg_dict[segment] + "\n")
-            
-            if segment not in ["temp", "pointer"]:
-                self.__output.write("A=M\n")
-            
-            self.write_segment_index(index)
-            if command == "C_PUSH":
-                self.write_basic_push()
+        if segment == "constant":
+            command = C_PUSH
+        if self.__stack_cache:
+            if command == C_PUSH:
+                # the pushed value becomes the new cached top of the stack
+                self.spill()
+                self.__cached = True
             else:
-                self.write_basic_pop()
-                
-        elif segment == "constant":
-            self.write_constant_push(index)
-        
-        elif segment == "static":
-            if command == "C_PUSH":
-                self.__output.write("@" + self.__filename + "." + str(index) + "\n")
-                self.write_basic_push()
-            else:
-                self.write_static_pop(index)
+                self.fill()
+                self.__cached = False
+        self.write(push_pop_code(command, segment, index, self.__filename,
+                                 self.__stack_cache))
 
     def write_label(self, label: str) -> None:
-        """Writes assembly code that affects the label command. 
+        """Writes assembly code that affects the label command.
         Let "Xxx.foo" be a function within the file Xxx.vm. The handling of
         each "label bar" command within "Xxx.foo" generates and injects the symbol
         "Xxx.foo$bar" into the assembly code stream.
@@ -269,62 +662,75 @@ class CodeWriter:
         Args:
             label (str): the label to write.
         """
-        symbol_to_write = self.__filename + "." + self.__curr_func + "$" + label
-        self.__output.write("(" + symbol_to_write + ")\n")
-    
+        # every path into a label must agree on where the top of the stack is
+        self.spill()
+        self.write(LABEL_TEMPLATE, {"label": self.__label_prefix + label})
+
     def write_goto(self, label: str) -> None:
         """Writes assembly code that affects the goto command.
 
         Args:
             label (str): the label to go to.
         """
-        symbol_to_write = self.__filename + "." + self.__curr_func + "$" + label
-        self.__output.write("@" + 
-                            symbol_to_write + 
-                            "\n" + 
-                            "0;JMP\n")
-    
+        self.spill()
+        self.write(GOTO_TEMPLATE, {"label": self.__label_prefix + label})
+
     def write_if(self, label: str) -> None:
-        """Writes assembly code that affects the if-goto command. 
+        """Writes assembly code that affects the if-goto command.
 
         Args:
             label (str): the label to go to.
         """
-        symbol_to_write = self.__filename + "." + self.__curr_func + "$" + label
-        self.__output.write("@SP\n" + 
-                            "M=M-1\n" + 
-                            "A=M\n" + 
-                            "D=M\n" + 
-                            "@" + 
-                            symbol_to_write + 
-                            "\n" + 
-                            "D;JNE\n")
+        if self.__cached:
+            # the condition is already in D
+            self.write(CACHED_IF_TEMPLATE,
+                       {"label": self.__label_prefix + label})
+            self.__cached = False
+            return
+        self.write(IF_TEMPLATE, {"label": self.__label_prefix + label})
+
+    def write_if_not(self, label: str) -> None:
+        """Writes assembly code that affects the C_IF_NOT command of the
+        VMOptimizer, which jumps unless the popped value is -1. The value is
+        -1 exactly when adding 1 to it gives 0.
+
+        Args:
+            label (str): the label to go to.
+        """
+        if self.__cached:
+            self.write(CACHED_IF_NOT_TEMPLATE,
+                       {"label": self.__label_prefix + label})
+            self.__cached = False
+            return
+        self.write(IF_NOT_TEMPLATE, {"label": self.__label_prefix + label})
 
     def write_function(self, function_name: str, n_vars: int) -> None:
-        """Writes assembly code that affects the function command. 
+        """Writes assembly code that affects the function command.
         The handling of each "function Xxx.foo" command within the file Xxx.vm
         generates and injects a symbol "Xxx.foo" into the assembly code stream,
         that labels the entry-point to the function's code.
-        In the subsequent assembly process, the assembler translates this 
+        In the subsequent assembly process, the assembler translates this
         symbol into the physical address where the function code starts.
 
         Args:
             function_name (str): the name of the function.
             n_vars (int): the number of local variables of the function.
         """
+        self.spill()
         self.__curr_func = function_name
-        self.__output.write("(" + self.__curr_func + ")\n")
+        self.__label_prefix = self.__filename + "." + function_name + "$"
+        self.write(LABEL_TEMPLATE, {"label": function_name})
         for i in range(n_vars):
-            self.write_push_pop("C_PUSH", "constant", 0)
+            self.write_push_pop(C_PUSH, "constant", 0)
 
     def write_call(self, function_name: str, n_args: int) -> None:
-        """Writes assembly code that affects the call command. 
+        """Writes assembly code that affects the call command.
         Let "Xxx.foo" be a function within the file Xxx.vm.
         The handling of each "call" command within Xxx.foo's code generates and
         injects a symbol "Xxx.foo$ret.i" into the assembly code stream, where
         "i" is a running integer (one such symbol is generated for each "call"
         command within "Xxx.foo").
-        This symbol is used to mark the return address within the caller's 
+        This symbol is used to mark the return address within the caller's
         code. In the subsequent assembly process, the assembler translates this
         symbol into the physical memory address of the command immediately
         following the "call" command.
@@ -332,104 +738,32 @@ class CodeWriter:
         Args:
             function_name (str): the name of the function to call.
             n_args (int): the number of arguments of the function.
-        """  
+        """
+        self.spill()
         self.__func_counter += 1
         label = self.__filename + "." + function_name + "$" + "returnAddress." + str(self.__func_counter)
 
-        # generates a label and pushes it to the stack
-        self.__output.write("@" + 
-                            label + 
-                            "\n" + 
-                            "D=A\n" + 
-                            "@SP\n" + 
-                            "A=M\n" + 
-                            "M=D\n" + 
-                            "@SP\n" + 
-                            "M=M+1\n")
-
-        # saves LCL, ARG, THIS, THAT of the caller
-        for seg in ["@LCL", "@ARG", "@THIS", "@THAT"]:
-            self.__output.write(seg + 
-                                "\n" + 
-                                "D=M\n" + 
-                                "@SP\n" + 
-                                "A=M\n" + 
-                                "M=D\n" + 
-                                "@SP\n" + 
-                                "M=M+1\n")
-
-        # repositions ARG
-        self.__output.write("@SP\n" + 
-                            "D=M\n" + 
-                            "@" + 
-                            str(n_args+5) + 
-                            "\n" + 
-                            "D=D-A\n" + 
-                            "@ARG\n" + 
-                            "M=D\n")
-
-        # repositions LCL
-        self.__output.write("@SP\n" + 
-                            "D=M\n" + 
-                            "@LCL\n" + 
-                            "M=D\n")
-
-        # transfers control to the callee
-        self.__output.write("@" + 
-                            function_name + 
-                            "\n" + 
-                            "0;JMP\n")
-
-        # injects the return address label into the code
-        self.__output.write("(" + label + ")\n")
-    
+        if self.__shared_runtime:
+            self.write_shared_call(function_name, n_args, label)
+            return
+
+        self.write(CALL_TEMPLATE, {"label": label, "frame_size": n_args + 5,
+                                   "function": function_name})
+
+    def write_shared_call(self, function_name: str, n_args: int,
+                          label: str) -> None:
+        # passes the number of arguments in R14 and the callee in R13
+        if n_args in [0, 1]:
+            self.write(SET_ARGS_CONSTANTS[n_args])
+        else:
+            self.write(SET_ARGS_TEMPLATE, {"n_args": n_args})
+        self.write(SHARED_CALL_TEMPLATE, {"function": function_name,
+                                          "label": label})
+
     def write_return(self) -> None:
         """Writes assembly code that affects the return command."""
-        
-        # sets the end frame
-        self.__output.write("@LCL\n" + 
-                            "D=M\n" + 
-                            "@R13\n" + 
-                            "M=D\n")
-
-        # puts the return address in a temp var
-        self.__output.write("@R13\n" + 
-                            "D=M\n" + 
-                            "@5\n" + 
-                            "D=D-A\n" + 
-                            "A=D\n" + 
-                            "D=M\n" + 
-                            "@R14\n" + 
-                            "M=D\n")
-
-        # repositions the return value for the caller
-        self.__output.write("@SP\n" + 
-                            "M=M-1\n" + 
-                            "A=M\n" + 
-                            "D=M\n" + 
-                            "@ARG\n" + 
-                            "A=M\n" + 
-                            "M=D\n")
-       
-        # repositions SP for the caller
-        self.__output.write("@ARG\n" + 
-                            "D=M\n" + 
-                            "D=D+1\n" + 
-                            "@SP\n" + 
-                            "M=D\n")
-        
-        # restores THAT, THIS, ARG, LCL for the caller
-        for seg in ["@THAT", "@THIS", "@ARG", "@LCL"]:
-            self.__output.write("@R13\n" + 
-                                "M=M-1\n" + 
-                                "A=M\n" + 
-                                "D=M\n" + 
-                                seg + 
-                                "\n" + 
-                                "M=D\n")
-        
-        # go to the return address
-        self.__output.write("@R14\n" + 
-                            "A=M\n" + 
-                            "0;JMP\n")
-        
\ No newline at end of file
+        self.spill()
+        if self.__shared_runtime:
+            self.write(SHARED_RETURN_CODE)
+        else:
+            self.write(RETURN_CODE)
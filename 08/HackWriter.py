@@ -0,0 +1,298 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+import functools
+import typing
+
+# The encoding tables of the assembler of project 6, see 06/Code.py. Each
+# value is already shifted into its place in a 16-bit C-instruction.
+DEST_BITS = {'null': 0b000 << 3, 'M': 0b001 << 3, 'D': 0b010 << 3,
+             'MD': 0b011 << 3, 'A': 0b100 << 3, 'AM': 0b101 << 3,
+             'AD': 0b110 << 3, 'AMD': 0b111 << 3}
+
+JUMP_BITS = {'null': 0b000, 'JGT': 0b001, 'JEQ': 0b010, 'JGE': 0b011,
+             'JLT': 0b100, 'JNE': 0b101, 'JLE': 0b110, 'JMP': 0b111}
+
+# the "a" bit and the six "c" bits of every comp mnemonic
+COMP_BITS = {'0': 0b0101010, '1': 0b0111111, '-1': 0b0111010,
+             'D': 0b0001100, 'A': 0b0110000, '!D': 0b0001101,
+             '!A': 0b0110001, '-D': 0b0001111, '-A': 0b0110011,
+             'D+1': 0b0011111, 'A+1': 0b0110111, 'D-1': 0b0001110,
+             'A-1': 0b0110010, 'D+A': 0b0000010, 'D-A': 0b0010011,
+             'A-D': 0b0000111, 'D&A': 0b0000000, 'D|A': 0b0010101,
+             'M': 0b1110000, '!M': 0b1110001, '-M': 0b1110011,
+             'M+1': 0b1110111, 'M-1': 0b1110010, 'D+M': 0b1000010,
+             'D-M': 0b1010011, 'M-D': 0b1000111, 'D&M': 0b1000000,
+             'D|M': 0b1010101,
+             'A+D': 0b0000010, 'M+D': 0b1000010, 'A&D': 0b0000000,
+             'M&D': 0b1000000, 'A|D': 0b0010101, 'M|D': 0b1010101}
+SHIFT_COMP_BITS = {'A<<': 0b0100000, 'D<<': 0b0110000, 'M<<': 0b1100000,
+                   'A>>': 0b0000000, 'D>>': 0b0010000, 'M>>': 0b1000000}
+
+# comp bits together with the instruction prefix: 111 for regular
+# instructions and 101 for the extended shift instructions
+COMP_WORDS = {mnemonic: 0b111 << 13 | bits << 6
+              for mnemonic, bits in COMP_BITS.items()}
+COMP_WORDS.update({mnemonic: 0b101 << 13 | bits << 6
+                   for mnemonic, bits in SHIFT_COMP_BITS.items()})
+
+PREDEFINED_SYMBOLS = {'SP': 0, 'LCL': 1, 'ARG': 2, 'THIS': 3, 'THAT': 4,
+                      'SCREEN': 16384, 'KBD': 24576}
+PREDEFINED_SYMBOLS.update(('R%d' % i, i) for i in range(16))
+
+# the address of the first variable
+FIRST_VARIABLE = 16
+
+# the largest value an A-instruction can load
+MAX_ADDRESS = 32767
+
+
+class Reference(typing.NamedTuple):
+    """An A-instruction of a Template whose word is only known once its
+    fields are filled in, or once the labels of the program are known.
+    """
+    # the symbol that is loaded, which may contain {fields}
+    symbol: str
+    # the field that the whole symbol consists of, whose value may also be
+    # a number, None if the symbol is not a single field
+    field: typing.Optional[str] = None
+
+
+class Label(typing.NamedTuple):
+    """A label declaration of a Template."""
+    # the label, which may contain {fields}
+    symbol: str
+
+
+# builds a Reference or a Label from a tuple of all its fields, without
+# going through the keyword handling of the generated constructor
+_new_item = tuple.__new__
+
+
+def load(value: typing.Union[int, str]) -> typing.Union[int, str]:
+    """
+    Args:
+        value (typing.Union[int, str]): what an A-instruction loads, a number
+            or a symbol.
+
+    Returns:
+        typing.Union[int, str]: the machine word of the A-instruction, or the
+        symbol if it is neither a number nor a predefined symbol.
+
+    Raises:
+        ValueError: if the number is larger than MAX_ADDRESS.
+    """
+    if value.__class__ is str:
+        if not value.isdigit():
+            return PREDEFINED_SYMBOLS.get(value, value)
+        value = int(value)
+    if value > MAX_ADDRESS:
+        raise ValueError("constant out of range: %d" % value)
+    return value
+
+
+def encode(line: str) -> typing.Union[int, Reference, Label]:
+    """
+    Args:
+        line (str): an A-instruction, a C-instruction or a label declaration.
+
+    Returns:
+        typing.Union[int, Reference, Label]: the machine word of the
+        instruction, a Reference if it loads a symbol or a field, or the
+        Label it declares.
+
+    Raises:
+        ValueError: if the instruction is not a valid Hack instruction.
+    """
+    line = line.replace(" ", "")
+    if line[0] == "(":
+        return Label(line[1:-1])
+    if line[0] == "@":
+        value = line[1:]
+        if "{" not in value:
+            word = load(value)
+            return word if word.__class__ is int else Reference(word)
+        if value[0] == "{" and value.find("{", 1) == -1 and \
+                value[-1] == "}":
+            return Reference(value, value[1:-1])
+        return Reference(value)
+    dest, _, comp = line.rpartition("=")
+    comp, _, jump = comp.partition(";")
+    try:
+        return COMP_WORDS[comp] | DEST_BITS[dest or "null"] | \
+            JUMP_BITS[jump or "null"]
+    except KeyError as error:
+        raise ValueError("invalid C-instruction mnemonic: %s"
+                         % error.args[0]) from None
+
+
+class Template:
+    """Assembly code for the CodeWriter, which is encoded into Hack machine
+    words once, when the template is created. Its A-instructions and labels
+    may contain {fields}, which are filled in each time the template is
+    written, as with str.format. Templates are joined with + and repeated
+    with *, without encoding their code again.
+    """
+
+    def __init__(self, code: str,
+                 items: typing.Optional[tuple] = None) -> None:
+        """
+        Args:
+            code (str): whole lines of assembly code.
+            items (typing.Optional[tuple]): the encoded lines of the code, as
+                returned by encode(). If None, the code is encoded.
+        """
+        self.code = code
+        if items is None:
+            items = tuple(encode(line) for line in code.splitlines())
+        self.items = items
+
+    @functools.cached_property
+    def runs(self) -> tuple:
+        """The items, with every run of machine words joined into an array,
+        which HackWriter.write() appends at once. They are only built for
+        the templates that are assembled.
+        """
+        runs = []
+        for item in self.items:
+            if item.__class__ is not int:
+                runs.append(item)
+            elif runs and runs[-1].__class__ is array.array:
+                runs[-1].append(item)
+            else:
+                runs.append(array.array('H', [item]))
+        return tuple(runs)
+
+    @functools.cached_property
+    def holes(self) -> typing.Tuple[int, ...]:
+        """The indices of the items that fill() fills in."""
+        return tuple(index for index, item in enumerate(self.items)
+                     if item.__class__ is not int)
+
+    def __add__(self, other: "Template") -> "Template":
+        return Template(self.code + other.code, self.items + other.items)
+
+    def __mul__(self, count: int) -> "Template":
+        return Template(self.code * count, self.items * count)
+
+    def fill(self, **fields: typing.Union[int, str]) -> "Template":
+        """
+        Args:
+            **fields (typing.Union[int, str]): the value of every field of
+                the template.
+
+        Returns:
+            Template: the template with its fields filled in.
+        """
+        items = list(self.items)
+        for index in self.holes:
+            item = items[index]
+            if item.__class__ is Label:
+                items[index] = _new_item(Label, (
+                    item.symbol.format_map(fields),))
+                continue
+            if item.field is None:
+                word = load(item.symbol.format_map(fields))
+            else:
+                word = load(fields[item.field])
+            if word.__class__ is str:
+                word = _new_item(Reference, (word, None))
+            items[index] = word
+        return Template(self.code.format_map(fields), tuple(items))
+
+
+class HackWriter:
+    """An output for the CodeWriter that assembles the templates written to
+    it into Hack machine words, so that the program is never written out as
+    assembly text and parsed again. References to symbols are resolved by
+    write_program(), once all the labels are known, and variables are
+    allocated in the order of their first reference, as the assembler of
+    project 6 does. The resulting program is identical to assembling the
+    textual output.
+    """
+
+    def __init__(self) -> None:
+        self.words = array.array('H')
+        # label -> ROM address
+        self.labels = {}
+        # symbol -> positions of the words that refer to it, in the order of
+        # the first reference to each symbol
+        self.__fixups = {}
+
+    def write(self, template: Template,
+              fields: typing.Optional[
+                  typing.Dict[str, typing.Union[int, str]]] = None) -> None:
+        """Assembles a template. A word that refers to a label or a variable
+        is written as 0 and patched by write_program().
+
+        Args:
+            template (Template): the code to write.
+            fields (typing.Optional[typing.Dict[str, typing.Union[int, str]]]):
+                the value of every field of the template, if it has any.
+        """
+        words = self.words
+        for item in template.runs:
+            if item.__class__ is array.array:
+                words.extend(item)
+                continue
+            symbol = item.symbol
+            if fields is not None:
+                if item.__class__ is Reference and item.field is not None:
+                    symbol = fields[item.field]
+                else:
+                    symbol = symbol.format_map(fields)
+            if item.__class__ is Label:
+                self.labels[symbol] = len(words)
+                continue
+            word = load(symbol)
+            if word.__class__ is str:
+                self.__fixups.setdefault(word, []).append(len(words))
+                word = 0
+            words.append(word)
+
+    def extend(self, other: "HackWriter") -> None:
+        """Appends the words of another writer, such as one that assembled
+        another file of the program in a separate process.
+
+        Args:
+            other (HackWriter): the writer whose words come next.
+        """
+        offset = len(self.words)
+        self.words.extend(other.words)
+        for label, address in other.labels.items():
+            self.labels[label] = address + offset
+        for symbol, positions in other.__fixups.items():
+            self.__fixups.setdefault(symbol, []).extend(
+                position + offset for position in positions)
+
+    def write_program(self, output_file: typing.TextIO) -> None:
+        """Resolves the references to symbols and writes the program.
+
+        Args:
+            output_file (typing.TextIO): the .hack file to write.
+
+        Raises:
+            ValueError: if an A-instruction refers to a label that it cannot
+                load.
+        """
+        next_variable = FIRST_VARIABLE
+        for symbol, positions in self.__fixups.items():
+            if symbol in self.labels:
+                address = self.labels[symbol]
+                if address > MAX_ADDRESS:
+                    raise ValueError("label %s is at ROM address %d, which "
+                                     "an A-instruction cannot load"
+                                     % (symbol, address))
+            else:
+                address = next_variable
+                next_variable += 1
+            for position in positions:
+                self.words[position] = address
+        self.__fixups.clear()
+        output_file.writelines(format(word, '016b') + '\n'
+                               for word in self.words)
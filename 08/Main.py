@@ -5,77 +5,309 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import itertools
 import os
 import sys
 import typing
-from Parser import Parser
+from Parser import C_ARITHMETIC, C_CALL, C_FUNCTION, C_GOTO, C_IF, \
+    C_IF_NOT, C_LABEL, C_POP, C_PUSH, C_RETURN, CommandType, Parser
 from CodeWriter import CodeWriter
+from VMOptimizer import VMOptimizer
+from CallGraph import CallGraph, ENTRY_FUNCTION
+from HackWriter import HackWriter
+
+# the file name of the bootstrap code, which labels its return address with
+# it. It cannot be the name of a .vm file, so it never collides with one.
+BOOTSTRAP_FILENAME = "$bootstrap"
+
+# the number of commands a streaming translation holds back for the optimizer
+STREAM_WINDOW = 64
+
+# the file name of the commands that are read from the standard input
+STDIN_FILENAME = "Stdin"
+
+# translates a parsed command with a code writer, by the type of the command
+HANDLERS = {
+    C_ARITHMETIC: lambda writer, command:
+        writer.write_arithmetic(command.arg1),
+    C_PUSH: lambda writer, command:
+        writer.write_push_pop(command.kind, command.arg1, command.arg2),
+    C_POP: lambda writer, command:
+        writer.write_push_pop(command.kind, command.arg1, command.arg2),
+    C_LABEL: lambda writer, command: writer.write_label(command.arg1),
+    C_GOTO: lambda writer, command: writer.write_goto(command.arg1),
+    C_IF: lambda writer, command: writer.write_if(command.arg1),
+    C_IF_NOT: lambda writer, command: writer.write_if_not(command.arg1),
+    C_FUNCTION: lambda writer, command:
+        writer.write_function(command.arg1, command.arg2),
+    C_CALL: lambda writer, command:
+        writer.write_call(command.arg1, command.arg2),
+    C_RETURN: lambda writer, command: writer.write_return(),
+}
+
+# the handler of each command type, indexed by the type
+DISPATCH = [HANDLERS[kind] for kind in CommandType]
 
 
 def translate_file(
-        input_file: typing.TextIO, output_file: typing.TextIO,
-        bootstrap: bool) -> None:
+        input_file: typing.TextIO,
+        output_file: typing.Union[typing.TextIO, HackWriter],
+        bootstrap: bool, shared_runtime: bool = False,
+        stack_cache: bool = False,
+        optimizer: typing.Optional[VMOptimizer] = None,
+        functions: typing.Optional[typing.AbstractSet[str]] = None,
+        streaming: bool = False,
+        filename: typing.Optional[str] = None) -> None:
     """Translates a single file.
 
     Args:
         input_file (typing.TextIO): the file to translate.
-        output_file (typing.TextIO): writes all output to this file.
+        output_file (typing.Union[typing.TextIO, HackWriter]): writes all
+            output to this file, or assembles it with this HackWriter.
         bootstrap (bool): if this is True, the current file is the 
             first file we are translating.
+        shared_runtime (bool): if this is True, call, return and the
+            comparisons jump to routines shared by the whole program, which
+            are written with the bootstrap code.
+        stack_cache (bool): if this is True, the top of the stack is kept in
+            the D register between commands.
+        optimizer (typing.Optional[VMOptimizer]): if given, the commands of
+            the file are optimized with it before they are translated.
+        functions (typing.Optional[typing.AbstractSet[str]]): if given, only
+            these functions of the file are translated.
+        streaming (bool): if this is True, the file is translated as it is
+            read, in memory that does not grow with the file.
+        filename (typing.Optional[str]): the name that the labels and static
+            variables of the file are prefixed with, by default the name of
+            input_file.
     """
-    parser = Parser(input_file)
-    code_writer = CodeWriter(output_file)
-    input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
-    code_writer.set_file_name(input_filename)
+    commands = Parser(input_file, streaming)
+    if functions is not None:
+        commands = CallGraph.prune(commands, functions)
+    if optimizer is not None:
+        commands = optimizer.optimize_stream(
+            commands, STREAM_WINDOW if streaming else None)
+    code_writer = CodeWriter(output_file, shared_runtime, stack_cache)
+    if filename is None:
+        filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
+    code_writer.set_file_name(filename)
     if bootstrap:
         code_writer.boot_write()
     
-    while parser.has_more_commands():
-        if parser.command_type() == "C_ARITHMETIC":
-            code_writer.write_arithmetic(parser.arg1())
-        elif parser.command_type() in ["C_PUSH", "C_POP"]:
-            code_writer.write_push_pop(parser.command_type(), parser.arg1(), parser.arg2())
-        elif parser.command_type() == "C_LABEL":
-            code_writer.write_label(parser.arg1())
-        elif parser.command_type() == "C_GOTO":
-            code_writer.write_goto(parser.arg1())
-        elif parser.command_type() == "C_IF":
-            code_writer.write_if(parser.arg1())
-        elif parser.command_type() == "C_FUNCTION":
-            code_writer.write_function(parser.arg1(), parser.arg2())
-        elif parser.command_type() == "C_CALL":
-            code_writer.write_call(parser.arg1(), parser.arg2())
-        elif parser.command_type() == "C_RETURN":
-            code_writer.write_return()
-
-        parser.advance()
+    for command in commands:
+        DISPATCH[command.kind](code_writer, command)
+    code_writer.close()
+
+
+def write_bootstrap(output_file: typing.Union[typing.TextIO, HackWriter],
+                    shared_runtime: bool = False) -> None:
+    """Writes the bootstrap code, and the shared runtime routines if they are
+    used, which come before the code of all the files of a program.
+
+    Args:
+        output_file (typing.Union[typing.TextIO, HackWriter]): writes the
+            bootstrap code to this file, or assembles it with this
+            HackWriter.
+        shared_runtime (bool): if this is True, the shared call, return and
+            comparison routines are written after the bootstrap code.
+    """
+    code_writer = CodeWriter(output_file, shared_runtime)
+    code_writer.set_file_name(BOOTSTRAP_FILENAME)
+    code_writer.boot_write()
+    code_writer.close()
+
+
+class TranslationResult(typing.NamedTuple):
+    """The outcome of translating one file with translate_path."""
+    # the assembly code of the file, or its machine words if it was
+    # assembled
+    code: typing.Union[str, HackWriter]
+    # the optimizer's statistics, None if the file was not optimized
+    stats: typing.Optional[typing.Dict[str, int]] = None
+
+
+def translate_path(
+        input_path: str, shared_runtime: bool = False,
+        stack_cache: bool = False, optimize: bool = False,
+        functions: typing.Optional[typing.AbstractSet[str]] = None,
+        hack: bool = False) -> TranslationResult:
+    """Translates the .vm file at input_path into a buffer, without the
+    bootstrap code. All the labels the code writer generates are prefixed by
+    the name of the file, so the buffers of the files of a program can be
+    translated independently and concatenated, or linked with
+    HackWriter.extend if they were assembled.
+
+    Args:
+        input_path (str): path of the file to translate.
+        shared_runtime (bool): as in translate_file.
+        stack_cache (bool): as in translate_file.
+        optimize (bool): optimize the commands with a VMOptimizer.
+        functions (typing.Optional[typing.AbstractSet[str]]): as in
+            translate_file.
+        hack (bool): assemble the code with a HackWriter instead of
+            writing it as text.
+
+    Returns:
+        TranslationResult: the translated code of the file.
+    """
+    optimizer = VMOptimizer() if optimize else None
+    output_file = HackWriter() if hack else io.StringIO()
+    with open(input_path, 'r') as input_file:
+        translate_file(input_file, output_file, False, shared_runtime,
+                       stack_cache, optimizer, functions)
+    return TranslationResult(output_file if hack else output_file.getvalue(),
+                             optimizer and optimizer.stats)
 
 
 if "__main__" == __name__:
-    # Parses the input path and calls translate_file on each input file.
+    # Parses the input path and calls translate_path (or, when streaming,
+    # translate_file) on each input file.
     # This opens both the input and the output files!
     # Both are closed automatically when the code finishes running.
     # If the output file does not exist, it is created automatically in the
     # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
-    if os.path.isdir(argument_path):
+    arg_parser = argparse.ArgumentParser(prog="VMtranslator")
+    arg_parser.add_argument("input_path")
+    arg_parser.add_argument(
+        "--shared-runtime", action="store_true",
+        help="jump to shared call, return and comparison routines instead "
+             "of inlining them at every use")
+    arg_parser.add_argument(
+        "--stack-cache", action="store_true",
+        help="keep the top of the stack in the D register between commands")
+    arg_parser.add_argument(
+        "--optimize", action="store_true",
+        help="optimize the VM commands and report what each pass removed")
+    arg_parser.add_argument(
+        "--jobs", type=int, default=1, metavar="N",
+        help="translate files in N parallel processes (0 uses all cores)")
+    arg_parser.add_argument(
+        "--prune", action="store_true",
+        help="only translate the functions that can be called from %s"
+             % ENTRY_FUNCTION)
+    arg_parser.add_argument(
+        "--hack", action="store_true",
+        help="assemble the program directly into a .hack file instead of "
+             "writing an .asm file")
+    arg_parser.add_argument(
+        "--stream", action="store_true",
+        help="translate each file as it is read, in memory that does not "
+             "grow with the input")
+    arg_parser.add_argument(
+        "--name", default=STDIN_FILENAME,
+        help="the file name of commands read from the standard input, used "
+             "for their labels and static variables (default: %(default)s)")
+    args = arg_parser.parse_args()
+    # "-" reads the commands from the standard input and writes the code to
+    # the standard output, so the translator can be used in a pipeline
+    from_stdin = args.input_path == "-"
+    streaming = args.stream or from_stdin
+    if streaming and args.jobs != 1:
+        arg_parser.error("--jobs cannot be combined with a streaming "
+                         "translation")
+    if from_stdin and args.prune:
+        arg_parser.error("--prune reads the program twice, so it cannot "
+                         "read it from the standard input")
+    # statistics go to stderr when stdout carries the code
+    report_file = sys.stderr if from_stdin else sys.stdout
+
+    files_to_translate = []
+    output_path = "-"
+    if not from_stdin:
+        argument_path = os.path.abspath(args.input_path)
+        if os.path.isdir(argument_path):
+            files_to_translate = [
+                os.path.join(argument_path, filename)
+                for filename in sorted(os.listdir(argument_path))]
+            output_path = os.path.join(argument_path, os.path.basename(
+                argument_path))
+        else:
+            files_to_translate = [argument_path]
+            output_path, extension = os.path.splitext(argument_path)
+        output_path += ".hack" if args.hack else ".asm"
         files_to_translate = [
-            os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
-        output_path = os.path.join(argument_path, os.path.basename(
-            argument_path))
-    else:
-        files_to_translate = [argument_path]
-        output_path, extension = os.path.splitext(argument_path)
-    output_path += ".asm"
-    bootstrap = True
-    with open(output_path, 'w') as output_file:
+            input_path for input_path in files_to_translate
+            if os.path.splitext(input_path)[1].lower() == ".vm"]
+
+    functions = None
+    if args.prune:
+        # the whole program is parsed once up front to find the functions
+        # that can be called, and each file is then translated on its own
+        call_graph = CallGraph()
         for input_path in files_to_translate:
-            filename, extension = os.path.splitext(input_path)
-            if extension.lower() != ".vm":
-                continue
             with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file, bootstrap)
-            bootstrap = False
+                call_graph.add_commands(Parser(input_file, streaming))
+        if ENTRY_FUNCTION not in call_graph.calls:
+            sys.exit("--prune needs a %s function to start from"
+                     % ENTRY_FUNCTION)
+        functions = call_graph.reachable()
+        print("prune: kept %d of %d functions" % (
+            len(functions & call_graph.calls.keys()),
+            len(call_graph.calls)), file=report_file)
+
+    # the files are translated in any order, but their code is written in
+    # the order of their names, so the output does not depend on timing
+    results = []
+    if not streaming:
+        shared_runtimes = itertools.repeat(args.shared_runtime)
+        stack_caches = itertools.repeat(args.stack_cache)
+        optimizes = itertools.repeat(args.optimize)
+        functions_to_keep = itertools.repeat(functions)
+        hacks = itertools.repeat(args.hack)
+        jobs = args.jobs or os.cpu_count()
+        if jobs > 1 and len(files_to_translate) > 1:
+            with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+                results = list(executor.map(
+                    translate_path, files_to_translate, shared_runtimes,
+                    stack_caches, optimizes, functions_to_keep, hacks))
+        else:
+            results = list(map(
+                translate_path, files_to_translate, shared_runtimes,
+                stack_caches, optimizes, functions_to_keep, hacks))
+
+    # a streaming translation writes all the files with a single optimizer
+    optimizer = VMOptimizer() if args.optimize and streaming else None
+    with contextlib.ExitStack() as files:
+        if from_stdin:
+            output_file = sys.stdout
+        else:
+            output_file = files.enter_context(open(output_path, 'w'))
+        # the code is assembled into one HackWriter, which writes the
+        # program once all its labels are known
+        code_output = HackWriter() if args.hack else output_file
+        write_bootstrap(code_output, args.shared_runtime)
+        if from_stdin:
+            translate_file(sys.stdin, code_output, False,
+                           args.shared_runtime, args.stack_cache, optimizer,
+                           functions, True, args.name)
+        elif streaming:
+            for input_path in files_to_translate:
+                with open(input_path, 'r') as input_file:
+                    translate_file(input_file, code_output, False,
+                                   args.shared_runtime, args.stack_cache,
+                                   optimizer, functions, True)
+        for result in results:
+            if args.hack:
+                code_output.extend(result.code)
+            else:
+                output_file.write(result.code)
+        if args.hack:
+            try:
+                code_output.write_program(output_file)
+            except ValueError as error:
+                sys.exit("%s: %s" % (output_path, error))
+    if args.optimize:
+        total_stats = dict.fromkeys(VMOptimizer.PASSES, 0)
+        all_stats = [optimizer.stats] if streaming else \
+            [result.stats for result in results]
+        for stats in all_stats:
+            for pass_name, count in stats.items():
+                total_stats[pass_name] += count
+        for pass_name in VMOptimizer.PASSES:
+            print("optimizer: %-17s %d" % (pass_name,
+                                           total_stats[pass_name]),
+                  file=report_file)
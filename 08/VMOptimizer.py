@@ -0,0 +1,133 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import collections
+import typing
+
+from Parser import C_ARITHMETIC, C_FUNCTION, C_GOTO, C_IF, C_IF_NOT, \
+    C_LABEL, C_POP, C_PUSH, C_RETURN, Command
+
+# binary operators that are folded when both operands are constants
+FOLDED_OPERATORS = {"add": lambda a, b: a + b,
+                    "sub": lambda a, b: a - b,
+                    "and": lambda a, b: a & b,
+                    "or": lambda a, b: a | b}
+
+# the largest value that "push constant" can push
+MAX_CONSTANT = 32767
+
+
+class VMOptimizer:
+    """An optimizer over the commands of a single .vm file. It runs between
+    the Parser and the CodeWriter, and its passes are:
+    - "constant_folding": replaces "push constant a, push constant b, op"
+      with a single "push constant", for add, sub, and and or, when the
+      result can be pushed as a constant.
+    - "push_pop": drops "push x i" directly followed by "pop x i".
+    - "not_if_fusion": replaces "not, if-goto L" with a single C_IF_NOT
+      command, which jumps unless the popped value is -1 (true). It is not
+      part of the VM language, so it only exists between the optimizer and
+      the CodeWriter.
+    - "unreachable": drops commands between a goto or a return and the next
+      label or function.
+    """
+
+    PASSES = ["constant_folding", "push_pop", "not_if_fusion", "unreachable"]
+
+    def __init__(self) -> None:
+        """Creates an optimizer with all statistics at zero."""
+        # pass name -> VM commands it removed
+        self.stats = dict.fromkeys(VMOptimizer.PASSES, 0)
+
+    def optimize(self, commands: typing.List[Command]) -> typing.List[Command]:
+        """Applies all the passes in a single walk over the commands. Each
+        command is matched against the end of the optimized output, so the
+        result of one rewrite can take part in the next one, as in
+        "push constant 1, push constant 2, add, push constant 3, add".
+
+        Args:
+            commands (typing.List[Command]): the VM commands of a file.
+
+        Returns:
+            typing.List[Command]: the optimized commands.
+        """
+        return list(self.optimize_stream(commands))
+
+    def optimize_stream(
+            self, commands: typing.Iterable[Command],
+            window: typing.Optional[int] = None
+    ) -> typing.Iterator[Command]:
+        """Like optimize, but yields the optimized commands as they are
+        settled. Only the last window commands of the output can still be
+        rewritten, so the memory used does not grow with the input.
+
+        Args:
+            commands (typing.Iterable[Command]): the VM commands of a file.
+            window (typing.Optional[int]): the number of optimized commands
+                to hold back, None to hold back all of them.
+
+        Returns:
+            typing.Iterator[Command]: the optimized commands.
+        """
+        optimized = collections.deque()
+        reachable = True
+        for command in commands:
+            if window is not None and len(optimized) > window:
+                yield optimized.popleft()
+            kind = command.kind
+            if kind == C_LABEL or kind == C_FUNCTION:
+                reachable = True
+            elif not reachable:
+                self.stats["unreachable"] += 1
+                continue
+            if kind == C_GOTO or kind == C_RETURN:
+                reachable = False
+
+            previous = optimized[-1] if optimized else None
+            if command.arg1 in FOLDED_OPERATORS and \
+                    kind == C_ARITHMETIC and len(optimized) >= 2:
+                folded = self.__fold(optimized[-2], previous, command.arg1)
+                if folded is not None:
+                    optimized.pop()
+                    optimized[-1] = folded
+                    self.stats["constant_folding"] += 2
+                    continue
+            elif kind == C_POP and previous is not None and \
+                    previous.kind == C_PUSH and \
+                    previous[1:] == command[1:]:
+                optimized.pop()
+                self.stats["push_pop"] += 2
+                continue
+            elif kind == C_IF and \
+                    previous == (C_ARITHMETIC, "not", None):
+                optimized[-1] = Command(C_IF_NOT, command.arg1)
+                self.stats["not_if_fusion"] += 1
+                continue
+            optimized.append(command)
+        yield from optimized
+
+    @staticmethod
+    def __fold(first: Command, second: Command,
+               operator: str) -> typing.Optional[Command]:
+        """
+        Args:
+            first (Command): the command that pushes the first operand.
+            second (Command): the command that pushes the second operand.
+            operator (str): a command of FOLDED_OPERATORS.
+
+        Returns:
+            typing.Optional[Command]: a command that pushes the result of
+            operator, None if the operands are not both constants or the
+            result is not a valid constant.
+        """
+        if first[:2] != (C_PUSH, "constant") or \
+                second[:2] != (C_PUSH, "constant"):
+            return None
+        result = FOLDED_OPERATORS[operator](first.arg2, second.arg2)
+        if not 0 <= result <= MAX_CONSTANT:
+            return None
+        return Command(C_PUSH, "constant", result)
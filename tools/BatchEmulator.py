@@ -0,0 +1,317 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import typing
+
+import numpy as np
+
+from CPUEmulator import CPUEmulator, HALT_WORD, RAM_SIZE, ROM_SIZE, SIGN_BIT
+
+# The rows of the control table, one boolean per decoded field of the
+# instruction at each ROM address.
+IS_C, A_BIT, F, SHIFT, SHIFT_LEFT, SHIFT_D, LOADS_A, DEST_D, DEST_M, \
+    PURE_JUMP, HALT = range(11)
+NUM_FIELDS = 11
+
+# The rows of the mask table, int16 words that apply the zx, nx, zy, ny and
+# no bits of the ALU with one AND or XOR each: x = (D & KEEP_X) ^ FLIP_X.
+KEEP_X, FLIP_X, KEEP_Y, FLIP_Y, FLIP_OUT = range(5)
+NUM_MASKS = 5
+
+# Whether each jump field jumps, at index 3 * jump + sign + 1, where sign is
+# the sign of the ALU output (-1, 0 or 1).
+JUMP_TABLE = np.array([bool(jump & bit) for jump in range(8)
+                       for bit in (0b100, 0b010, 0b001)])
+
+# how many steps run() takes between checks of which computers halted
+HALT_CHECK_INTERVAL = 64
+
+# the maximal number of computers that are stepped together
+GROUP_SIZE = 8192
+
+
+class BatchEmulator:
+    """Runs the same Hack program on many computers at once. The registers
+    of all the computers are NumPy int16 vectors and their RAMs are rows of
+    one int16 matrix, so every step executes the current instruction of
+    each computer with a fixed number of vector operations. The computers
+    may be at different instructions; each field of every instruction is
+    decoded once, into a table that is indexed by the program counters.
+    """
+
+    def __init__(self, num_machines: int, ram_size: int = RAM_SIZE) -> None:
+        """Creates num_machines computers with an empty ROM and RAM.
+
+        Args:
+            num_machines (int): the number of computers.
+            ram_size (int): the number of RAM words of each computer, a power
+                of two. Programs that only use the bottom of the RAM can use
+                a smaller size, to save memory; addresses wrap around it.
+        """
+        if ram_size & (ram_size - 1) or not 0 < ram_size <= RAM_SIZE:
+            raise ValueError("RAM size must be a power of two up to %d"
+                             % RAM_SIZE)
+        self.num_machines = num_machines
+        self.ram_size = ram_size
+        self.ram = np.zeros((num_machines, ram_size), dtype=np.int16)
+        self.a = np.zeros(num_machines, dtype=np.int16)
+        self.d = np.zeros(num_machines, dtype=np.int16)
+        self.pc = np.zeros(num_machines, dtype=np.int16)
+        # the number of instructions each computer executed before halting
+        self.cycles = np.zeros(num_machines, dtype=np.int64)
+        self.halted = np.zeros(num_machines, dtype=bool)
+        self.__control = np.zeros((NUM_FIELDS, ROM_SIZE), dtype=bool)
+        self.__masks = np.zeros((NUM_MASKS, ROM_SIZE), dtype=np.int16)
+        # 3 * jump + 1 for every instruction, as an index into JUMP_TABLE
+        self.__jumps = np.ones(ROM_SIZE, dtype=np.int16)
+        self.__values = np.zeros(ROM_SIZE, dtype=np.int16)
+        self.__has_shifts = False
+
+    def load_rom(self, words: typing.Iterable[int]) -> None:
+        """Loads a program into the ROM of every computer, and resets them.
+
+        Args:
+            words (typing.Iterable[int]): the machine words of the program.
+        """
+        words = list(words)
+        if len(words) > ROM_SIZE:
+            raise ValueError("program has %d words, but the ROM holds %d"
+                             % (len(words), ROM_SIZE))
+        control = np.zeros((NUM_FIELDS, ROM_SIZE), dtype=bool)
+        control[LOADS_A] = True
+        masks = np.zeros((NUM_MASKS, ROM_SIZE), dtype=np.int16)
+        jumps = np.ones(ROM_SIZE, dtype=np.int16)
+        values = np.zeros(ROM_SIZE, dtype=np.int16)
+        for address, word in enumerate(words):
+            values[address] = np.int16(word - 0x10000 if word & SIGN_BIT
+                                       else word)
+            if word & SIGN_BIT:
+                control[:, address], masks[:, address] = \
+                    BatchEmulator.decode(word)
+                jumps[address] = 3 * (word & 0b111) + 1
+                # "@X / 0;JMP" at X is the loop that ends Hack programs
+                control[HALT, address] = word == HALT_WORD and \
+                    address > 0 and words[address - 1] == address - 1
+        self.__control = control
+        self.__masks = masks
+        self.__jumps = jumps
+        self.__values = values
+        self.__has_shifts = bool(control[SHIFT].any())
+        self.reset()
+
+    def load_hack(self, input_file: typing.Iterable[str]) -> None:
+        """Loads a .hack program into every ROM and resets the computers.
+
+        Args:
+            input_file (typing.Iterable[str]): a .hack file.
+        """
+        self.load_rom(CPUEmulator.read_hack(input_file))
+
+    @staticmethod
+    def decode(word: int) -> typing.Tuple[typing.List[bool],
+                                          typing.List[int]]:
+        """
+        Args:
+            word (int): a C-instruction.
+
+        Returns:
+            typing.Tuple[typing.List[bool], typing.List[int]]: a column of the
+            control table and a column of the mask table.
+        """
+        # rejects invalid instructions
+        CPUEmulator.decode(word)
+        bit = [bool(word >> i & 1) for i in range(16)]
+        control = [False] * NUM_FIELDS
+        control[IS_C] = True
+        control[A_BIT] = bit[12]
+        control[F] = bit[7]
+        control[SHIFT] = not bit[14]
+        control[SHIFT_LEFT], control[SHIFT_D] = bit[11], bit[10]
+        control[LOADS_A], control[DEST_D], control[DEST_M] = \
+            bit[5], bit[4], bit[3]
+        # an unconditional jump that changes nothing, which the computer
+        # never leaves if it jumps to itself
+        control[PURE_JUMP] = word & 0b111111 == 0b000111
+        masks = [0] * NUM_MASKS
+        masks[KEEP_X] = 0 if bit[11] else -1
+        masks[FLIP_X] = -1 if bit[10] else 0
+        masks[KEEP_Y] = 0 if bit[9] else -1
+        masks[FLIP_Y] = -1 if bit[8] else 0
+        masks[FLIP_OUT] = -1 if bit[6] else 0
+        return control, masks
+
+    def reset(self) -> None:
+        """Restarts the program on every computer. As in the hardware, only
+        the program counters are cleared."""
+        self.pc[:] = 0
+        self.cycles[:] = 0
+        self.halted[:] = False
+
+    def set_ram(self, address: int,
+                values: typing.Union[int, typing.Sequence[int]]) -> None:
+        """
+        Args:
+            address (int): a RAM address.
+            values (typing.Union[int, typing.Sequence[int]]): one value for
+                all the computers, or a value for each of them. Values are
+                signed or unsigned 16-bit numbers.
+        """
+        values = np.asarray(values, dtype=np.int64)
+        self.ram[:, address] = (values & 0xFFFF).astype(np.uint16).view(
+            np.int16)
+
+    def get_ram(self, address: int) -> np.ndarray:
+        """
+        Args:
+            address (int): a RAM address.
+
+        Returns:
+            np.ndarray: the value at address in every computer, as signed
+            16-bit numbers.
+        """
+        return self.ram[:, address].copy()
+
+    def run(self, cycles: int) -> int:
+        """Steps all the computers together, up to the given number of times
+        or until all of them halt. A computer halts when it reaches the loop
+        that ends Hack programs, or an unconditional jump to itself.
+
+        The computers are run in groups of at most GROUP_SIZE, so that the
+        vectors stay in the CPU cache, and every HALT_CHECK_INTERVAL steps
+        the computers that halted are dropped from the vectors.
+
+        Args:
+            cycles (int): the maximal number of steps.
+
+        Returns:
+            int: the number of steps taken.
+        """
+        steps = 0
+        for first in range(0, self.num_machines, GROUP_SIZE):
+            group = np.arange(first, min(first + GROUP_SIZE,
+                                         self.num_machines))
+            steps = max(steps, self.__run_group(group, cycles))
+        return steps
+
+    def __run_group(self, group: np.ndarray, cycles: int) -> int:
+        """Steps the given computers together.
+
+        Args:
+            group (np.ndarray): the indices of the computers.
+            cycles (int): the maximal number of steps.
+
+        Returns:
+            int: the number of steps taken.
+        """
+        running = group[~self.halted[group]]
+        step = 0
+        while step < cycles and running.size:
+            a, d, pc = self.a[running], self.d[running], self.pc[running]
+            offsets = running * self.ram_size
+            executed = np.zeros(running.size, dtype=np.int64)
+            halted = np.zeros(running.size, dtype=bool)
+            interval = min(HALT_CHECK_INTERVAL, cycles - step)
+            for _ in range(interval):
+                halted = self.__step(a, d, pc, halted, executed, offsets)
+            step += interval
+            self.a[running], self.d[running], self.pc[running] = a, d, pc
+            self.cycles[running] += executed
+            self.halted[running] = halted
+            running = running[~halted]
+        return step
+
+    def __step(self, a: np.ndarray, d: np.ndarray, pc: np.ndarray,
+               halted: np.ndarray, executed: np.ndarray,
+               offsets: np.ndarray) -> np.ndarray:
+        """Executes one instruction on each of the given computers that has
+        not halted. The registers are updated in place.
+
+        Args:
+            a (np.ndarray): the A registers of the computers.
+            d (np.ndarray): the D registers of the computers.
+            pc (np.ndarray): the program counters of the computers.
+            halted (np.ndarray): which of the computers halted.
+            executed (np.ndarray): the number of instructions each computer
+                executed, which this step increments.
+            offsets (np.ndarray): where the RAM of each computer starts in
+                the flattened RAM.
+
+        Returns:
+            np.ndarray: which of the computers halted after the step.
+        """
+        ram = self.ram.reshape(-1)
+        control = self.__control.take(pc, axis=1)
+        masks = self.__masks.take(pc, axis=1)
+        is_c = control[IS_C]
+        cell = offsets + (a & np.int16(self.ram_size - 1))
+        m = ram.take(cell)
+
+        # the regular ALU, on D and A or M
+        operand = np.where(control[A_BIT], m, a)
+        x = (d & masks[KEEP_X]) ^ masks[FLIP_X]
+        y = (operand & masks[KEEP_Y]) ^ masks[FLIP_Y]
+        out = np.where(control[F], x + y, x & y) ^ masks[FLIP_OUT]
+        if self.__has_shifts:
+            # the shift instructions, as in 05/ExtendAlu.hdl
+            shifted = np.where(control[SHIFT_D], d, operand)
+            shifted = np.where(control[SHIFT_LEFT], shifted << 1,
+                               shifted >> 1)
+            out = np.where(control[SHIFT], shifted, out)
+
+        target = a & np.int16(ROM_SIZE - 1)
+        jump = JUMP_TABLE.take(self.__jumps.take(pc) + np.sign(out))
+        halted = halted | control[HALT] | \
+            (control[PURE_JUMP] & (target == pc))
+        running = ~halted
+
+        # The instructions of halted computers are executed again and again,
+        # which changes nothing but the program counter
+        write = control[DEST_M]
+        if write.any():
+            ram[cell] = np.where(write, out, m)
+        np.copyto(d, out, where=control[DEST_D])
+        np.copyto(a, np.where(is_c, out, self.__values.take(pc)),
+                  where=control[LOADS_A])
+        np.copyto(pc, np.where(jump, target, (pc + 1) & (ROM_SIZE - 1)),
+                  where=running)
+        executed += running
+        return halted
+
+
+if "__main__" == __name__:
+    # Runs a .hack program on many computers, one per set of inputs, and
+    # prints the RAM words that were asked for.
+    # Usage: BatchEmulator <file.hack> --set ADDR=V1,V2,... [--print ADDR]
+    arg_parser = argparse.ArgumentParser(prog="BatchEmulator")
+    arg_parser.add_argument("program", help="a .hack file")
+    arg_parser.add_argument("--cycles", type=int, default=1000000,
+                            help="the maximal number of steps to run")
+    arg_parser.add_argument("--set", action="append", default=[],
+                            metavar="ADDR=V1,V2,...",
+                            help="set a RAM word of each computer")
+    arg_parser.add_argument("--print", action="append", default=[],
+                            type=int, metavar="ADDR",
+                            help="print a RAM word after running")
+    args = arg_parser.parse_args()
+
+    inputs = {}
+    for assignment in args.set:
+        address, _, values = assignment.partition("=")
+        inputs[int(address)] = [int(value) for value in values.split(",")]
+    num_machines = max((len(values) for values in inputs.values()), default=1)
+
+    emulator = BatchEmulator(num_machines)
+    with open(args.program, 'r') as hack_file:
+        emulator.load_hack(hack_file)
+    for address, values in inputs.items():
+        emulator.set_ram(address, values)
+    emulator.run(args.cycles)
+    for machine in range(num_machines):
+        print(" ".join("RAM[%d] = %d" % (address, emulator.ram[machine,
+                                                                address])
+                       for address in args.print))
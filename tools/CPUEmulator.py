@@ -0,0 +1,604 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import sys
+import typing
+
+# the sizes of the instruction and data memories, in words
+ROM_SIZE = 32768
+RAM_SIZE = 32768
+
+# addresses are 15 bits wide, words are 16 bits wide
+ADDRESS_MASK = 0x7FFF
+WORD_MASK = 0xFFFF
+SIGN_BIT = 0x8000
+
+# The comp field of the regular ALU, as the six "c" bits (zx, nx, zy, ny,
+# f, no). "y" stands for A or M, according to the "a" bit. The results are
+# unsigned 16-bit words. Other combinations of the bits are computed by
+# alu_expression().
+ALU_EXPRESSIONS = {0b101010: '0', 0b111111: '1', 0b111010: '65535',
+                   0b001100: 'd', 0b110000: 'y',
+                   0b001101: 'd ^ 65535', 0b110001: 'y ^ 65535',
+                   0b001111: '-d & 65535', 0b110011: '-y & 65535',
+                   0b011111: '(d + 1) & 65535', 0b110111: '(y + 1) & 65535',
+                   0b001110: '(d - 1) & 65535', 0b110010: '(y - 1) & 65535',
+                   0b000010: '(d + y) & 65535', 0b010011: '(d - y) & 65535',
+                   0b000111: '(y - d) & 65535', 0b000000: 'd & y',
+                   0b010101: 'd | y'}
+
+# The comp field of the extended shift instructions (prefix 101), as in
+# 05/ExtendAlu.hdl: c1 selects a left shift, c2 shifts D instead of y. Right
+# shifts are arithmetic, as in 02/ShiftRight.hdl.
+SHIFT_EXPRESSIONS = {0b000000: '(y >> 1) | (y & 32768)',
+                     0b010000: '(d >> 1) | (d & 32768)',
+                     0b100000: '(y << 1) & 65535',
+                     0b110000: '(d << 1) & 65535'}
+
+# the maximal number of instructions in a compiled block
+MAX_BLOCK = 1024
+
+# the condition under which each jump field jumps, given the unsigned ALU
+# output
+JUMP_CONDITIONS = {0b001: '0 < out < 32768', 0b010: 'out == 0',
+                   0b011: 'out < 32768', 0b100: 'out >= 32768',
+                   0b101: 'out != 0', 0b110: 'not 0 < out < 32768'}
+
+
+class Halt(Exception):
+    """Raised by the instruction that ends a program, to leave run()."""
+
+
+def alu_expression(bits: int) -> str:
+    """
+    Args:
+        bits (int): the six "c" bits of a regular C-instruction.
+
+    Returns:
+        str: a Python expression over d and y that computes the ALU output,
+        as an unsigned 16-bit word.
+    """
+    if bits in ALU_EXPRESSIONS:
+        return ALU_EXPRESSIONS[bits]
+    # Python integers behave as infinitely wide two's complement numbers, so
+    # the ALU can be followed literally and masked once at the end
+    x = '0' if bits & 0b100000 else 'd'
+    if bits & 0b010000:
+        x = '~' + x
+    y = '0' if bits & 0b001000 else 'y'
+    if bits & 0b000100:
+        y = '~' + y
+    out = '(%s + %s)' % (x, y) if bits & 0b000010 else '(%s & %s)' % (x, y)
+    if bits & 0b000001:
+        out = '~' + out
+    return '%s & 65535' % out
+
+
+class CPUEmulator:
+    """Runs Hack machine language programs. The ROM and RAM hold unsigned
+    16-bit words.
+
+    The program is run a block at a time. The first time execution reaches
+    an address, the instructions from there to the next jump whose target is
+    not known in advance are compiled into a single Python function, in
+    which values loaded by A-instructions are constants. The function is
+    cached by its start address.
+
+    In single-step mode, which is meant for debugging the emulator, every
+    distinct C-instruction is instead compiled once into a Python function,
+    which the program counter indexes through a table that is built when the
+    ROM is loaded. It runs a few million instructions per second, several
+    times slower than blocks. The end of a run that is too short for the
+    next block, and step(), always go through this table.
+    """
+
+    # compiled C-instructions, by machine word
+    compiled = {}
+
+    def __init__(self, single_step: bool = False) -> None:
+        """Creates a computer with an empty ROM and RAM.
+
+        Args:
+            single_step (bool): if True, run() executes one instruction at a
+                time instead of compiled blocks.
+        """
+        self.single_step = single_step
+        # the compiled block that starts at each ROM address, with its
+        # length, or None if execution has not reached the address yet
+        self.__blocks = [None] * ROM_SIZE
+        self.rom = array.array('H', bytes(2 * ROM_SIZE))
+        # a list rather than an array, since reading an array creates a new
+        # integer object every time
+        self.ram = [0] * RAM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        # the number of instructions executed since the last reset
+        self.cycles = 0
+        # the function of each ROM address, or None for A-instructions
+        self.__ops = [None] * ROM_SIZE
+
+    def load_rom(self, words: typing.Iterable[int]) -> None:
+        """Loads a program into the ROM, from address 0, and resets the
+        computer. The rest of the ROM is cleared.
+
+        Args:
+            words (typing.Iterable[int]): the machine words of the program.
+        """
+        words = array.array('H', words)
+        if len(words) > ROM_SIZE:
+            raise ValueError("program has %d words, but the ROM holds %d"
+                             % (len(words), ROM_SIZE))
+        self.rom = words + array.array('H', bytes(2 * (ROM_SIZE - len(words))))
+        self.__ops = [None] * ROM_SIZE
+        for address, word in enumerate(words):
+            if word & SIGN_BIT:
+                self.__ops[address] = CPUEmulator.compile(
+                    word, self.__is_halt(address, word))
+        # the program counter is 15 bits wide, so it wraps around after the
+        # last address
+        self.__ops[-1] = CPUEmulator.compile(self.rom[-1], wrap=True)
+        self.__blocks = [None] * ROM_SIZE
+        self.reset()
+
+    @staticmethod
+    def read_hack(input_file: typing.Iterable[str]) -> typing.List[int]:
+        """
+        Args:
+            input_file (typing.Iterable[str]): a .hack file, or any other
+                iterable of lines with one binary word each.
+
+        Returns:
+            typing.List[int]: the machine words of the program.
+        """
+        return [int(line, 2) for line in map(str.strip, input_file) if line]
+
+    def load_hack(self, input_file: typing.Iterable[str]) -> None:
+        """Loads a .hack program into the ROM and resets the computer.
+
+        Args:
+            input_file (typing.Iterable[str]): a .hack file.
+        """
+        self.load_rom(CPUEmulator.read_hack(input_file))
+
+    def reset(self) -> None:
+        """Restarts the program. As in the hardware, only the program counter
+        is cleared."""
+        self.pc = 0
+        self.cycles = 0
+
+    def set_ram(self, address: int, value: int) -> None:
+        """
+        Args:
+            address (int): a RAM address.
+            value (int): a signed or unsigned 16-bit value.
+        """
+        self.ram[address] = value & WORD_MASK
+
+    def get_ram(self, address: int) -> int:
+        """
+        Args:
+            address (int): a RAM address.
+
+        Returns:
+            int: the value at address, as a signed 16-bit number.
+        """
+        value = self.ram[address]
+        return value - 0x10000 if value & SIGN_BIT else value
+
+    def run(self, cycles: int) -> int:
+        """Executes up to the given number of instructions. Execution stops
+        early when the program reaches the loop that ends Hack programs,
+        an unconditional jump from an address to the one before it, which
+        loads its own address, or an unconditional jump to itself. Nothing
+        in the state of the computer changes once it is in such a loop.
+
+        Args:
+            cycles (int): the maximal number of instructions to execute.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        executed = 0
+        if not self.single_step:
+            executed = self.__run_blocks(cycles)
+        if executed < cycles and not self.halted:
+            # the rest is shorter than the next block
+            executed += self.__step(cycles - executed)
+        return executed
+
+    def __run_blocks(self, cycles: int) -> int:
+        """Executes whole blocks, as long as the longest path through the next
+        block fits in the given number of instructions.
+
+        Args:
+            cycles (int): the maximal number of instructions to execute.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        blocks = self.__blocks
+        ram = self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        try:
+            while True:
+                block = blocks[pc]
+                if block is None:
+                    block = blocks[pc] = self.__compile_block(pc)
+                function, length = block
+                if executed + length > cycles:
+                    break
+                a, d, pc, length = function(a, d, ram)
+                executed += length
+        except Halt:
+            pass
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def __step(self, cycles: int) -> int:
+        """Executes one instruction at a time.
+
+        Args:
+            cycles (int): the maximal number of instructions to execute.
+
+        Returns:
+            int: the number of instructions executed.
+        """
+        ops = self.__ops
+        rom = self.rom
+        ram = self.ram
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        try:
+            for executed in range(cycles):
+                op = ops[pc]
+                if op is None:
+                    a = rom[pc]
+                    pc += 1
+                else:
+                    a, d, pc = op(a, d, pc, ram)
+            else:
+                executed = cycles
+        except Halt:
+            pass
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def step(self) -> None:
+        """Executes exactly one instruction, even in the loop that ends the
+        program."""
+        word = self.rom[self.pc]
+        if is_pure_jump(word):
+            self.pc = self.a & ADDRESS_MASK
+        elif self.pc == ROM_SIZE - 1:
+            self.a, self.d, self.pc = self.__ops[-1](self.a, self.d, self.pc,
+                                                     self.ram)
+        elif not word & SIGN_BIT:
+            self.a = word
+            self.pc += 1
+        else:
+            self.a, self.d, self.pc = CPUEmulator.compile(word)(
+                self.a, self.d, self.pc, self.ram)
+        self.cycles += 1
+
+    def advance(self, cycles: int) -> None:
+        """Executes exactly the given number of instructions, as the clock of
+        the hardware would. Once the program is in a loop that ends it, the
+        rest of the cycles go around the loop.
+
+        Args:
+            cycles (int): the number of instructions to execute.
+        """
+        remaining = cycles - self.run(cycles)
+        # the loops that end programs are one or two instructions long, and
+        # change nothing but the program counter
+        for _ in range(remaining % 2):
+            self.step()
+        self.cycles += remaining - remaining % 2
+
+    @property
+    def halted(self) -> bool:
+        """Is the program in the loop that ends it, or at an unconditional
+        jump to itself?"""
+        return self.__ops[self.pc] is HALT_OP or \
+            (is_pure_jump(self.rom[self.pc]) and self.a & 0x7FFF == self.pc)
+
+    def __is_halt(self, address: int, word: int) -> bool:
+        """
+        Args:
+            address (int): the ROM address of word.
+            word (int): a C-instruction.
+
+        Returns:
+            bool: True if word, with the instruction before it, is a loop
+            that the program never leaves.
+        """
+        return word == HALT_WORD and address > 0 and \
+            self.rom[address - 1] == address - 1
+
+    def __compile_block(self, start: int) -> typing.Tuple[typing.Callable,
+                                                          int]:
+        """Compiles the instructions from start up to the next jump to an
+        address that is not known in advance. A conditional jump returns from
+        the block if it is taken, and otherwise the block goes on after it.
+        An unconditional jump to a constant address is followed, unless the
+        block has already been there. A block also ends before the loop that
+        ends the program, and after MAX_BLOCK instructions.
+
+        Args:
+            start (int): the ROM address of the first instruction.
+
+        Returns:
+            typing.Tuple[typing.Callable, int]: a function from the A and D
+            registers and the RAM to the registers, the program counter and
+            the number of instructions executed by the block, and the number
+            of instructions on the longest path through the block.
+        """
+        if self.__ops[start] is HALT_OP:
+            return HALT_BLOCK, 0
+        lines = ["def block(a, d, ram):"]
+        # the value of A: "a", or a constant while it is known
+        a = "a"
+        address = start
+        length = 0
+        visited = {start}
+        while True:
+            word = self.rom[address]
+            address += 1
+            length += 1
+            next_pc = None
+            if not word & SIGN_BIT:
+                a = str(word)
+            elif is_pure_jump(word) and address - 1 == start:
+                lines.append("    if a & 32767 == %d:" % start)
+                lines.append("        raise Halt()")
+                next_pc = "a & 32767"
+            elif is_pure_jump(word) and a in ("a", str(address - 1)):
+                # leaves the jump to a block of its own, which halts if the
+                # jump is to itself
+                length -= 1
+                if a == "a":
+                    lines.append("    if a & 32767 == %d:" % (address - 1))
+                    lines.append("        return a, d, %d, %d"
+                                 % (address - 1, length))
+                else:
+                    address -= 1
+                    next_pc = str(address)
+                    break
+                a, next_pc = CPUEmulator.__compile_instruction(
+                    word, a, lines, address, length + 1)
+                length += 1
+            else:
+                a, next_pc = CPUEmulator.__compile_instruction(
+                    word, a, lines, address, length)
+            if next_pc is None:
+                if address == ROM_SIZE:
+                    next_pc = "0"
+                elif self.__ops[address] is HALT_OP or length >= MAX_BLOCK:
+                    next_pc = str(address)
+                    break
+                else:
+                    continue
+            if not next_pc.isdigit() or int(next_pc) in visited or \
+                    self.__ops[int(next_pc)] is HALT_OP or \
+                    length >= MAX_BLOCK:
+                break
+            address = int(next_pc)
+            visited.add(address)
+        lines.append("    return %s, d, %s, %d" % (a, next_pc, length))
+        namespace = {'Halt': Halt}
+        exec('\n'.join(lines), namespace)
+        return namespace['block'], length
+
+    @staticmethod
+    def __compile_instruction(word: int, a: str, lines: typing.List[str],
+                              next_address: int, length: int
+                              ) -> typing.Tuple[str, typing.Optional[str]]:
+        """Appends the code of a C-instruction in a block to lines.
+
+        Args:
+            word (int): a C-instruction.
+            a (str): "a", or the value of A as a constant.
+            lines (typing.List[str]): the code of the block so far.
+            next_address (int): the address after the instruction.
+            length (int): the number of instructions in the block up to and
+                including this one.
+
+        Returns:
+            typing.Tuple[str, typing.Optional[str]]: the value of A after the
+            instruction, as a, and if the block ends with it, an expression
+            for the next program counter.
+        """
+        expression, uses_m, dest, jump = CPUEmulator.decode(word)
+        address = "a & 32767" if a == "a" else str(int(a) & ADDRESS_MASK)
+        if uses_m:
+            if expression.count('y') > 1:
+                lines.append("    y = ram[%s]" % address)
+            else:
+                expression = expression.replace('y', 'ram[%s]' % address)
+        else:
+            expression = expression.replace('y', a)
+            if a != "a" and 'd' not in expression:
+                expression = str(eval(expression))
+
+        targets = []
+        if dest & 0b001:
+            targets.append("ram[%s]" % address)
+        if dest & 0b010:
+            targets.append("d")
+        if jump and jump != 0b111:
+            targets.append("out")
+        if dest & 0b100:
+            # the jump below reads A before it changes
+            targets.append("a_out" if jump else "a")
+        if targets:
+            lines.append("    %s = %s" % (" = ".join(targets), expression))
+
+        next_pc = None
+        if jump == 0b111 and not dest & 0b100:
+            next_pc = address
+        elif jump == 0b111:
+            lines.append("    pc = " + address)
+            next_pc = "pc"
+        elif jump and not dest & 0b100:
+            lines.append("    if %s:" % JUMP_CONDITIONS[jump])
+            lines.append("        return %s, d, %s, %d" % (a, address, length))
+        elif jump:
+            lines.append("    pc = %s if %s else %d" % (
+                address, JUMP_CONDITIONS[jump], next_address % ROM_SIZE))
+            next_pc = "pc"
+        if dest & 0b100:
+            if jump:
+                lines.append("    a = a_out")
+            a = "a"
+        return a, next_pc
+
+    @staticmethod
+    def decode(word: int) -> typing.Tuple[str, bool, int, int]:
+        """
+        Args:
+            word (int): a C-instruction.
+
+        Returns:
+            typing.Tuple[str, bool, int, int]: a Python expression over d and
+            y that computes the output of the instruction, whether y is M
+            (otherwise it is A), and the dest and jump bits.
+        """
+        prefix = word >> 13
+        bits = (word >> 6) & 0b111111
+        if prefix == 0b111:
+            expression = alu_expression(bits)
+        elif prefix == 0b101 and bits in SHIFT_EXPRESSIONS:
+            expression = SHIFT_EXPRESSIONS[bits]
+        else:
+            raise ValueError("invalid instruction: %s" % format(word, '016b'))
+        uses_m = bool(word & 0x1000) and 'y' in expression
+        return expression, uses_m, (word >> 3) & 0b111, word & 0b111
+
+    @staticmethod
+    def compile(word: int, halt: bool = False,
+                wrap: bool = False) -> typing.Callable:
+        """
+        Args:
+            word (int): an instruction.
+            halt (bool): if True, word ends the program.
+            wrap (bool): if True, word is at the last ROM address, and the
+                next address is 0. Such functions are not cached.
+
+        Returns:
+            typing.Callable: a function from the A and D registers, the
+            program counter and the RAM to the next values of the registers
+            and the program counter.
+        """
+        if halt:
+            return HALT_OP
+        if not wrap and word in CPUEmulator.compiled:
+            return CPUEmulator.compiled[word]
+        next_pc = "0" if wrap else "pc + 1"
+        if not word & SIGN_BIT:
+            return lambda a, d, pc, ram: (word, d, 0)
+        if is_pure_jump(word) and not wrap:
+            return PURE_JUMP_OP
+
+        expression, uses_m, dest, jump = CPUEmulator.decode(word)
+
+        lines = ["def op(a, d, pc, ram):"]
+        if uses_m:
+            lines.append("    y = ram[a & 32767]")
+        else:
+            expression = expression.replace('y', 'a')
+        lines.append("    out = " + expression)
+        if dest & 0b001:
+            lines.append("    ram[a & 32767] = out")
+        if jump == 0b111:
+            lines.append("    pc = a & 32767")
+        elif jump:
+            lines.append("    pc = a & 32767 if %s else %s"
+                         % (JUMP_CONDITIONS[jump], next_pc))
+        else:
+            lines.append("    pc = " + next_pc)
+        lines.append("    return %s, %s, pc" % ('out' if dest & 0b100 else 'a',
+                                               'out' if dest & 0b010 else 'd'))
+        namespace = {}
+        exec('\n'.join(lines), namespace)
+        if not wrap:
+            CPUEmulator.compiled[word] = namespace['op']
+        return namespace['op']
+
+
+# "0;JMP", which together with an A-instruction that loads its own address is
+# the loop that ends Hack programs
+HALT_WORD = 0b1110101010000111
+
+
+def _halt(a: int, d: int, pc: int, ram: typing.List[int]) -> None:
+    raise Halt()
+
+
+def _halt_block(a: int, d: int, ram: typing.List[int]) -> None:
+    raise Halt()
+
+
+def _pure_jump(a: int, d: int, pc: int, ram: typing.List[int]
+               ) -> typing.Tuple[int, int, int]:
+    if a & 0x7FFF == pc:
+        raise Halt()
+    return a, d, a & 0x7FFF
+
+
+def is_pure_jump(word: int) -> bool:
+    """
+    Args:
+        word (int): an instruction.
+
+    Returns:
+        bool: True if word is an unconditional jump that changes nothing
+        else, such as "0;JMP".
+    """
+    return bool(word & SIGN_BIT) and word & 0b111111 == 0b000111
+
+
+HALT_OP = _halt
+HALT_BLOCK = _halt_block
+PURE_JUMP_OP = _pure_jump
+
+
+if "__main__" == __name__:
+    # Runs a .hack program and prints the RAM words that were asked for.
+    # Usage: CPUEmulator <file.hack> [--cycles N] [--single-step]
+    #        [--set ADDR=VALUE ...] [--print ADDR ...]
+    arg_parser = argparse.ArgumentParser(prog="CPUEmulator")
+    arg_parser.add_argument("program", help="a .hack file")
+    arg_parser.add_argument("--cycles", type=int, default=10000000,
+                            help="the maximal number of instructions to run")
+    arg_parser.add_argument("--set", action="append", default=[],
+                            metavar="ADDR=VALUE",
+                            help="set a RAM word before running")
+    arg_parser.add_argument("--single-step", action="store_true",
+                            help="run one instruction at a time instead of "
+                                 "compiled blocks, to debug the emulator")
+    arg_parser.add_argument("--print", action="append", default=[],
+                            type=int, metavar="ADDR",
+                            help="print a RAM word after running")
+    args = arg_parser.parse_args()
+
+    emulator = CPUEmulator(args.single_step)
+    with open(args.program, 'r') as hack_file:
+        emulator.load_hack(hack_file)
+    for assignment in args.set:
+        address, _, value = assignment.partition("=")
+        emulator.set_ram(int(address), int(value))
+    executed = emulator.run(args.cycles)
+    print("%d instructions%s" % (
+        executed, ", halted" if emulator.halted else ""), file=sys.stderr)
+    for address in args.print:
+        print("RAM[%d] = %d" % (address, emulator.get_ram(address)))
@@ -0,0 +1,238 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import re
+import typing
+
+# comments, which are removed before the chip is split into tokens. They are
+# replaced by their newlines, so that tokens keep their line numbers
+COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# a name, a number, '..' or a single symbol
+TOKEN = re.compile(r'[A-Za-z_][\w.]*|\d+|\.\.|\S')
+
+# the names that stand for constant buses in connections
+CONSTANTS = {"true", "false"}
+
+
+class PinReference(typing.NamedTuple):
+    """A pin, or a range of its bits: name, name[i] or name[i..j]."""
+    name: str
+    # the first and last bit of the range, None for the whole pin
+    start: typing.Optional[int] = None
+    end: typing.Optional[int] = None
+
+
+class Connection(typing.NamedTuple):
+    """A pin=value connection of a part."""
+    # the pin of the part
+    pin: PinReference
+    # the pin of the chip, internal pin or constant that it is connected to
+    value: PinReference
+
+
+class Part(typing.NamedTuple):
+    """A part of a chip, such as Not(in=a, out=b)."""
+    name: str
+    connections: typing.List[Connection]
+    # the number of the line that the part is on, for error messages
+    line: int
+
+
+class ChipDefinition(typing.NamedTuple):
+    """The contents of an .hdl file."""
+    name: str
+    # pin name -> width, in the order they are declared
+    inputs: typing.Dict[str, int]
+    outputs: typing.Dict[str, int]
+    parts: typing.List[Part]
+    # the built-in chip that implements this one, for BUILTIN chips
+    builtin: typing.Optional[str] = None
+
+
+class HDLParser:
+    """Parses the .hdl files of the course into chip definitions."""
+
+    def __init__(self, text: str, filename: str = "<hdl>") -> None:
+        """Splits the text into tokens.
+
+        Args:
+            text (str): the contents of an .hdl file.
+            filename (str): the name of the file, for error messages.
+        """
+        self.filename = filename
+        text = COMMENT.sub(lambda comment: "\n" * comment.group().count("\n"),
+                           text)
+        self.tokens = []
+        line = 1
+        position = 0
+        for match in TOKEN.finditer(text):
+            line += text.count("\n", position, match.start())
+            position = match.start()
+            self.tokens.append((match.group(), line))
+        self.position = 0
+
+    @staticmethod
+    def parse_file(path: str) -> ChipDefinition:
+        """
+        Args:
+            path (str): an .hdl file.
+
+        Returns:
+            ChipDefinition: the chip it defines.
+        """
+        with open(path, 'r') as input_file:
+            return HDLParser(input_file.read(), path).parse()
+
+    def parse(self) -> ChipDefinition:
+        """
+        Returns:
+            ChipDefinition: the chip that the text defines.
+        """
+        self.expect("CHIP")
+        name = self.advance()
+        self.expect("{")
+        inputs, outputs, parts, builtin = {}, {}, [], None
+        while self.peek() != "}":
+            section = self.advance()
+            if section == "IN":
+                inputs.update(self.parse_pins())
+            elif section == "OUT":
+                outputs.update(self.parse_pins())
+            elif section == "PARTS":
+                self.expect(":")
+                while self.peek() not in ("}", "BUILTIN", "CLOCKED"):
+                    parts.append(self.parse_part())
+            elif section == "BUILTIN":
+                builtin = self.advance()
+                self.expect(";")
+            elif section == "CLOCKED":
+                # built-in chips already know which of their pins are clocked
+                self.parse_pins()
+            else:
+                self.error("unexpected '%s'" % section)
+        self.expect("}")
+        if self.position != len(self.tokens):
+            self.error("unexpected '%s' after the chip" % self.peek())
+        return ChipDefinition(name, inputs, outputs, parts, builtin)
+
+    def parse_pins(self) -> typing.Dict[str, int]:
+        """
+        Returns:
+            typing.Dict[str, int]: the pins of an IN, OUT or CLOCKED list,
+            and their widths.
+        """
+        pins = {}
+        while True:
+            name = self.advance()
+            width = 1
+            if self.peek() == "[":
+                self.advance()
+                width = self.parse_number()
+                self.expect("]")
+            pins[name] = width
+            if self.advance() == ";":
+                return pins
+            self.previous(",")
+
+    def parse_part(self) -> Part:
+        """
+        Returns:
+            Part: the next part of the PARTS list.
+        """
+        name = self.advance()
+        line = self.tokens[self.position - 1][1]
+        self.expect("(")
+        connections = []
+        while True:
+            pin = self.parse_reference()
+            self.expect("=")
+            connections.append(Connection(pin, self.parse_reference()))
+            if self.advance() == ")":
+                break
+            self.previous(",")
+        self.expect(";")
+        return Part(name, connections, line)
+
+    def parse_reference(self) -> PinReference:
+        """
+        Returns:
+            PinReference: the next name, name[i] or name[i..j].
+        """
+        name = self.advance()
+        if self.peek() != "[":
+            return PinReference(name)
+        self.advance()
+        start = end = self.parse_number()
+        if self.peek() == "..":
+            self.advance()
+            end = self.parse_number()
+        self.expect("]")
+        if end < start:
+            self.error("invalid range %s[%d..%d]" % (name, start, end))
+        return PinReference(name, start, end)
+
+    def parse_number(self) -> int:
+        """
+        Returns:
+            int: the next token, which must be a number.
+        """
+        token = self.advance()
+        if not token.isdigit():
+            self.error("expected a number, got '%s'" % token)
+        return int(token)
+
+    def peek(self) -> typing.Optional[str]:
+        """
+        Returns:
+            typing.Optional[str]: the next token, or None at the end.
+        """
+        if self.position == len(self.tokens):
+            return None
+        return self.tokens[self.position][0]
+
+    def advance(self) -> str:
+        """
+        Returns:
+            str: the next token, which is consumed.
+        """
+        if self.position == len(self.tokens):
+            self.error("unexpected end of file")
+        self.position += 1
+        return self.tokens[self.position - 1][0]
+
+    def expect(self, token: str) -> None:
+        """Consumes the next token, which must be the given one.
+
+        Args:
+            token (str): the expected token.
+        """
+        if self.advance() != token:
+            self.position -= 1
+            self.error("expected '%s', got '%s'" % (token, self.peek()))
+
+    def previous(self, token: str) -> None:
+        """Checks that the token that was just consumed is the given one.
+
+        Args:
+            token (str): the expected token.
+        """
+        if self.tokens[self.position - 1][0] != token:
+            self.position -= 1
+            self.error("expected '%s', got '%s'" % (token, self.peek()))
+
+    def error(self, message: str) -> typing.NoReturn:
+        """
+        Args:
+            message (str): what is wrong at the current token.
+
+        Raises:
+            ValueError: always, with the file and line of the token.
+        """
+        index = min(self.position, len(self.tokens) - 1)
+        line = self.tokens[index][1] if self.tokens else 1
+        raise ValueError("%s:%d: %s" % (self.filename, line, message))
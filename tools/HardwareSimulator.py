@@ -0,0 +1,613 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import re
+import string
+import typing
+
+from Netlist import BuiltinChip, Netlist, Node
+
+# a variable of the simulator: a pin, or the state of a built-in part, such
+# as RAM16K[3] or ARegister[]
+VARIABLE = re.compile(r'^(?P<name>[^\[]+)(?:\[(?P<index>\d*)\])?$')
+
+# the local variables of the generated code
+LOCAL = re.compile(r'\bn\d+\b')
+
+# the template of the generated code, which evaluates the chip, runs whole
+# clock cycles, and then evaluates it again. The code of the chip appears
+# once, as large chips make millions of lines. Pins, registers and memories
+# are bound as default arguments, which are faster to read than globals
+FUNCTION = string.Template('''\
+def run(cycles, tick, $arguments):
+$load_pins
+    while True:
+$load_registers
+$body
+        if not cycles:
+            break
+        cycles -= 1
+$latch
+        latched[:] = registers
+$store
+    if tick:
+$latch
+''')
+
+
+class Names(dict):
+    """Values for the code of built-in chips, where the names of outputs and
+    temporaries that have no value yet stand for themselves.
+    """
+
+    def __missing__(self, key: str) -> str:
+        return key
+
+
+class HardwareSimulator:
+    """Simulates a chip by compiling its netlist into straight-line Python.
+
+    The built-in chips of the netlist are sorted so that every one comes
+    after the chips it depends on, and each becomes a few lines of integer
+    operations on whole buses. Registers hold two values: the one they
+    latched when the clock went up, which is what peeking at them shows,
+    and the one on their output, which changes when the clock goes down.
+    Memories are written when the clock goes up.
+    """
+
+    def __init__(self, hdl_path: str,
+                 path: typing.Optional[typing.List[str]] = None) -> None:
+        """Flattens and compiles a chip.
+
+        Args:
+            hdl_path (str): the .hdl file of the chip.
+            path (typing.Optional[typing.List[str]]): the directories where
+                the .hdl files of parts are searched for, see Netlist.
+        """
+        self.netlist = Netlist(hdl_path, path)
+        self.widths = {name: self.netlist.widths[net] for name, net in dict(
+            self.netlist.inputs, **self.netlist.outputs).items()}
+        self.pin_index = {name: index for index, name in
+                          enumerate(self.widths)}
+        self.pins = [0] * len(self.widths)
+        # built-in part -> its index in registers or memories
+        self.state_index = {}
+        self.memories = []
+        num_registers = 0
+        for index, node in enumerate(self.netlist.nodes):
+            chip = self.netlist.definition(node.chip)
+            if chip.kind == "register":
+                self.state_index[index] = num_registers
+                num_registers += 1
+            elif chip.kind == "memory":
+                self.state_index[index] = len(self.memories)
+                self.memories.append([0] * chip.size)
+        self.registers = [0] * num_registers
+        self.latched = [0] * num_registers
+
+        self.__variable_count = 0
+        self.__lines = []
+        self.__loads = []
+        self.__values = {}
+        self.__expressions = {}
+        self.__common = {}
+        # variable -> the variable it is the negation of, for 1-bit values
+        self.__negations = {}
+        # variable -> the two values it is the NAND of
+        self.__nands = {}
+        self.source = self.__generate()
+        namespace = {"pins": self.pins, "registers": self.registers,
+                     "latched": self.latched}
+        namespace.update(("m%d" % index, memory)
+                         for index, memory in enumerate(self.memories))
+        exec(compile(self.source, "<%s>" % self.netlist.name, "exec"),
+             namespace)
+        self.__run = namespace["run"]
+
+    def eval(self) -> None:
+        """Propagates the inputs of the chip to its outputs."""
+        self.__run(0, False)
+
+    def tick(self) -> None:
+        """The first half of a clock cycle: registers latch their inputs and
+        memories are written.
+        """
+        self.__run(0, True)
+
+    def tock(self) -> None:
+        """The second half of a clock cycle: registers output the values they
+        latched.
+        """
+        self.latched[:] = self.registers
+        self.__run(0, False)
+
+    def ticktock(self, cycles: int = 1) -> None:
+        """Runs whole clock cycles, as tick and tock would, in a single call
+        to the compiled code.
+
+        Args:
+            cycles (int): the number of cycles.
+        """
+        self.__run(cycles, False)
+
+    def get(self, variable: str) -> int:
+        """
+        Args:
+            variable (str): a pin of the chip, or a built-in part and an
+                index, such as RAM16K[3], or DRegister[] for registers.
+
+        Returns:
+            int: its value, as an unsigned number.
+        """
+        if variable in self.pin_index:
+            return self.pins[self.pin_index[variable]]
+        node, index = self.__find(variable)
+        if self.netlist.definition(node.chip).kind == "register":
+            return self.registers[index]
+        return self.memories[index][self.__address(variable)]
+
+    def set(self, variable: str, value: int) -> None:
+        """
+        Args:
+            variable (str): an input pin of the chip, or a built-in part and
+                an index, as in get().
+            value (int): its new value, which is cut to the width of the
+                variable. The chip is not evaluated.
+        """
+        if variable in self.pin_index:
+            if variable not in self.netlist.inputs:
+                raise ValueError("%s is not an input pin" % variable)
+            self.pins[self.pin_index[variable]] = value & (
+                (1 << self.widths[variable]) - 1)
+            return
+        node, index = self.__find(variable)
+        chip = self.netlist.definition(node.chip)
+        value &= (1 << chip.outputs["out"]) - 1
+        if chip.kind == "register":
+            self.registers[index] = self.latched[index] = value
+        else:
+            self.memories[index][self.__address(variable)] = value
+
+    def load(self, part: str, words: typing.Iterable[int]) -> None:
+        """Fills a built-in memory, such as ROM32K, and clears the rest of it.
+
+        Args:
+            part (str): the name of the memory.
+            words (typing.Iterable[int]): its new contents, from address 0.
+        """
+        node, index = self.__find(part)
+        if self.netlist.definition(node.chip).kind != "memory":
+            raise ValueError("%s is not a memory" % part)
+        memory = self.memories[index]
+        words = list(words)
+        if len(words) > len(memory):
+            raise ValueError("%d words do not fit in %s" % (len(words),
+                                                            part))
+        memory[:] = words + [0] * (len(memory) - len(words))
+
+    def __find(self, variable: str) -> typing.Tuple[Node, int]:
+        """
+        Args:
+            variable (str): a part, possibly with an index. A part that was
+                flattened stands for the register or memory it holds, such
+                as the Register of a PC that was built from its parts.
+
+        Returns:
+            typing.Tuple[Node, int]: the first built-in part with that name,
+            or else the one built-in part inside a part with that name, and
+            its index in registers or in memories.
+
+        Raises:
+            ValueError: if there is no such part, or if a flattened part has
+                more than one register or memory, which it cannot stand for.
+        """
+        match = VARIABLE.match(variable)
+        name = match.group("name") if match else variable
+        inside = []
+        for node_index, state_index in self.state_index.items():
+            node = self.netlist.nodes[node_index]
+            if node.chip == name:
+                return node, state_index
+            if name in node.path.split("/"):
+                inside.append((node, state_index))
+        if len(inside) > 1:
+            raise ValueError("%s holds more than one register or memory: %s"
+                             % (name, ", ".join(sorted({
+                                 node.path for node, _ in inside}))))
+        if not inside:
+            raise ValueError("unknown variable: %s" % variable)
+        return inside[0]
+
+    def __address(self, variable: str) -> int:
+        """
+        Args:
+            variable (str): a memory and an index, such as RAM16K[3].
+
+        Returns:
+            int: the index, which must be within the memory.
+        """
+        _, index = self.__find(variable)
+        address = VARIABLE.match(variable).group("index")
+        if not address:
+            return 0
+        if int(address) >= len(self.memories[index]):
+            raise ValueError("%s is out of range" % variable)
+        return int(address)
+
+    def __generate(self) -> str:
+        """
+        Returns:
+            str: the source code of run().
+        """
+        netlist = self.netlist
+        for node_index in self.__order():
+            self.__emit(node_index)
+        store = ["pins[%d] = %s" % (self.pin_index[name], self.__value(net))
+                 for name, net in netlist.outputs.items()]
+        latch = []
+        for node_index, index in self.state_index.items():
+            latch.extend(self.__latch(netlist.nodes[node_index], index))
+
+        # outputs that are not connected, and the negations that the rules of
+        # __nand and __not made redundant, are not read by anything
+        live = set(LOCAL.findall("\n".join(store + latch)))
+        body = []
+        for line in reversed(self.__lines):
+            target, expression = line.split(" = ", 1)
+            if target in live:
+                live.update(LOCAL.findall(expression))
+                body.append(line)
+        body.reverse()
+        loads = [line for line in self.__loads
+                 if line.split(" = ", 1)[0] in live]
+
+        arguments = ", ".join(["pins=pins", "registers=registers",
+                               "latched=latched"] + [
+            "m%d=m%d" % (index, index) for index in range(len(self.memories))
+        ])
+        return FUNCTION.substitute(
+            arguments=arguments,
+            load_pins=self.__indent([line for line in loads
+                                     if "pins" in line], 1),
+            load_registers=self.__indent([line for line in loads
+                                          if "latched" in line], 2),
+            body=self.__indent(body, 2), store=self.__indent(store, 1),
+            latch=self.__indent(latch, 2))
+
+    @staticmethod
+    def __indent(lines: typing.List[str], depth: int) -> str:
+        """
+        Args:
+            lines (typing.List[str]): lines of code.
+            depth (int): the number of levels to indent them by.
+
+        Returns:
+            str: the indented lines, or 'pass' if there are none.
+        """
+        return "\n".join("    " * depth + line for line in lines or ["pass"])
+
+    def __order(self) -> typing.List[int]:
+        """
+        Returns:
+            typing.List[int]: the built-in parts that the outputs and the
+            clocked parts need, each after the parts that its value depends
+            on in the same clock cycle.
+        """
+        netlist = self.netlist
+        sources = {}
+
+        def net_sources(net: int) -> typing.Set[int]:
+            # the built-in parts that drive bits of a net
+            if net not in sources:
+                if net in netlist.drivers:
+                    sources[net] = {netlist.drivers[net][0]}
+                elif netlist.pieces[net] is None:
+                    sources[net] = set()
+                else:
+                    sources[net] = set().union(*(
+                        net_sources(piece.net) for piece in
+                        netlist.pieces[net] if piece.net is not None))
+            return sources[net]
+
+        def dependencies(node_index: int) -> typing.List[int]:
+            # registers only depend on their inputs when the clock goes up,
+            # and memories read the word at their address
+            node = netlist.nodes[node_index]
+            kind = netlist.definition(node.chip).kind
+            if kind == "register":
+                return []
+            pins = node.inputs if kind == "gate" else {
+                pin: net for pin, net in node.inputs.items()
+                if pin == "address"}
+            return sorted(set().union(*(net_sources(net)
+                                        for net in pins.values())))
+
+        roots = set()
+        for net in netlist.outputs.values():
+            roots.update(net_sources(net))
+        for node_index in self.state_index:
+            roots.add(node_index)
+            for net in netlist.nodes[node_index].inputs.values():
+                roots.update(net_sources(net))
+
+        # an iterative depth-first search, as the deepest chains of gates
+        # are longer than Python's recursion limit
+        order = []
+        visited = {}
+        for root in sorted(roots):
+            if root in visited:
+                continue
+            visited[root] = False
+            stack = [(root, iter(dependencies(root)))]
+            while stack:
+                node_index, remaining = stack[-1]
+                for dependency in remaining:
+                    if dependency not in visited:
+                        visited[dependency] = False
+                        stack.append((dependency,
+                                      iter(dependencies(dependency))))
+                        break
+                    if not visited[dependency]:
+                        raise ValueError("%s has a combinational loop "
+                                         "through %s" % (
+                                             netlist.name, netlist.nodes[
+                                                 dependency].path))
+                else:
+                    stack.pop()
+                    visited[node_index] = True
+                    order.append(node_index)
+        return order
+
+    def __variable(self) -> str:
+        """
+        Returns:
+            str: a new local variable of the generated code.
+        """
+        self.__variable_count += 1
+        return "n%d" % self.__variable_count
+
+    def __assign(self, expression: str) -> str:
+        """
+        Args:
+            expression (str): an expression of the generated code.
+
+        Returns:
+            str: a variable that holds the expression. An expression that
+            was already assigned reuses its variable, as nothing is written
+            while the chip is evaluated.
+        """
+        if expression not in self.__expressions:
+            variable = self.__variable()
+            self.__lines.append("%s = %s" % (variable, expression))
+            self.__expressions[expression] = variable
+        return self.__expressions[expression]
+
+    def __value(self, net: int) -> typing.Union[int, str]:
+        """
+        Args:
+            net (int): a net whose drivers were already emitted.
+
+        Returns:
+            typing.Union[int, str]: the constant value of the net, or the
+            variable that holds it.
+        """
+        if net in self.__values:
+            return self.__values[net]
+        netlist = self.netlist
+        pieces = netlist.pieces[net]
+        if pieces is None:
+            # an input of the chip, as the outputs of parts are emitted
+            # before they are read
+            variable = self.__variable()
+            self.__loads.append("%s = pins[%d]" % (
+                variable, self.pin_index[next(
+                    name for name, input_net in netlist.inputs.items()
+                    if input_net == net)]))
+            self.__values[net] = variable
+            return variable
+
+        constant = 0
+        terms = []
+        for piece in pieces:
+            mask = (1 << piece.width) - 1
+            if piece.net is None:
+                constant |= piece.value << piece.start
+                continue
+            source = self.__value(piece.net)
+            if isinstance(source, int):
+                constant |= (source >> piece.shift & mask) << piece.start
+                continue
+            term = source
+            if piece.shift:
+                term = "%s >> %d" % (term, piece.shift)
+            if netlist.widths[piece.net] - piece.shift > piece.width:
+                term = "%s & %d" % (term, mask)
+            if piece.start:
+                term = "(%s) << %d" % (term, piece.start)
+            terms.append(term)
+        if not terms:
+            value = constant
+        elif len(terms) == 1 and not constant and LOCAL.fullmatch(terms[0]):
+            value = terms[0]
+        else:
+            value = self.__assign(" | ".join(
+                terms + ([str(constant)] if constant else [])))
+        self.__values[net] = value
+        return value
+
+    def __emit(self, node_index: int) -> None:
+        """Generates the code of a built-in part, once its inputs are known.
+
+        Args:
+            node_index (int): the part.
+        """
+        node = self.netlist.nodes[node_index]
+        chip = self.netlist.definition(node.chip)
+        if chip.kind == "register":
+            variable = self.__variable()
+            self.__loads.append("%s = latched[%d]" % (
+                variable, self.state_index[node_index]))
+            self.__values[node.outputs["out"]] = variable
+            return
+        if chip.kind == "memory":
+            address = self.__value(node.inputs["address"]) \
+                if "address" in node.inputs else 0
+            self.__values[node.outputs["out"]] = self.__assign("m%d[%s]" % (
+                self.state_index[node_index], address))
+            return
+
+        inputs = tuple((pin, self.__value(net))
+                       for pin, net in node.inputs.items())
+        key = (node.chip, inputs)
+        if key not in self.__common:
+            values = dict(inputs)
+            if all(isinstance(value, int) for value in values.values()):
+                # a part whose inputs are all constant is computed now
+                namespace = {}
+                exec("\n".join(line.format_map(Names(values))
+                               for line in chip.code), namespace)
+                outputs = {pin: namespace[pin] for pin in chip.outputs}
+            elif node.chip in ("Nand", "Not"):
+                outputs = {"out": self.__nand(
+                    values["a"], values["b"]) if node.chip == "Nand" else
+                    self.__not(values["in"])}
+            else:
+                outputs = self.__template(chip, values)
+            self.__common[key] = outputs
+        for pin, net in node.outputs.items():
+            self.__values[net] = self.__common[key][pin]
+
+    def __template(self, chip: BuiltinChip, values: typing.Dict[str, typing.Union[
+            int, str]]) -> typing.Dict[str, str]:
+        """
+        Args:
+            chip (BuiltinChip): a combinational built-in chip.
+            values (typing.Dict[str, typing.Union[int, str]]): its inputs.
+
+        Returns:
+            typing.Dict[str, str]: the variables of its outputs, after the
+            code of the chip was generated.
+        """
+        names = dict(values)
+        for line in chip.code:
+            target = line.split(" = ", 1)[0][1:-1]
+            expression = line.split(" = ", 1)[1].format_map(names)
+            names[target] = self.__assign(expression)
+        return {pin: names[pin] for pin in chip.outputs}
+
+    def __not(self, value: typing.Union[int, str]) -> typing.Union[int, str]:
+        """
+        Args:
+            value (typing.Union[int, str]): a 1-bit value.
+
+        Returns:
+            typing.Union[int, str]: its negation. The negation of a negation
+            is the original value, and the negation of a NAND is an AND.
+        """
+        if isinstance(value, int):
+            return 1 ^ value
+        if value in self.__negations:
+            return self.__negations[value]
+        if value in self.__nands:
+            variable = self.__assign("%s & %s" % self.__nands[value])
+        else:
+            variable = self.__assign("1 ^ %s" % value)
+        self.__negations[variable] = value
+        self.__negations[value] = variable
+        return variable
+
+    def __nand(self, a: typing.Union[int, str],
+               b: typing.Union[int, str]) -> typing.Union[int, str]:
+        """
+        Args:
+            a (typing.Union[int, str]): a 1-bit value.
+            b (typing.Union[int, str]): a 1-bit value.
+
+        Returns:
+            typing.Union[int, str]: their NAND. Constant inputs and equal
+            inputs turn it into a negation, and the NAND of two negations is
+            an OR.
+        """
+        if a == 0 or b == 0:
+            return 1
+        if a == 1 or a == b:
+            return self.__not(b)
+        if b == 1:
+            return self.__not(a)
+        if a in self.__negations and b in self.__negations:
+            return self.__assign("%s | %s" % (self.__negations[a],
+                                              self.__negations[b]))
+        variable = self.__assign("1 ^ (%s & %s)" % (a, b))
+        self.__nands[variable] = (a, b)
+        return variable
+
+    def __latch(self, node: Node, index: int) -> typing.List[str]:
+        """
+        Args:
+            node (Node): a register or a memory.
+            index (int): its index in registers or memories.
+
+        Returns:
+            typing.List[str]: the code that runs when the clock goes up.
+        """
+        chip = self.netlist.definition(node.chip)
+        values = {pin: self.__value(net) for pin, net in node.inputs.items()}
+        if chip.kind == "register":
+            values["state"] = "registers[%d]" % index
+            return ["registers[%d] = %s" % (index,
+                                            chip.code[0].format(**values))]
+        if values.get("load", 0) == 0:
+            return []
+        write = "m%d[%s] = %s" % (index, values["address"], values["in"])
+        if values["load"] == 1:
+            return [write]
+        return ["if %s:" % values["load"], "    " + write]
+
+
+if "__main__" == __name__:
+    # Evaluates a chip for the given inputs, or runs it for a number of
+    # clock cycles, and prints its outputs or the given variables.
+    # Usage: 'HardwareSimulator <file.hdl> [--path DIR]... [--rom FILE]
+    # [--set NAME=VALUE]... [--cycles N] [--print NAME]... [--source]'
+    # imported here, as the test runner imports this module
+    from TestRunner import read_program
+
+    arg_parser = argparse.ArgumentParser(prog="HardwareSimulator")
+    arg_parser.add_argument("chip", help="the .hdl file of the chip")
+    arg_parser.add_argument(
+        "--path", action="append", metavar="DIR",
+        help="search DIR for the .hdl files of parts, in the order given, "
+             "instead of the directory of the chip alone")
+    arg_parser.add_argument("--rom", metavar="FILE",
+                            help="load a .hack or .asm program into ROM32K")
+    arg_parser.add_argument("--set", action="append", default=[],
+                            metavar="NAME=VALUE",
+                            help="set a pin or a part, such as RAM16K[0]=5")
+    arg_parser.add_argument("--cycles", type=int, default=0,
+                            help="run this many clock cycles")
+    arg_parser.add_argument("--print", action="append", default=None,
+                            metavar="NAME", dest="names",
+                            help="print this variable instead of the "
+                                 "outputs of the chip")
+    arg_parser.add_argument("--source", action="store_true",
+                            help="print the generated code")
+    args = arg_parser.parse_args()
+
+    simulator = HardwareSimulator(args.chip, args.path)
+    if args.source:
+        print(simulator.source)
+    if args.rom:
+        simulator.load("ROM32K", read_program(args.rom))
+    for assignment in args.set:
+        name, value = assignment.split("=")
+        simulator.set(name, int(value, 0))
+    simulator.eval()
+    if args.cycles:
+        simulator.ticktock(args.cycles)
+    for name in args.names or simulator.netlist.outputs:
+        print("%s = %d" % (name, simulator.get(name)))
@@ -0,0 +1,675 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import typing
+
+from HDLParser import CONSTANTS, ChipDefinition, HDLParser, Part, \
+    PinReference
+
+
+class BuiltinChip(typing.NamedTuple):
+    """A chip that is simulated directly rather than from its parts, as the
+    built-in chips of the course's simulator are.
+    """
+    inputs: typing.Dict[str, int]
+    outputs: typing.Dict[str, int]
+    # "gate", which is combinational, "register", whose output changes
+    # when the clock goes down, or "memory", whose output is the word at
+    # its address and which is written when the clock goes up
+    kind: str
+    # for gates, lines that set the outputs from the inputs. For registers,
+    # the next value, given the inputs and the current {state}. Names that
+    # start with '_' are temporaries
+    code: typing.Tuple[str, ...] = ()
+    # the number of words of a memory
+    size: int = 0
+
+
+def _gate(inputs: typing.Dict[str, int], outputs: typing.Dict[str, int],
+          *code: str) -> BuiltinChip:
+    """
+    Args:
+        inputs (typing.Dict[str, int]): the input pins and their widths.
+        outputs (typing.Dict[str, int]): the output pins and their widths.
+        code (str): lines that set the outputs.
+
+    Returns:
+        BuiltinChip: a combinational chip.
+    """
+    return BuiltinChip(inputs, outputs, "gate", code)
+
+
+def _register(inputs: typing.Dict[str, int], width: int,
+              next_value: str) -> BuiltinChip:
+    """
+    Args:
+        inputs (typing.Dict[str, int]): the input pins and their widths.
+        width (int): the width of the out pin.
+        next_value (str): the value that is latched when the clock goes up.
+
+    Returns:
+        BuiltinChip: a register.
+    """
+    return BuiltinChip(inputs, {"out": width}, "register", (next_value,))
+
+
+def _ram(address_width: int, width: int = 16) -> BuiltinChip:
+    """
+    Args:
+        address_width (int): the width of the address pin.
+        width (int): the width of the words.
+
+    Returns:
+        BuiltinChip: a memory, with in, load and address pins.
+    """
+    return BuiltinChip({"in": width, "load": 1, "address": address_width},
+                       {"out": width}, "memory", size=1 << address_width)
+
+
+# the next value of a register that loads its input when load is set
+LOAD = "{in} if {load} else {state}"
+
+
+BUS = {"a": 16, "b": 16}
+WAYS_4 = dict.fromkeys("abcd", 16)
+WAYS_8 = dict.fromkeys("abcdefgh", 16)
+
+BUILTIN_CHIPS = {
+    "Nand": _gate({"a": 1, "b": 1}, {"out": 1}, "{out} = 1 ^ ({a} & {b})"),
+    "Not": _gate({"in": 1}, {"out": 1}, "{out} = 1 ^ {in}"),
+    "And": _gate({"a": 1, "b": 1}, {"out": 1}, "{out} = {a} & {b}"),
+    "Or": _gate({"a": 1, "b": 1}, {"out": 1}, "{out} = {a} | {b}"),
+    "Xor": _gate({"a": 1, "b": 1}, {"out": 1}, "{out} = {a} ^ {b}"),
+    "Mux": _gate({"a": 1, "b": 1, "sel": 1}, {"out": 1},
+                 "{out} = {b} if {sel} else {a}"),
+    "DMux": _gate({"in": 1, "sel": 1}, {"a": 1, "b": 1},
+                  "{a} = 0 if {sel} else {in}", "{b} = {in} if {sel} else 0"),
+    "DMux4Way": _gate({"in": 1, "sel": 2}, dict.fromkeys("abcd", 1), *(
+        "{%s} = {in} if {sel} == %d else 0" % (way, index)
+        for index, way in enumerate("abcd"))),
+    "DMux8Way": _gate({"in": 1, "sel": 3}, dict.fromkeys("abcdefgh", 1), *(
+        "{%s} = {in} if {sel} == %d else 0" % (way, index)
+        for index, way in enumerate("abcdefgh"))),
+    "Not16": _gate({"in": 16}, {"out": 16}, "{out} = {in} ^ 0xFFFF"),
+    "And16": _gate(BUS, {"out": 16}, "{out} = {a} & {b}"),
+    "Or16": _gate(BUS, {"out": 16}, "{out} = {a} | {b}"),
+    "Mux16": _gate(dict(BUS, sel=1), {"out": 16},
+                   "{out} = {b} if {sel} else {a}"),
+    "Or8Way": _gate({"in": 8}, {"out": 1}, "{out} = 1 if {in} else 0"),
+    "Mux4Way16": _gate(dict(WAYS_4, sel=2), {"out": 16},
+                       "{out} = ({a}, {b}, {c}, {d})[{sel}]"),
+    "Mux8Way16": _gate(dict(WAYS_8, sel=3), {"out": 16},
+                       "{out} = ({a}, {b}, {c}, {d}, {e}, {f}, {g}, {h})"
+                       "[{sel}]"),
+    "HalfAdder": _gate({"a": 1, "b": 1}, {"sum": 1, "carry": 1},
+                       "{sum} = {a} ^ {b}", "{carry} = {a} & {b}"),
+    "FullAdder": _gate({"a": 1, "b": 1, "c": 1}, {"sum": 1, "carry": 1},
+                       "{sum} = {a} ^ {b} ^ {c}",
+                       "{carry} = ({a} + {b} + {c}) >> 1"),
+    "Add16": _gate(BUS, {"out": 16}, "{out} = ({a} + {b}) & 0xFFFF"),
+    "Inc16": _gate({"in": 16}, {"out": 16}, "{out} = ({in} + 1) & 0xFFFF"),
+    "ShiftLeft": _gate({"in": 16}, {"out": 16}, "{out} = {in} << 1 & 0xFFFF"),
+    "ShiftRight": _gate({"in": 16}, {"out": 16},
+                        "{out} = {in} >> 1 | {in} & 0x8000"),
+    # zx and nx zero and negate x as x & (zx - 1) ^ -nx & 0xFFFF, and
+    # likewise for y and no
+    "ALU": _gate(dict({"x": 16, "y": 16}, **dict.fromkeys(
+        ("zx", "nx", "zy", "ny", "f", "no"), 1)),
+        {"out": 16, "zr": 1, "ng": 1},
+        "{_x} = {x} & ({zx} - 1) ^ -{nx} & 0xFFFF",
+        "{_y} = {y} & ({zy} - 1) ^ -{ny} & 0xFFFF",
+        "{out} = (({_x} + {_y}) & 0xFFFF if {f} else {_x} & {_y}) ^ "
+        "-{no} & 0xFFFF",
+        "{zr} = 0 if {out} else 1",
+        "{ng} = {out} >> 15"),
+    "DFF": _register({"in": 1}, 1, "{in}"),
+    "Bit": _register({"in": 1, "load": 1}, 1, LOAD),
+    "Register": _register({"in": 16, "load": 1}, 16, LOAD),
+    "ARegister": _register({"in": 16, "load": 1}, 16, LOAD),
+    "DRegister": _register({"in": 16, "load": 1}, 16, LOAD),
+    "PC": _register({"in": 16, "load": 1, "inc": 1, "reset": 1}, 16,
+                    "0 if {reset} else {in} if {load} else "
+                    "({state} + 1) & 0xFFFF if {inc} else {state}"),
+    "RAM8": _ram(3),
+    "RAM64": _ram(6),
+    "RAM512": _ram(9),
+    "RAM4K": _ram(12),
+    "RAM16K": _ram(14),
+    "Screen": _ram(13),
+    "ROM32K": BuiltinChip({"address": 15}, {"out": 16}, "memory",
+                          size=1 << 15),
+    "Keyboard": BuiltinChip({}, {"out": 16}, "memory", size=1),
+}
+
+# the chips that send the load bit of a bank of registers or memories to one
+# of them, and the ones that select the output of one of them, with the
+# pins of the banks in the order of their select bits
+DECODERS = {"DMux": ("a", "b"), "DMux4Way": tuple("abcd"),
+            "DMux8Way": tuple("abcdefgh")}
+SELECTORS = {"Mux16": ("a", "b"), "Mux4Way16": tuple("abcd"),
+             "Mux8Way16": tuple("abcdefgh")}
+
+
+class Node(typing.NamedTuple):
+    """A built-in chip of the flattened netlist."""
+    # the name of the chip, which is built in, or only stores words, see
+    # Netlist.storage()
+    chip: str
+    # the parts that lead to it from the top chip, such as CPU/ARegister
+    path: str
+    # pin -> net
+    inputs: typing.Dict[str, int]
+    outputs: typing.Dict[str, int]
+
+
+class Piece(typing.NamedTuple):
+    """Bits of a net that are connected to bits of another net, or to a
+    constant.
+    """
+    # the first bit of the piece in the net it belongs to
+    start: int
+    width: int
+    # the net that drives the piece, from bit 'shift' up, or None for the
+    # constant 'value'
+    net: typing.Optional[int]
+    shift: int = 0
+    value: int = 0
+
+
+class Netlist:
+    """A chip, flattened to the built-in chips it is made of. Every pin of
+    every part becomes a net, whose bits are either driven by the output of
+    a built-in chip, or connected to bits of other nets. Parts that only
+    store words, such as RAM4K, become a single register or memory rather
+    than thousands of gates, see storage().
+    """
+
+    def __init__(self, hdl_path: str,
+                 path: typing.Optional[typing.List[str]] = None) -> None:
+        """Flattens a chip.
+
+        Args:
+            hdl_path (str): the .hdl file of the chip.
+            path (typing.Optional[typing.List[str]]): the directories where
+                the .hdl files of parts are searched for, in order. A part
+                that is not found in them is a built-in chip. By default,
+                only the directory of the chip is searched, as in the
+                simulator of the course.
+        """
+        if path is None:
+            path = [os.path.dirname(os.path.abspath(hdl_path))]
+        self.path = path
+        self.widths = []
+        # net -> the pieces that connect its bits, or None for nets that are
+        # driven by a built-in chip or are inputs of the top chip
+        self.pieces = []
+        # net -> the node and output pin that drive it
+        self.drivers = {}
+        self.nodes = []
+        self.__definitions = {}
+        self.__instantiating = []
+
+        chip = HDLParser.parse_file(hdl_path)
+        self.name = chip.name
+        self.__definitions[chip.name] = chip
+        self.inputs = {name: self.new_net(width, driven=True)
+                       for name, width in chip.inputs.items()}
+        self.outputs = {name: self.new_net(width)
+                        for name, width in chip.outputs.items()}
+        self.instantiate(chip.name, dict(self.inputs, **self.outputs), "")
+
+    def new_net(self, width: int, driven: bool = False) -> int:
+        """
+        Args:
+            width (int): the number of bits of the net.
+            driven (bool): True for nets that are not made of pieces.
+
+        Returns:
+            int: a new net.
+        """
+        self.widths.append(width)
+        self.pieces.append(None if driven else [])
+        return len(self.widths) - 1
+
+    def definition(self, name: str
+                   ) -> typing.Union[ChipDefinition, BuiltinChip]:
+        """
+        Args:
+            name (str): the name of a chip.
+
+        Returns:
+            typing.Union[ChipDefinition, BuiltinChip]: the chip, from the
+            first directory of the path that has its .hdl file, or the
+            built-in chip of that name.
+        """
+        if name not in self.__definitions:
+            definition = BUILTIN_CHIPS.get(name)
+            for directory in self.path:
+                hdl_path = os.path.join(directory, name + ".hdl")
+                if os.path.isfile(hdl_path):
+                    definition = HDLParser.parse_file(hdl_path)
+                    if definition.builtin is not None:
+                        definition = BUILTIN_CHIPS.get(definition.builtin)
+                    break
+            if definition is None:
+                raise ValueError("chip %s was not found" % name)
+            # cached before its parts are looked at, so that a chip that
+            # contains itself is not recognized as storage
+            self.__definitions[name] = definition
+            if isinstance(definition, ChipDefinition):
+                self.__definitions[name] = self.storage(definition) or \
+                    definition
+        return self.__definitions[name]
+
+    def storage(self, chip: ChipDefinition) -> typing.Optional[BuiltinChip]:
+        """Recognizes the chips that only store words, such as the Bit,
+        Register and RAM chips of project 3, so that they are simulated as a
+        single register or memory rather than as a gate per bit. A chip is
+        recognized if it is:
+
+        - a Bit, a Mux that feeds a DFF its own output or in, by load.
+        - a register made of registers that each store some bits of in.
+        - a bank of 2, 4 or 8 registers or memories, whose load comes from
+          a DMux of address bits, and whose outputs are selected by a Mux16
+          of the same bits. The other address bits go to the banks.
+
+        The DMux and Mux parts of a bank are taken to do what their names
+        say, as their own tests check. A bank stores the word at an address
+        in a different bank than a memory that is one list would, which the
+        chip cannot tell apart.
+
+        Args:
+            chip (ChipDefinition): a chip that is not built in.
+
+        Returns:
+            typing.Optional[BuiltinChip]: the register or memory that the
+            chip is equivalent to, or None if it is not recognized.
+        """
+        width = chip.outputs.get("out")
+        if list(chip.outputs) != ["out"] or chip.inputs.get("in") != width \
+                or chip.inputs.get("load") != 1 or \
+                not set(chip.inputs) <= {"in", "load", "address"}:
+            return None
+        parts = {}
+        for part in chip.parts:
+            wires = self.wires(part)
+            if wires is None:
+                return None
+            parts.setdefault(part.name, []).append(wires)
+        if "address" in chip.inputs:
+            return self.bank(chip, parts)
+        if width == 1 and set(parts) == {"Mux", "DFF"}:
+            return self.bit(chip, parts)
+        if len(parts) == 1:
+            return self.register(chip, parts)
+        return None
+
+    def bit(self, chip: ChipDefinition, parts: typing.Dict[
+            str, typing.List[typing.Dict[str, typing.List[PinReference]]]]
+            ) -> typing.Optional[BuiltinChip]:
+        """
+        Args:
+            chip (ChipDefinition): a chip with 1-bit in, load and out pins.
+            parts (typing.Dict[str, typing.List[typing.Dict[str, typing.List[
+                PinReference]]]]): the wires of the parts of a chip, by the
+                name of the part.
+
+        Returns:
+            typing.Optional[BuiltinChip]: a Bit, if the parts are a Mux and a
+            DFF that make one, or None.
+        """
+        if len(parts["Mux"]) != 1 or len(parts["DFF"]) != 1 or \
+                self.definition("DFF") is not BUILTIN_CHIPS["DFF"]:
+            return None
+        mux, dff = parts["Mux"][0], parts["DFF"][0]
+        if set(mux) != {"a", "b", "sel", "out"} or set(dff) != {"in", "out"}:
+            return None
+        feedback, next_value = mux["a"], mux["out"]
+        if mux["b"] != [PinReference("in")] or \
+                mux["sel"] != [PinReference("load")] or \
+                dff["in"] != next_value or \
+                not self.internal(chip, feedback + next_value) or \
+                sorted(dff["out"]) != sorted(feedback + [PinReference("out")]):
+            return None
+        return BUILTIN_CHIPS["Bit"]
+
+    def register(self, chip: ChipDefinition, parts: typing.Dict[
+            str, typing.List[typing.Dict[str, typing.List[PinReference]]]]
+                 ) -> typing.Optional[BuiltinChip]:
+        """
+        Args:
+            chip (ChipDefinition): a chip with in, load and out pins.
+            parts (typing.Dict[str, typing.List[typing.Dict[str, typing.List[
+                PinReference]]]]): the wires of its parts, by the name of the
+                part, which all have the same name.
+
+        Returns:
+            typing.Optional[BuiltinChip]: a register, if each part is a
+            register that stores bits of in, and together they store all of
+            them, or None.
+        """
+        (name, registers), = parts.items()
+        part_chip = self.definition(name)
+        if not isinstance(part_chip, BuiltinChip) or \
+                part_chip.kind != "register" or part_chip.code != (LOAD,) or \
+                set(part_chip.inputs) != {"in", "load"}:
+            return None
+        width = chip.outputs["out"]
+        mask = 0
+        for wires in registers:
+            if set(wires) != {"in", "load", "out"} or \
+                    wires["load"] != [PinReference("load")] or \
+                    len(wires["in"]) != 1 or wires["in"][0].name != "in" or \
+                    wires["out"] != [wires["in"][0]._replace(name="out")]:
+                return None
+            start, bits = self.span(wires["in"][0], width)
+            if bits != part_chip.outputs["out"] or \
+                    mask >> start & (1 << bits) - 1:
+                return None
+            mask |= ((1 << bits) - 1) << start
+        if mask != (1 << width) - 1:
+            return None
+        return _register({"in": width, "load": 1}, width, LOAD)
+
+    def bank(self, chip: ChipDefinition, parts: typing.Dict[
+            str, typing.List[typing.Dict[str, typing.List[PinReference]]]]
+             ) -> typing.Optional[BuiltinChip]:
+        """
+        Args:
+            chip (ChipDefinition): a chip with in, load, address and out pins.
+            parts (typing.Dict[str, typing.List[typing.Dict[str, typing.List[
+                PinReference]]]]): the wires of its parts, by the name of the
+                part.
+
+        Returns:
+            typing.Optional[BuiltinChip]: a memory, if the parts are a bank of
+            registers or memories, or None.
+        """
+        decoders = [name for name in parts if name in DECODERS]
+        selectors = [name for name in parts if name in SELECTORS]
+        if len(parts) != 3 or len(decoders) != 1 or len(selectors) != 1 or \
+                len(parts[decoders[0]]) != 1 or len(parts[selectors[0]]) != 1:
+            return None
+        ways = DECODERS[decoders[0]]
+        decoder, selector = parts[decoders[0]][0], parts[selectors[0]][0]
+        (name, banks), = ((name, wires) for name, wires in parts.items()
+                          if name not in decoders + selectors)
+        part_chip = self.definition(name)
+        width, address_width = chip.outputs["out"], chip.inputs["address"]
+        if SELECTORS[selectors[0]] != ways or len(banks) != len(ways) or \
+                BUILTIN_CHIPS[selectors[0]].outputs["out"] != width or \
+                set(decoder) != set(ways) | {"in", "sel"} or \
+                set(selector) != set(ways) | {"sel", "out"} or \
+                decoder["in"] != [PinReference("load")] or \
+                selector["out"] != [PinReference("out")] or \
+                len(decoder["sel"]) != 1 or \
+                decoder["sel"] != selector["sel"] or \
+                decoder["sel"][0].name != "address" or \
+                not isinstance(part_chip, BuiltinChip) or \
+                part_chip.outputs.get("out") != width:
+            return None
+        start, select_bits = self.span(decoder["sel"][0], address_width)
+        if select_bits != len(ways).bit_length() - 1:
+            return None
+        mask = ((1 << select_bits) - 1) << start
+
+        if part_chip.kind == "register" and part_chip.code == (LOAD,) and \
+                set(part_chip.inputs) == {"in", "load"}:
+            expected = {"in", "load", "out"}
+        elif part_chip.kind == "memory" and \
+                set(part_chip.inputs) == {"in", "load", "address"}:
+            expected = {"in", "load", "address", "out"}
+        else:
+            return None
+        # every bank gets the same address bits, the ones that do not select
+        # it
+        addresses = banks[0].get("address", [])
+        for wires in banks:
+            if set(wires) != expected or \
+                    wires["in"] != [PinReference("in")] or \
+                    wires.get("address", []) != addresses:
+                return None
+        if addresses:
+            if len(addresses) != 1 or addresses[0].name != "address":
+                return None
+            start, bits = self.span(addresses[0], address_width)
+            if bits != part_chip.inputs["address"] or \
+                    mask >> start & (1 << bits) - 1:
+                return None
+            mask |= ((1 << bits) - 1) << start
+        if mask != (1 << address_width) - 1:
+            return None
+
+        # the bank that each way of the decoder loads must be the one that
+        # the same way of the selector outputs
+        banks = {(tuple(wires["load"]), tuple(wires["out"]))
+                 for wires in banks}
+        if {(tuple(decoder[way]), tuple(selector[way]))
+                for way in ways} != banks or len(banks) != len(ways) or \
+                not self.internal(chip, [value for way in ways for value in
+                                         decoder[way] + selector[way]]):
+            return None
+        return _ram(address_width, width)
+
+    @staticmethod
+    def wires(part: Part) -> typing.Optional[
+            typing.Dict[str, typing.List[PinReference]]]:
+        """
+        Args:
+            part (Part): a part of a chip.
+
+        Returns:
+            typing.Optional[typing.Dict[str, typing.List[PinReference]]]:
+            what each pin of the part is connected to, or None if the
+            connection of a pin is to some of its bits.
+        """
+        wires = {}
+        for pin, value in part.connections:
+            if pin.start is not None:
+                return None
+            wires.setdefault(pin.name, []).append(value)
+        return wires
+
+    @staticmethod
+    def internal(chip: ChipDefinition,
+                 values: typing.List[PinReference]) -> bool:
+        """
+        Args:
+            chip (ChipDefinition): a chip.
+            values (typing.List[PinReference]): what pins of its parts are
+                connected to.
+
+        Returns:
+            bool: True if each of them is a different internal pin, as a
+            whole.
+        """
+        names = {value.name for value in values}
+        return len(names) == len(values) and all(
+            value.start is None for value in values) and \
+            not names & (set(chip.inputs) | set(chip.outputs) | CONSTANTS)
+
+    @staticmethod
+    def span(reference: PinReference,
+             width: int) -> typing.Tuple[int, int]:
+        """
+        Args:
+            reference (PinReference): a pin of a chip, or a range of its bits.
+            width (int): the width of the pin.
+
+        Returns:
+            typing.Tuple[int, int]: the first bit and the number of bits
+            that the reference stands for, which are none if it is out of
+            the pin.
+        """
+        if reference.start is None:
+            return 0, width
+        if reference.end >= width or reference.start > reference.end:
+            return 0, 0
+        return reference.start, reference.end - reference.start + 1
+
+    def instantiate(self, name: str, pins: typing.Dict[str, int],
+                    path: str) -> None:
+        """Adds a chip to the netlist.
+
+        Args:
+            name (str): the name of the chip.
+            pins (typing.Dict[str, int]): the nets of its pins.
+            path (str): the parts that lead to it from the top chip.
+        """
+        chip = self.definition(name)
+        if isinstance(chip, BuiltinChip):
+            node = len(self.nodes)
+            self.nodes.append(Node(
+                name, path, {pin: pins[pin] for pin in chip.inputs},
+                {pin: pins[pin] for pin in chip.outputs}))
+            for pin in chip.outputs:
+                self.pieces[pins[pin]] = None
+                self.drivers[pins[pin]] = (node, pin)
+            return
+        if name in self.__instantiating:
+            raise ValueError("chip %s contains itself" % name)
+        self.__instantiating.append(name)
+
+        # internal pins are created by the parts whose outputs drive them,
+        # which may come after the parts they feed
+        internal = {}
+        part_pins = []
+        for part in chip.parts:
+            part_chip = self.definition(part.name)
+            nets = {pin: self.new_net(width) for pin, width in dict(
+                part_chip.inputs, **part_chip.outputs).items()}
+            part_pins.append(nets)
+            for pin, value in part.connections:
+                if pin.name not in nets:
+                    self.error(chip, part.line, "%s has no pin %s" % (
+                        part.name, pin.name))
+                if pin.name not in part_chip.outputs:
+                    continue
+                start, width = self.bits(chip, part.line, pin,
+                                         self.widths[nets[pin.name]])
+                if value.name in chip.outputs:
+                    self.connect(chip, part.line, pins[value.name], value,
+                                 width, nets[pin.name], start)
+                elif value.name in chip.inputs or value.name in CONSTANTS:
+                    self.error(chip, part.line,
+                               "%s cannot be an output" % value.name)
+                elif value.name in internal:
+                    self.error(chip, part.line,
+                               "%s has more than one source" % value.name)
+                elif value.start is not None:
+                    self.error(chip, part.line, "internal pin %s cannot "
+                               "have a range" % value.name)
+                else:
+                    internal[value.name] = self.new_net(width)
+                    self.add_piece(internal[value.name], Piece(
+                        0, width, nets[pin.name], start))
+
+        for part, nets in zip(chip.parts, part_pins):
+            part_chip = self.definition(part.name)
+            for pin, value in part.connections:
+                if pin.name in part_chip.outputs:
+                    continue
+                start, width = self.bits(chip, part.line, pin,
+                                         self.widths[nets[pin.name]])
+                if value.name in CONSTANTS:
+                    constant = (1 << width) - 1 if value.name == "true" else 0
+                    self.add_piece(nets[pin.name],
+                                   Piece(start, width, None, value=constant))
+                    continue
+                if value.name in chip.inputs:
+                    source = pins[value.name]
+                elif value.name in internal:
+                    source = internal[value.name]
+                elif value.name in chip.outputs:
+                    self.error(chip, part.line, "output pin %s cannot be an "
+                               "input" % value.name)
+                else:
+                    self.error(chip, part.line,
+                               "%s is not connected to any output" %
+                               value.name)
+                source_start, source_width = self.bits(
+                    chip, part.line, value, self.widths[source])
+                if source_width != width:
+                    self.error(chip, part.line, "%s has %d bits but %s has "
+                               "%d" % (pin.name, width, value.name,
+                                       source_width))
+                self.add_piece(nets[pin.name],
+                               Piece(start, width, source, source_start))
+
+        for part, nets in zip(chip.parts, part_pins):
+            self.instantiate(part.name, nets,
+                             path + "/" + part.name if path else part.name)
+        self.__instantiating.pop()
+
+    def connect(self, chip: ChipDefinition, line: int, net: int,
+                reference: PinReference, width: int, source: int,
+                shift: int) -> None:
+        """Connects bits of a net to an output pin of a chip.
+
+        Args:
+            chip (ChipDefinition): the chip.
+            line (int): the line of the connection.
+            net (int): the net of the output pin.
+            reference (PinReference): the bits of the output pin.
+            width (int): the number of bits that are connected.
+            source (int): the net that drives them.
+            shift (int): the first bit of the source that is connected.
+        """
+        start, pin_width = self.bits(chip, line, reference, self.widths[net])
+        if pin_width != width:
+            self.error(chip, line, "%s has %d bits but is connected to %d" %
+                       (reference.name, pin_width, width))
+        self.add_piece(net, Piece(start, width, source, shift))
+
+    def add_piece(self, net: int, piece: Piece) -> None:
+        """
+        Args:
+            net (int): a net.
+            piece (Piece): bits of the net and what drives them.
+        """
+        mask = ((1 << piece.width) - 1) << piece.start
+        for other in self.pieces[net]:
+            if mask & ((1 << other.width) - 1) << other.start:
+                raise ValueError("bits %d..%d of a pin have more than one "
+                                 "source" % (piece.start,
+                                             piece.start + piece.width - 1))
+        self.pieces[net].append(piece)
+
+    def bits(self, chip: ChipDefinition, line: int, reference: PinReference,
+             width: int) -> typing.Tuple[int, int]:
+        """
+        Args:
+            chip (ChipDefinition): the chip of the reference.
+            line (int): the line of the reference.
+            reference (PinReference): a pin, or a range of its bits.
+            width (int): the width of the pin.
+
+        Returns:
+            typing.Tuple[int, int]: the first bit and the number of bits that
+            the reference stands for.
+        """
+        if reference.start is None:
+            return 0, width
+        if reference.end >= width:
+            self.error(chip, line, "%s has only %d bits" % (reference.name,
+                                                            width))
+        return reference.start, reference.end - reference.start + 1
+
+    @staticmethod
+    def error(chip: ChipDefinition, line: int,
+              message: str) -> typing.NoReturn:
+        """
+        Args:
+            chip (ChipDefinition): the chip where the error is.
+            line (int): the line of the error.
+            message (str): what is wrong.
+
+        Raises:
+            ValueError: always.
+        """
+        raise ValueError("%s.hdl:%d: %s" % (chip.name, line, message))
@@ -0,0 +1,622 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import concurrent.futures
+import functools
+import os
+import re
+import sys
+import typing
+
+from CPUEmulator import ADDRESS_MASK, SIGN_BIT, WORD_MASK, CPUEmulator
+from HardwareSimulator import HardwareSimulator
+from TestScript import Column, Repeat, Statement, TestScript, Unsupported, \
+    While
+
+# the assembler of project 6, for scripts that load .asm files
+ASSEMBLER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, "06")
+
+# a variable of a script, such as PC, RAM[7] or ARegister[]
+VARIABLE = re.compile(r'^(?P<name>[^\[]+)(?:\[(?P<index>\d*)\])?$')
+
+
+class ComparisonFailure(Exception):
+    """Raised when a line of output does not match the .cmp file."""
+
+
+class TestResult(typing.NamedTuple):
+    """The outcome of running a test script."""
+    script: str
+    # "PASS", "FAIL", "SKIP" or "ERROR"
+    status: str
+    message: str = ""
+
+
+def signed(value: int) -> int:
+    """
+    Args:
+        value (int): an unsigned 16-bit word.
+
+    Returns:
+        int: the word as a signed 16-bit number.
+    """
+    return value - 0x10000 if value & SIGN_BIT else value
+
+
+def read_program(path: str) -> typing.List[int]:
+    """
+    Args:
+        path (str): a .hack file, or a .asm file, which is assembled with
+            the assembler of project 6.
+
+    Returns:
+        typing.List[int]: the machine words of the program.
+    """
+    with open(path, 'r') as input_file:
+        if os.path.splitext(path)[1].lower() == ".hack":
+            return CPUEmulator.read_hack(input_file)
+        if ASSEMBLER_DIR not in sys.path:
+            sys.path.append(ASSEMBLER_DIR)
+        import Main as Assembler
+        return list(Assembler.assemble(input_file))
+
+
+class CPUTarget:
+    """The CPU emulator of the course, whose variables are A, D, PC, RAM[i],
+    ROM[i] and time. Every tock executes one instruction.
+    """
+
+    # script name -> register of the CPUEmulator
+    REGISTERS = {"A": "a", "D": "d", "PC": "pc"}
+    # script name -> memory of the CPUEmulator
+    MEMORIES = {"RAM": "ram", "ROM": "rom"}
+
+    def __init__(self, directory: str) -> None:
+        """
+        Args:
+            directory (str): the directory of the script, where the files it
+                loads are.
+        """
+        self.directory = directory
+        self.emulator = CPUEmulator()
+        self.time = 0
+        # True between a tick and the tock that follows it
+        self.half_cycle = False
+
+    def load(self, filename: str) -> None:
+        """Loads a program into the ROM.
+
+        Args:
+            filename (str): a .hack or .asm file.
+        """
+        self.emulator.load_rom(read_program(
+            os.path.join(self.directory, filename)))
+
+    def load_memory(self, part: str, filename: str) -> None:
+        """Loads a program into a memory that is named by the script.
+
+        Args:
+            part (str): the name of the memory, which must be the ROM.
+            filename (str): a .hack or .asm file.
+        """
+        if self.MEMORIES.get(part) != "rom":
+            raise ValueError("%s cannot be loaded" % part)
+        self.load(filename)
+
+    def get(self, variable: str) -> typing.Union[int, str]:
+        """
+        Args:
+            variable (str): a variable of the script.
+
+        Returns:
+            typing.Union[int, str]: its value, as a signed 16-bit number, or
+            as a string for time.
+        """
+        name, index = CPUTarget.split(variable)
+        if name == "time":
+            return "%d%s" % (self.time, "+" if self.half_cycle else "")
+        if name in self.REGISTERS:
+            return signed(getattr(self.emulator, self.REGISTERS[name]))
+        if name in self.MEMORIES and index is not None:
+            return signed(getattr(self.emulator, self.MEMORIES[name])[index])
+        raise ValueError("unknown variable: %s" % variable)
+
+    def set(self, variable: str, value: int) -> None:
+        """
+        Args:
+            variable (str): a variable of the script.
+            value (int): its new value.
+        """
+        name, index = CPUTarget.split(variable)
+        value &= WORD_MASK
+        if name in self.REGISTERS:
+            if name in ("PC", "PC[]"):
+                value &= ADDRESS_MASK
+            setattr(self.emulator, self.REGISTERS[name], value)
+        elif name in self.MEMORIES and index is not None:
+            memory = self.MEMORIES[name]
+            if memory == "rom":
+                # the ROM is compiled when it is loaded
+                words = list(self.emulator.rom)
+                words[index] = value
+                state = self.emulator.a, self.emulator.d, self.emulator.pc
+                self.emulator.load_rom(words)
+                self.emulator.a, self.emulator.d, self.emulator.pc = state
+            else:
+                self.emulator.ram[index] = value
+        else:
+            raise ValueError("unknown variable: %s" % variable)
+
+    def state(self) -> tuple:
+        """
+        Returns:
+            tuple: everything that the future of the program depends on,
+            which is all of the state but the time.
+        """
+        emulator = self.emulator
+        return (emulator.a, emulator.d, emulator.pc, emulator.ram[:],
+                emulator.rom.tobytes(), self.half_cycle)
+
+    @staticmethod
+    def split(variable: str) -> typing.Tuple[str, typing.Optional[int]]:
+        """
+        Args:
+            variable (str): a variable, such as RAM[3] or PC.
+
+        Returns:
+            typing.Tuple[str, typing.Optional[int]]: its name and its index,
+            if it has one.
+        """
+        match = VARIABLE.match(variable)
+        if match is None:
+            raise ValueError("invalid variable: %s" % variable)
+        index = match.group("index")
+        return match.group("name"), int(index) if index else None
+
+    def tick(self) -> None:
+        """The first half of a clock cycle."""
+        self.half_cycle = True
+
+    def tock(self) -> None:
+        """The second half of a clock cycle, which executes an instruction."""
+        self.ticktock(1)
+
+    def ticktock(self, cycles: int) -> None:
+        """Runs whole clock cycles.
+
+        Args:
+            cycles (int): the number of cycles.
+        """
+        self.emulator.advance(cycles)
+        self.time += cycles
+        self.half_cycle = False
+
+    def eval(self) -> None:
+        """Nothing is combinational in the CPU emulator."""
+
+
+class ComputerTarget(CPUTarget):
+    """The Computer chip of project 5, run by the CPU emulator rather than
+    from its parts. Its variables are reset, ARegister[], DRegister[], PC[],
+    RAM16K[i], ROM32K[i] and time, and ROM32K loads programs. As in the
+    hardware, an instruction that runs while reset is set still writes its
+    results, but the next instruction is at address 0.
+    """
+
+    REGISTERS = {"ARegister": "a", "DRegister": "d", "PC": "pc"}
+    MEMORIES = {"RAM16K": "ram", "ROM32K": "rom"}
+
+    def __init__(self, directory: str) -> None:
+        """
+        Args:
+            directory (str): the directory of the script, where the files it
+                loads are.
+        """
+        super().__init__(directory)
+        self.reset = 0
+
+    def get(self, variable: str) -> typing.Union[int, str]:
+        if variable == "reset":
+            return self.reset
+        if variable in ("ARegister", "DRegister", "PC"):
+            variable += "[]"
+        return super().get(variable)
+
+    def set(self, variable: str, value: int) -> None:
+        if variable == "reset":
+            self.reset = value & 1
+        else:
+            super().set(variable, value)
+
+    def state(self) -> tuple:
+        return super().state() + (self.reset,)
+
+    def ticktock(self, cycles: int) -> None:
+        if not self.reset:
+            super().ticktock(cycles)
+            return
+        for _ in range(cycles):
+            super().ticktock(1)
+            self.emulator.pc = 0
+
+
+# the chips that the CPU emulator can run instead of the hardware simulator,
+# by the name of their .hdl file
+CHIP_TARGETS = {"Computer": ComputerTarget}
+
+
+class ChipTarget:
+    """A chip, simulated from its .hdl file. Its variables are its pins,
+    the state of its built-in parts, such as RAM16K[i] or PC[], and time.
+    """
+
+    def __init__(self, directory: str,
+                 path: typing.Optional[typing.List[str]] = None) -> None:
+        """
+        Args:
+            directory (str): the directory of the script, where the files it
+                loads are.
+            path (typing.Optional[typing.List[str]]): more directories to
+                search for the .hdl files of parts, after the directory of
+                the chip.
+        """
+        self.directory = directory
+        self.path = path or []
+        self.simulator = None
+        self.time = 0
+        # True between a tick and the tock that follows it
+        self.half_cycle = False
+
+    def load(self, filename: str) -> None:
+        """Compiles the chip. Its parts are searched for in its directory
+        and the path, and the ones that are not there are built-in chips.
+
+        Args:
+            filename (str): an .hdl file.
+        """
+        self.simulator = HardwareSimulator(
+            os.path.join(self.directory, filename),
+            [self.directory] + self.path)
+
+    def load_memory(self, part: str, filename: str) -> None:
+        """
+        Args:
+            part (str): a built-in memory of the chip, such as ROM32K.
+            filename (str): a .hack or .asm file to fill it with.
+        """
+        self.simulator.load(part, read_program(
+            os.path.join(self.directory, filename)))
+
+    def get(self, variable: str) -> typing.Union[int, str]:
+        """
+        Args:
+            variable (str): a variable of the script.
+
+        Returns:
+            typing.Union[int, str]: its value, as a signed 16-bit number, or
+            as a string for time.
+        """
+        if variable == "time":
+            return "%d%s" % (self.time, "+" if self.half_cycle else "")
+        return signed(self.simulator.get(variable))
+
+    def set(self, variable: str, value: int) -> None:
+        """
+        Args:
+            variable (str): a variable of the script.
+            value (int): its new value.
+        """
+        self.simulator.set(variable, value)
+
+    def tick(self) -> None:
+        """The first half of a clock cycle."""
+        self.simulator.tick()
+        self.half_cycle = True
+
+    def tock(self) -> None:
+        """The second half of a clock cycle."""
+        self.simulator.tock()
+        self.time += 1
+        self.half_cycle = False
+
+    def ticktock(self, cycles: int) -> None:
+        """Runs whole clock cycles.
+
+        Args:
+            cycles (int): the number of cycles.
+        """
+        self.simulator.ticktock(cycles)
+        self.time += cycles
+        self.half_cycle = False
+
+    def eval(self) -> None:
+        """Propagates the inputs of the chip to its outputs."""
+        self.simulator.eval()
+
+    def state(self) -> tuple:
+        """
+        Returns:
+            tuple: the pins of the chip and the state of its built-in parts,
+            which is all of the state but the time.
+        """
+        simulator = self.simulator
+        return (simulator.pins[:], simulator.registers[:],
+                simulator.latched[:],
+                [memory[:] for memory in simulator.memories],
+                self.half_cycle)
+
+
+class TestRunner:
+    """Runs a .tst script and compares its output with its .cmp file, as
+    the simulators of the course do.
+    """
+
+    def __init__(self, script_path: str, write_output: bool = False,
+                 emulate: bool = False,
+                 path: typing.Optional[typing.List[str]] = None) -> None:
+        """
+        Args:
+            script_path (str): the .tst file.
+            write_output (bool): if True, the output is also written to the
+                output-file of the script.
+            emulate (bool): if True, the chips of CHIP_TARGETS are run by
+                the CPU emulator rather than simulated from their parts.
+            path (typing.Optional[typing.List[str]]): more directories to
+                search for the .hdl files of parts, see ChipTarget.
+        """
+        self.script_path = script_path
+        self.directory = os.path.dirname(os.path.abspath(script_path))
+        self.write_output = write_output
+        self.emulate = emulate
+        self.path = path
+        self.target = None
+        self.columns = []
+        self.output = []
+        self.output_file = None
+        self.expected = None
+
+    def run(self) -> TestResult:
+        """
+        Returns:
+            TestResult: whether the output matched the .cmp file.
+        """
+        try:
+            with open(self.script_path, 'r') as script_file:
+                statements = TestScript.parse(script_file.read())
+            self.execute(statements)
+        except ComparisonFailure as failure:
+            return TestResult(self.script_path, "FAIL", str(failure))
+        except Unsupported as error:
+            return TestResult(self.script_path, "SKIP", str(error))
+        except (ValueError, OSError, IndexError) as error:
+            return TestResult(self.script_path, "ERROR", str(error))
+        finally:
+            if self.write_output and self.output_file is not None:
+                with open(os.path.join(self.directory, self.output_file),
+                          'w') as output_file:
+                    output_file.writelines(line + "\n"
+                                           for line in self.output)
+        if self.expected is None:
+            return TestResult(self.script_path, "PASS", "no compare-to file")
+        return TestResult(self.script_path, "PASS")
+
+    def execute(self, statements: typing.List[Statement]) -> None:
+        """Runs commands of the script.
+
+        Args:
+            statements (typing.List[Statement]): the commands.
+        """
+        for statement in statements:
+            if isinstance(statement, Repeat):
+                self.repeat(statement)
+            elif isinstance(statement, While):
+                self.loop(statement)
+            else:
+                self.command(statement)
+
+    def repeat(self, block: Repeat) -> None:
+        """Runs a repeat block. A block of ticktock commands alone runs as
+        one call to the emulator.
+
+        Args:
+            block (Repeat): the block.
+        """
+        if self.target is not None and block.body == [["ticktock"]]:
+            self.target.ticktock(block.count)
+            return
+        for _ in range(block.count):
+            self.execute(block.body)
+
+    def loop(self, block: While) -> None:
+        """Runs a while block. Nothing but the script changes the targets,
+        so a loop whose target returns to a state it was in never ends by
+        itself, such as one that waits for a key press. Such a loop can only
+        be run by a user, and the script is skipped. Returns to an earlier
+        state are found with Brent's algorithm, which keeps one earlier state
+        at a time.
+
+        Args:
+            block (While): the block.
+        """
+        target = self.get_target()
+        condition = block.condition
+        value = target.get(condition.variable)
+        # the condition is part of the state, since it may depend on time
+        saved = (target.state(), value)
+        power = length = 1
+        while condition.holds(value):
+            self.execute(block.body)
+            value = target.get(condition.variable)
+            state = (target.state(), value)
+            if state == saved:
+                raise Unsupported("while %s %s %d never ends without input "
+                                  "from a user" % condition)
+            if length == power:
+                saved = state
+                power *= 2
+                length = 0
+            length += 1
+
+    def command(self, words: typing.List[str]) -> None:
+        """Runs a single command.
+
+        Args:
+            words (typing.List[str]): the command and its arguments.
+        """
+        command = words[0]
+        if command == "load":
+            self.load(words[1] if len(words) > 1 else None)
+        elif command == "output-file":
+            self.output_file = words[1]
+        elif command == "compare-to":
+            with open(os.path.join(self.directory, words[1]), 'r') as cmp:
+                self.expected = [line.rstrip() for line in cmp]
+        elif command == "output-list":
+            self.columns = [Column.parse(spec) for spec in words[1:]]
+            self.write("|" + "|".join(column.header()
+                                      for column in self.columns) + "|")
+        elif command == "output":
+            self.write("|" + "|".join(
+                column.cell(self.get_target().get(column.name))
+                for column in self.columns) + "|")
+        elif command == "set":
+            self.get_target().set(words[1], TestScript.parse_value(words[2]))
+        elif command == "tick":
+            self.get_target().tick()
+        elif command == "tock":
+            self.get_target().tock()
+        elif command == "ticktock":
+            self.get_target().ticktock(1)
+        elif command == "eval":
+            self.get_target().eval()
+        elif len(words) == 3 and words[1] == "load":
+            # such as "ROM32K load Max.hack"
+            self.get_target().load_memory(words[0], words[2])
+        elif command not in ("echo", "clear-echo", "breakpoint",
+                             "clear-breakpoints"):
+            raise ValueError("unknown command: %s" % " ".join(words))
+
+    def load(self, filename: typing.Optional[str]) -> None:
+        """Chooses the simulator for the script.
+
+        Args:
+            filename (typing.Optional[str]): the file the script loads, or
+                None to load the program that has the name of the script.
+        """
+        if filename is None:
+            filename = os.path.splitext(
+                os.path.basename(self.script_path))[0] + ".hack"
+        name, extension = os.path.splitext(filename)
+        if extension.lower() != ".hdl":
+            self.target = CPUTarget(self.directory)
+            self.target.load(filename)
+        elif self.emulate and name in CHIP_TARGETS:
+            self.target = CHIP_TARGETS[name](self.directory)
+        else:
+            self.target = ChipTarget(self.directory, self.path)
+            self.target.load(filename)
+
+    def get_target(self) -> typing.Union[CPUTarget, ChipTarget]:
+        """
+        Returns:
+            typing.Union[CPUTarget, ChipTarget]: the simulator that the
+            script loaded.
+        """
+        if self.target is None:
+            raise ValueError("the script does not load anything")
+        return self.target
+
+    def write(self, line: str) -> None:
+        """Outputs a line and compares it with the .cmp file.
+
+        Args:
+            line (str): the line.
+        """
+        self.output.append(line)
+        number = len(self.output)
+        if self.expected is None or number > len(self.expected):
+            return
+        if not TestScript.matches(line, self.expected[number - 1]):
+            raise ComparisonFailure(
+                "comparison failure at line %d\n  expected: %s\n  actual:   "
+                "%s" % (number, self.expected[number - 1], line))
+
+
+def run_script(script_path: str, write_output: bool = False,
+               emulate: bool = False,
+               path: typing.Optional[typing.List[str]] = None) -> TestResult:
+    """
+    Args:
+        script_path (str): a .tst file.
+        write_output (bool): if True, the output file of the script is
+            written.
+        emulate (bool): if True, the CPU emulator runs the chips it can.
+        path (typing.Optional[typing.List[str]]): more directories to search
+            for the .hdl files of parts.
+
+    Returns:
+        TestResult: the outcome of the script.
+    """
+    return TestRunner(script_path, write_output, emulate, path).run()
+
+
+if "__main__" == __name__:
+    # Runs the .tst scripts in the given files and directories, in parallel,
+    # and reports the ones whose output differs from their .cmp files.
+    arg_parser = argparse.ArgumentParser(prog="TestRunner")
+    arg_parser.add_argument("paths", nargs="+",
+                            help=".tst files, or directories to search")
+    arg_parser.add_argument(
+        "--jobs", type=int, default=0, metavar="N",
+        help="run scripts in N parallel processes (0 uses all cores)")
+    arg_parser.add_argument(
+        "--write-output", action="store_true",
+        help="also write the output-file of every script")
+    arg_parser.add_argument(
+        "--emulate", action="store_true",
+        help="run Computer.hdl on the CPU emulator instead of simulating it "
+             "from its parts")
+    arg_parser.add_argument(
+        "--path", action="append", metavar="DIR",
+        help="also search DIR for the .hdl files of parts, so that they are "
+             "simulated from their own parts rather than built in")
+    args = arg_parser.parse_args()
+
+    scripts = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in sorted(os.walk(path)):
+                scripts.extend(os.path.join(directory, filename)
+                               for filename in sorted(filenames)
+                               if filename.endswith(".tst"))
+        else:
+            scripts.append(path)
+
+    run = functools.partial(run_script, write_output=args.write_output,
+                            emulate=args.emulate, path=[
+                                os.path.abspath(directory)
+                                for directory in args.path or []])
+    jobs = args.jobs or os.cpu_count()
+    if jobs > 1 and len(scripts) > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(run, scripts))
+    else:
+        results = list(map(run, scripts))
+
+    # results are reported in script order, whatever order they finished in
+    counts = dict.fromkeys(("PASS", "FAIL", "SKIP", "ERROR"), 0)
+    for result in results:
+        counts[result.status] += 1
+        print("%-5s %s%s" % (result.status, result.script,
+                             ": " + result.message if result.message
+                             else ""))
+    print(", ".join("%d %s" % (count, status.lower())
+                    for status, count in counts.items()))
+    if counts["FAIL"] or counts["ERROR"]:
+        sys.exit(1)
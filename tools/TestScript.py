@@ -0,0 +1,245 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import operator
+import re
+import typing
+
+# comments, which are removed before the script is split into tokens
+COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# a quoted string, a separator, or a word
+TOKEN = re.compile(r'"[^"]*"|[{},;!]|[^\s{},;!"]+')
+
+# the separators that end a command
+SEPARATORS = {",", ";", "!"}
+
+# an output-list column: name%FL.W.R, where F is the format and L, W and R
+# are the left padding, the width and the right padding
+COLUMN = re.compile(r'^(?P<name>[^%]+)'
+                    r'(?:%(?P<format>[BDXS])(?P<left>\d+)\.(?P<width>\d+)\.'
+                    r'(?P<right>\d+))?$')
+
+# the condition of a while loop: a variable, a comparison and a value
+CONDITION = re.compile(r'^(?P<variable>.+?)(?P<operator><>|<=|>=|=|<|>)'
+                       r'(?P<value>[^<>=]+)$')
+
+# the comparisons of while conditions
+OPERATORS = {"=": operator.eq, "<>": operator.ne, "<": operator.lt,
+             ">": operator.gt, "<=": operator.le, ">=": operator.ge}
+
+
+class Unsupported(Exception):
+    """Raised for scripts that this runner cannot run, such as interactive
+    ones, or ones that need a simulator it does not have."""
+
+
+class Column(typing.NamedTuple):
+    """A column of the output of a test script."""
+    name: str
+    # B (binary), D (decimal), X (hexadecimal) or S (string)
+    format: str = "D"
+    left: int = 1
+    width: int = 6
+    right: int = 1
+
+    @staticmethod
+    def parse(spec: str) -> "Column":
+        """
+        Args:
+            spec (str): an output-list entry, such as RAM[0]%D2.6.2.
+
+        Returns:
+            Column: the column it describes.
+        """
+        match = COLUMN.match(spec)
+        if match is None:
+            raise ValueError("invalid output-list entry: %s" % spec)
+        if match.group("format") is None:
+            return Column(match.group("name"))
+        return Column(match.group("name"), match.group("format"),
+                      int(match.group("left")), int(match.group("width")),
+                      int(match.group("right")))
+
+    def header(self) -> str:
+        """
+        Returns:
+            str: the name of the column, centered in the width of the
+            column and cut to fit in it.
+        """
+        size = self.left + self.width + self.right
+        name = self.name[:size]
+        before = (size - len(name)) // 2
+        return " " * before + name + " " * (size - len(name) - before)
+
+    def cell(self, value: typing.Union[int, str]) -> str:
+        """
+        Args:
+            value (typing.Union[int, str]): a signed 16-bit number, or a
+                string for S columns.
+
+        Returns:
+            str: the value formatted as the column requires.
+        """
+        if self.format == "S":
+            text = str(value).ljust(self.width)
+        elif self.format == "B":
+            text = format(value & 0xFFFF, '016b')[-self.width:]
+        elif self.format == "X":
+            text = format(value & 0xFFFF, '04X')[-self.width:]
+        else:
+            text = str(value).rjust(self.width)
+        return " " * self.left + text + " " * self.right
+
+
+class Condition(typing.NamedTuple):
+    """The condition of a while loop, such as out <> 75."""
+    variable: str
+    # one of the keys of OPERATORS
+    operator: str
+    value: int
+
+    @staticmethod
+    def parse(words: typing.List[str]) -> "Condition":
+        """
+        Args:
+            words (typing.List[str]): the words of the condition, with or
+                without spaces between its parts.
+
+        Returns:
+            Condition: the condition.
+        """
+        match = CONDITION.match("".join(words))
+        if match is None:
+            raise ValueError("invalid condition: %s" % " ".join(words))
+        return Condition(match.group("variable"), match.group("operator"),
+                         TestScript.parse_value(match.group("value")))
+
+    def holds(self, value: typing.Union[int, str]) -> bool:
+        """
+        Args:
+            value (typing.Union[int, str]): the value of the variable, such
+                as a signed 16-bit number, or the time as in the output.
+
+        Returns:
+            bool: True if the condition holds for the value.
+        """
+        if isinstance(value, str):
+            value = int(value.rstrip("+"))
+        return OPERATORS[self.operator](value, self.value)
+
+
+class Repeat(typing.NamedTuple):
+    """A block of commands that is run a number of times."""
+    count: int
+    body: typing.List["Statement"]
+
+
+class While(typing.NamedTuple):
+    """A block of commands that is run as long as a condition holds."""
+    condition: Condition
+    body: typing.List["Statement"]
+
+
+Statement = typing.Union[typing.List[str], Repeat, While]
+
+
+class TestScript:
+    """Parses the .tst scripts of the course. A script is a list of
+    commands, which are lists of words, and repeat and while blocks.
+    """
+
+    @staticmethod
+    def parse(text: str) -> typing.List[Statement]:
+        """
+        Args:
+            text (str): the contents of a .tst file.
+
+        Returns:
+            typing.List[Statement]: the commands of the script.
+        """
+        tokens = TOKEN.findall(COMMENT.sub(" ", text))
+        statements, position = TestScript.__parse_block(tokens, 0)
+        if position != len(tokens):
+            raise ValueError("unexpected '}'")
+        return statements
+
+    @staticmethod
+    def __parse_block(tokens: typing.List[str], position: int
+                      ) -> typing.Tuple[typing.List[Statement], int]:
+        """
+        Args:
+            tokens (typing.List[str]): the tokens of the script.
+            position (int): where the block starts.
+
+        Returns:
+            typing.Tuple[typing.List[Statement], int]: the commands of the
+            block, and the position of the '}' that ends it, or the end of
+            the tokens.
+        """
+        statements = []
+        command = []
+        while position < len(tokens) and tokens[position] != "}":
+            token = tokens[position]
+            position += 1
+            if token in SEPARATORS:
+                if command:
+                    statements.append(command)
+                command = []
+            elif token == "{":
+                if not command or command[0] not in ("repeat", "while"):
+                    raise ValueError("'{' must follow repeat or while")
+                if command == ["repeat"]:
+                    raise Unsupported("repeat without a count runs until a "
+                                      "user stops it")
+                body, position = TestScript.__parse_block(tokens, position)
+                if position == len(tokens):
+                    raise ValueError("missing '}'")
+                if command[0] == "while":
+                    statements.append(While(Condition.parse(command[1:]),
+                                            body))
+                else:
+                    statements.append(Repeat(int(command[1]), body))
+                command = []
+                position += 1
+            else:
+                command.append(token)
+        if command:
+            statements.append(command)
+        return statements, position
+
+    @staticmethod
+    def parse_value(text: str) -> int:
+        """
+        Args:
+            text (str): a value of a set command: a decimal number, or a
+                number in the %B, %D or %X format.
+
+        Returns:
+            int: the value.
+        """
+        if text[:2] == "%B":
+            return int(text[2:], 2)
+        if text[:2] == "%X":
+            return int(text[2:], 16)
+        if text[:2] == "%D":
+            return int(text[2:])
+        return int(text)
+
+    @staticmethod
+    def matches(line: str, expected: str) -> bool:
+        """
+        Args:
+            line (str): a line of output.
+            expected (str): the line of the .cmp file, where '*' matches any
+                character.
+
+        Returns:
+            bool: True if the lines match.
+        """
+        return len(line) == len(expected) and all(
+            want in ("*", got) for got, want in zip(line, expected))